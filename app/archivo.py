@@ -0,0 +1,109 @@
+"""
+Archivo de reservas históricas: las reservas cerradas (completadas o canceladas) más antiguas que
+un horizonte se mueven por lotes de `reservas` a `reservas_archivo`, así la tabla viva, sus índices
+y las páginas que se leen en las consultas habituales solo contienen las reservas recientes.
+La vista `reservas_historico` une las dos tablas para las consultas que necesitan todo el historial.
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.database import formatear_fecha, obtener_uno, transaccion
+from app.versiones import versiones
+
+TABLA_ARCHIVO = "reservas_archivo"
+VISTA_HISTORICO = "reservas_historico"
+
+# Columnas que comparten `reservas` y `reservas_archivo`
+COLUMNAS = "id, cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, notas, fecha_creacion"
+
+# Estados que se pueden archivar: las reservas activas siguen siempre en la tabla viva
+ESTADOS_ARCHIVABLES = ("completada", "cancelada")
+
+# La tabla de archivo no tiene claves foráneas: guarda el historial aunque se borre un cliente o una mesa.
+# Los índices cubren los mismos filtros que el listado de reservas
+ESQUEMA_ARCHIVO = f"""
+CREATE TABLE IF NOT EXISTS {TABLA_ARCHIVO} (
+    id INTEGER PRIMARY KEY,
+    cliente_id INTEGER NOT NULL,
+    mesa_id INTEGER NOT NULL,
+    fecha_hora_inicio TIMESTAMP NOT NULL,
+    fecha_hora_fin TIMESTAMP NOT NULL,
+    num_comensales INTEGER NOT NULL,
+    estado TEXT NOT NULL,
+    notas TEXT,
+    fecha_creacion TIMESTAMP,
+    fecha_archivado TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_archivo_fecha ON {TABLA_ARCHIVO}(fecha_hora_inicio);
+CREATE INDEX IF NOT EXISTS idx_reservas_archivo_cliente_fecha ON {TABLA_ARCHIVO}(cliente_id, fecha_hora_inicio);
+CREATE INDEX IF NOT EXISTS idx_reservas_archivo_mesa_fecha ON {TABLA_ARCHIVO}(mesa_id, fecha_hora_inicio);
+CREATE VIEW IF NOT EXISTS {VISTA_HISTORICO} AS
+    SELECT {COLUMNAS} FROM reservas
+    UNION ALL
+    SELECT {COLUMNAS} FROM {TABLA_ARCHIVO}
+"""
+
+
+def _archivar_lote(limite: str, tamano_lote: int) -> int:
+    """Mueve al archivo un lote de reservas cerradas que empiezan antes de `limite`; devuelve cuántas."""
+    with transaccion() as conexion:
+        ids = [
+            fila[0]
+            for fila in conexion.execute(
+                f"""
+                SELECT id FROM reservas
+                WHERE fecha_hora_inicio < ? AND estado IN ({", ".join("?" for _ in ESTADOS_ARCHIVABLES)})
+                ORDER BY fecha_hora_inicio LIMIT ?
+                """,
+                (limite, *ESTADOS_ARCHIVABLES, tamano_lote),
+            )
+        ]
+        if not ids:
+            return 0
+        lista = json.dumps(ids)
+        conexion.execute(
+            f"""
+            INSERT INTO {TABLA_ARCHIVO} ({COLUMNAS}, fecha_archivado)
+            SELECT {COLUMNAS}, ? FROM reservas WHERE id IN (SELECT value FROM json_each(?))
+            """,
+            (formatear_fecha(datetime.now()), lista),
+        )
+        # El trigger de borrado de los resúmenes ignora las reservas que ya están en el archivo,
+        # así las estadísticas siguen contando todo el historial
+        conexion.execute("DELETE FROM reservas WHERE id IN (SELECT value FROM json_each(?))", (lista,))
+    return len(ids)
+
+
+def archivar_reservas(antes_de: Optional[datetime] = None, dias: int = 365, tamano_lote: int = 1000,
+                      lotes_maximos: int = 20) -> dict:
+    """
+    Archiva las reservas completadas y canceladas que empiezan antes de `antes_de`
+    (por defecto, hace `dias` días). Cada lote es una transacción corta; se procesan como
+    mucho `lotes_maximos` lotes y lo que quede se archiva en la siguiente ejecución.
+    """
+    limite = formatear_fecha(antes_de or datetime.now() - timedelta(days=dias))
+    resultado = {"archivadas": 0, "lotes": 0}
+    for _ in range(lotes_maximos):
+        archivadas = _archivar_lote(limite, tamano_lote)
+        resultado["archivadas"] += archivadas
+        resultado["lotes"] += 1
+        if archivadas < tamano_lote:
+            break
+    if resultado["archivadas"]:
+        # Las reservas archivadas ya no salen en los listados de la tabla viva
+        versiones.tocar("reservas")
+    return resultado
+
+
+# Tabla de la que leer las reservas que empiezan en `desde` o después (sin `desde`, de cualquier fecha)
+def origen_reservas(desde: Optional[str] = None, conexion=None) -> str:
+    """
+    Devuelve "reservas" si el archivo no tiene reservas de `desde` en adelante (lo habitual:
+    consultas de fechas recientes) y la vista con todo el historial si las tiene.
+    """
+    fila = obtener_uno(f"SELECT MAX(fecha_hora_inicio) AS limite FROM {TABLA_ARCHIVO}", conexion=conexion)
+    if fila is None or fila["limite"] is None or (desde is not None and fila["limite"] < desde):
+        return "reservas"
+    return VISTA_HISTORICO
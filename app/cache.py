@@ -0,0 +1,114 @@
+"""Caché en memoria (LRU con caducidad) para las búsquedas de mesas y clientes por id."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Tamaño máximo de cada caché (entradas) y segundos que vive cada entrada
+TAMANO_CACHE = int(os.environ.get("RESERVAS_CACHE_TAMANO", "1024"))
+TTL_CACHE = float(os.environ.get("RESERVAS_CACHE_TTL", "60"))
+
+
+class CacheLRU:
+    """
+    Caché de lectura con tamaño acotado, expulsión LRU y caducidad (TTL).
+    Las filas se guardan como dict y se devuelven copiadas, para que quien las use
+    pueda modificarlas sin tocar la caché.
+    Los servicios que modifican mesas o clientes la invalidan explícitamente.
+    """
+
+    def __init__(self, nombre: str, tamano_maximo: int = TAMANO_CACHE, ttl: float = TTL_CACHE):
+        self.nombre = nombre
+        self.tamano_maximo = tamano_maximo
+        self.ttl = ttl
+        self._bloqueo = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (caduca_en, valor)
+        # Cada invalidación sube la generación: una lectura de la base de datos que empezó
+        # antes de invalidar no puede guardar después un valor antiguo
+        self._generacion = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._expulsiones = 0
+        self._caducadas = 0
+        self._invalidaciones = 0
+
+    @property
+    def generacion(self) -> int:
+        return self._generacion
+
+    def obtener(self, clave) -> Optional[dict]:
+        """Devuelve una copia del valor guardado o None si no está o ha caducado."""
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._fallos += 1
+                return None
+            caduca_en, valor = entrada
+            if caduca_en <= time.monotonic():
+                del self._entradas[clave]
+                self._caducadas += 1
+                self._fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._aciertos += 1
+            return dict(valor)
+
+    def guardar(self, clave, valor: Optional[dict], generacion: Optional[int] = None):
+        """
+        Guarda un valor. Si se pasa la `generacion` leída antes de consultar la base de datos
+        y desde entonces ha habido una invalidación, no se guarda.
+        Los valores vacíos (la fila no existe) no se guardan.
+        """
+        if not valor:
+            return
+        with self._bloqueo:
+            if generacion is not None and generacion != self._generacion:
+                return
+            self._entradas[clave] = (time.monotonic() + self.ttl, dict(valor))
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano_maximo:
+                self._entradas.popitem(last=False)
+                self._expulsiones += 1
+
+    def obtener_o_cargar(self, clave, cargar: Callable[[], Optional[dict]]) -> Optional[dict]:
+        """Devuelve el valor de la caché o lo carga con `cargar()` (síncrono) y lo guarda."""
+        valor = self.obtener(clave)
+        if valor is None:
+            generacion = self._generacion
+            valor = cargar()
+            self.guardar(clave, valor, generacion)
+        return valor
+
+    def invalidar(self, clave=None):
+        """Quita una clave de la caché, o la vacía entera si no se indica clave."""
+        with self._bloqueo:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+            self._generacion += 1
+            self._invalidaciones += 1
+
+    def metricas(self) -> dict:
+        """Contadores de uso de la caché."""
+        with self._bloqueo:
+            consultas = self._aciertos + self._fallos
+            return {
+                "nombre": self.nombre,
+                "entradas": len(self._entradas),
+                "tamano_maximo": self.tamano_maximo,
+                "ttl_segundos": self.ttl,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "expulsiones": self._expulsiones,
+                "caducadas": self._caducadas,
+                "invalidaciones": self._invalidaciones,
+                "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else None,
+            }
+
+
+# Cachés compartidas por todo el proceso (clave: id de la fila)
+cache_mesas = CacheLRU("mesas")
+cache_clientes = CacheLRU("clientes")
@@ -0,0 +1,173 @@
+"""Respuestas condicionales (ETag / Last-Modified) y caché opcional de respuestas ya serializadas."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import HTTPException, Request, Response
+
+from app.versiones import versiones
+
+# Respuestas que guarda la caché de respuestas (0 la desactiva) y tamaño máximo de cada una
+TAMANO_CACHE_HTTP = int(os.environ.get("RESERVAS_CACHE_HTTP", "0"))
+BYTES_MAXIMOS_RESPUESTA = 1024 * 1024
+# Clave del scope ASGI en la que la dependencia deja las tablas y versiones de la respuesta
+CLAVE_SCOPE = "reservas.versiones"
+
+
+def _cabeceras(tablas: tuple, version: tuple) -> dict:
+    cabeceras = {
+        "ETag": versiones.etag(version),
+        # El cliente puede guardar la respuesta pero tiene que revalidarla siempre
+        "Cache-Control": "no-cache",
+    }
+    # Last-Modified tiene precisión de segundos: solo se envía cuando el segundo del último cambio
+    # ya ha pasado, así cualquier cambio posterior tendrá una fecha mayor y nunca se responde 304 por error
+    ultima = int(versiones.ultima_modificacion(tablas))
+    if ultima < int(time.time()):
+        cabeceras["Last-Modified"] = formatdate(ultima, usegmt=True)
+    return cabeceras
+
+
+def _no_modificada(cabeceras_peticion, etag: str, ultima_modificacion: float) -> bool:
+    """
+    Indica si la petición condicional se puede responder con 304.
+    If-None-Match tiene prioridad; If-Modified-Since solo se mira si no viene.
+    """
+    if_none_match = cabeceras_peticion.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return any(valor.strip().removeprefix("W/") == etag for valor in if_none_match.split(","))
+    if_modified_since = cabeceras_peticion.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(ultima_modificacion) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# Dependencia para las rutas de lectura: `dependencies=[Depends(condicional("mesas"))]`
+def condicional(*tablas: str):
+    """
+    Devuelve una dependencia que añade ETag y Last-Modified según las versiones de `tablas`
+    y responde 304 antes de ejecutar la ruta (sin consultar SQLite ni serializar) si el
+    cliente ya tiene la versión actual.
+    """
+    async def comprobar(request: Request, response: Response):
+        version = versiones.actual(tablas)
+        cabeceras = _cabeceras(tablas, version)
+        if _no_modificada(request.headers, cabeceras["ETag"], versiones.ultima_modificacion(tablas)):
+            raise HTTPException(status_code=304, headers=cabeceras)
+        response.headers.update(cabeceras)
+        request.scope[CLAVE_SCOPE] = (tablas, version)
+    return comprobar
+
+
+class CacheRespuestas:
+    """
+    Respuestas ya serializadas por URL (ruta y query string), con expulsión LRU.
+    Cada entrada guarda las versiones de las tablas con las que se generó y solo se
+    usa mientras esas versiones no cambien, así que no hace falta invalidarla.
+    """
+
+    def __init__(self, tamano_maximo: int = TAMANO_CACHE_HTTP):
+        self.tamano_maximo = tamano_maximo
+        self._bloqueo = threading.Lock()
+        self._entradas = OrderedDict()  # (ruta, query) -> (tablas, version, ruta_plantilla, cabeceras, cuerpo)
+        self._aciertos = 0
+        self._fallos = 0
+        self._expulsiones = 0
+
+    def obtener(self, clave) -> tuple:
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and versiones.actual(entrada[0]) == entrada[1]:
+                self._entradas.move_to_end(clave)
+                self._aciertos += 1
+                return entrada
+            if entrada is not None:
+                del self._entradas[clave]
+            self._fallos += 1
+            return None
+
+    def guardar(self, clave, entrada: tuple):
+        with self._bloqueo:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano_maximo:
+                self._entradas.popitem(last=False)
+                self._expulsiones += 1
+
+    def metricas(self) -> dict:
+        """Contadores de uso de la caché de respuestas."""
+        with self._bloqueo:
+            return {
+                "nombre": "respuestas",
+                "entradas": len(self._entradas),
+                "tamano_maximo": self.tamano_maximo,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "expulsiones": self._expulsiones,
+            }
+
+
+# Caché de respuestas compartida por todo el proceso
+cache_respuestas = CacheRespuestas()
+
+
+class MiddlewareCacheHTTP:
+    """
+    Middleware ASGI que sirve desde `cache_respuestas` las respuestas GET de las rutas con la
+    dependencia `condicional`, sin pasar por la ruta. Solo actúa si RESERVAS_CACHE_HTTP > 0.
+    """
+
+    def __init__(self, app, cache: CacheRespuestas = cache_respuestas):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not self.cache.tamano_maximo:
+            await self.app(scope, receive, send)
+            return
+
+        clave = (scope["path"], scope["query_string"])
+        entrada = self.cache.obtener(clave)
+        if entrada is not None:
+            tablas, _, ruta, cabeceras, cuerpo = entrada
+            # La instrumentación agrupa la petición con su ruta aunque no se haya ejecutado
+            scope["route"] = ruta
+            peticion = {nombre.decode("latin-1").lower(): valor.decode("latin-1") for nombre, valor in scope["headers"]}
+            etag = next(valor for nombre, valor in cabeceras if nombre == b"etag").decode()
+            if _no_modificada(peticion, etag, versiones.ultima_modificacion(tablas)):
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [(nombre, valor) for nombre, valor in cabeceras if nombre in (b"etag", b"last-modified", b"cache-control")],
+                })
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await send({"type": "http.response.start", "status": 200, "headers": cabeceras})
+                await send({"type": "http.response.body", "body": cuerpo})
+            return
+
+        inicio = {}
+        partes = []
+        tamano = [0]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                inicio.update(mensaje)
+            elif mensaje["type"] == "http.response.body" and tamano[0] <= BYTES_MAXIMOS_RESPUESTA:
+                partes.append(mensaje.get("body", b""))
+                tamano[0] += len(partes[-1])
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+        marcada = scope.get(CLAVE_SCOPE)
+        if marcada and inicio.get("status") == 200 and tamano[0] <= BYTES_MAXIMOS_RESPUESTA:
+            tablas, version = marcada
+            self.cache.guardar(clave, (tablas, version, scope.get("route"), list(inicio["headers"]), b"".join(partes)))
@@ -0,0 +1,50 @@
+"""
+Comandos de mantenimiento de la base de datos.
+
+Uso:
+    python -m app.cli migrar
+    python -m app.cli reconstruir-estadisticas
+    python -m app.cli verificar-estadisticas
+    python -m app.cli verificar-indice
+    python -m app.cli cerrar-reservas
+    python -m app.cli archivar-reservas [--dias 365]
+"""
+
+import argparse
+import json
+
+from app.archivo import archivar_reservas
+from app.indice_reservas import indice_reservas
+from app.migraciones import aplicar_migraciones
+from app.resumenes import reconstruir_resumenes, verificar_resumenes
+from app.services.reserva_service import cerrar_reservas_vencidas
+
+
+# Cada comando devuelve un diccionario que se imprime como JSON
+COMANDOS = {
+    "migrar": lambda argumentos: {"version_esquema": aplicar_migraciones()},
+    "reconstruir-estadisticas": lambda argumentos: reconstruir_resumenes(),
+    "verificar-estadisticas": lambda argumentos: verificar_resumenes(),
+    "verificar-indice": lambda argumentos: indice_reservas.verificar_consistencia(),
+    # La misma tarea que el planificador de la API ejecuta periódicamente
+    "cerrar-reservas": lambda argumentos: cerrar_reservas_vencidas(),
+    # Sin límite de lotes: archiva de una vez todo lo que tenga más de `--dias` días
+    "archivar-reservas": lambda argumentos: archivar_reservas(dias=argumentos.dias, lotes_maximos=1_000_000),
+}
+
+
+def principal(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Mantenimiento de la base de datos")
+    parser.add_argument("comando", choices=sorted(COMANDOS))
+    parser.add_argument("--dias", type=int, default=365, help="antigüedad de las reservas que se archivan (archivar-reservas)")
+    argumentos = parser.parse_args(argv)
+    if argumentos.comando != "migrar":
+        aplicar_migraciones()
+    resultado = COMANDOS[argumentos.comando](argumentos)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    # Código de salida 1 si una verificación encuentra diferencias
+    return 0 if resultado.get("consistente", True) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(principal())
@@ -0,0 +1,196 @@
+"""
+Coherencia entre procesos para servir con varios workers (`uvicorn app.main:app --workers N`).
+Unos triggers apuntan cada cambio de mesas, clientes y reservas en la tabla `registro_cambios`;
+cada proceso lee los cambios nuevos y los aplica a su estado en memoria (índice de reservas,
+cachés de mesas y clientes y versiones de ETag). No hace falta ningún servicio externo.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.cache import cache_clientes, cache_mesas
+from app.database import formatear_fecha, obtener_todos, obtener_uno, transaccion
+from app.eventos import EVENTOS_ESTADO, centro_eventos
+from app.indice_reservas import indice_reservas
+from app.versiones import TABLAS, versiones
+
+# Con RESERVAS_MULTIPROCESO=1 cada proceso busca cada INTERVALO_MS los cambios de los demás (las
+# escrituras que validan reservas los aplican siempre, con o sin esta opción)
+ACTIVO = os.environ.get("RESERVAS_MULTIPROCESO", "0") == "1"
+# Cada cuántos milisegundos se buscan cambios nuevos (lo más que una lectura puede ir por detrás)
+INTERVALO_MS = float(os.environ.get("RESERVAS_COHERENCIA_MS", "100"))
+# Segundos que se guardan los cambios antes de borrarlos
+RETENCION_SEGUNDOS = int(os.environ.get("RESERVAS_CAMBIOS_RETENCION", "3600"))
+
+TABLA_CAMBIOS = "registro_cambios"
+
+ESQUEMA_CAMBIOS = f"""
+CREATE TABLE IF NOT EXISTS {TABLA_CAMBIOS} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabla TEXT NOT NULL,
+    fila_id INTEGER NOT NULL,
+    operacion TEXT,
+    fecha TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+)
+"""
+
+
+def triggers_cambios() -> list[str]:
+    """Sentencias CREATE TRIGGER que apuntan en `registro_cambios` cada INSERT, UPDATE y DELETE."""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cambios_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+            INSERT INTO {TABLA_CAMBIOS} (tabla, fila_id, operacion) VALUES ('{tabla}', {fila}.id, '{evento}');
+        END
+        """
+        for tabla in TABLAS
+        for evento, fila in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    ]
+
+
+def _por_ids(consulta: str, ids: list[int], conexion=None) -> dict:
+    filas = obtener_todos(consulta, (json.dumps(ids),), conexion)
+    return {fila["id"]: fila for fila in filas}
+
+
+class Coherencia:
+    """
+    Posición de este proceso en `registro_cambios` y aplicación de los cambios nuevos.
+    Los ids de `registro_cambios` son consecutivos porque las escrituras de SQLite van de una en una;
+    si faltan cambios (se borraron antes de leerlos) se recarga todo el estado en memoria.
+    Los cambios se aplican con el bloqueo de escritura del índice, el mismo que tienen las
+    transacciones que validan reservas, así que nunca se valida con un índice a medio actualizar.
+    """
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._ultimo_id = None
+        self._sincronizaciones = 0
+        self._cambios_aplicados = 0
+        self._recargas = 0
+
+    def iniciar(self):
+        """Toma como punto de partida el último cambio (llamar antes de cargar el índice)."""
+        fila = obtener_uno(f"SELECT COALESCE(MAX(id), 0) AS ultimo FROM {TABLA_CAMBIOS}")
+        self._ultimo_id = fila["ultimo"]
+
+    def detener(self):
+        """Deja de seguir el registro de cambios (al apagar la API)."""
+        with self._bloqueo:
+            self._ultimo_id = None
+
+    def hay_cambios(self) -> bool:
+        """Comprobación barata, sin bloqueos, de si hay cambios que este proceso no ha aplicado."""
+        if self._ultimo_id is None:
+            return False
+        fila = obtener_uno(f"SELECT COALESCE(MAX(id), 0) AS ultimo FROM {TABLA_CAMBIOS}")
+        return fila["ultimo"] > self._ultimo_id
+
+    def sincronizar(self, conexion=None) -> int:
+        """
+        Aplica los cambios nuevos y devuelve cuántos ha aplicado.
+        Dentro de una transacción de escritura hay que pasar su `conexion`: con el bloqueo de
+        escritura de SQLite ya tomado, ningún otro proceso puede confirmar cambios hasta que termine.
+        """
+        if self._ultimo_id is None:
+            return 0
+        with indice_reservas.escritura():
+            cambios = obtener_todos(
+                f"SELECT id, tabla, fila_id, operacion FROM {TABLA_CAMBIOS} WHERE id > ? ORDER BY id", (self._ultimo_id,), conexion
+            )
+            if not cambios:
+                return 0
+            if cambios[0]["id"] != self._ultimo_id + 1:
+                self._recargar(cambios[-1]["id"])
+            else:
+                self._aplicar(cambios, conexion)
+            with self._bloqueo:
+                self._ultimo_id = cambios[-1]["id"]
+                self._sincronizaciones += 1
+                self._cambios_aplicados += len(cambios)
+        return len(cambios)
+
+    def sincronizar_si_hay_cambios(self) -> dict:
+        """Tarea periódica: sincroniza solo si hay cambios nuevos."""
+        return {"cambios": self.sincronizar() if self.hay_cambios() else 0}
+
+    def _aplicar(self, cambios: list[dict], conexion=None):
+        ids = {tabla: sorted({cambio["fila_id"] for cambio in cambios if cambio["tabla"] == tabla}) for tabla in TABLAS}
+        # Con varios workers los eventos de GET /eventos salen de aquí, con el id del último cambio de
+        # cada fila; el tipo sale de la operación (INSERT es una alta) y del estado de la reserva
+        ultimo_cambio = {(cambio["tabla"], cambio["fila_id"]): cambio["id"] for cambio in cambios}
+        altas = {(cambio["tabla"], cambio["fila_id"]) for cambio in cambios if cambio["operacion"] == "INSERT"}
+        eventos = []
+        if ids["reservas"]:
+            reservas = _por_ids(
+                """
+                SELECT id, cliente_id, mesa_id, fecha_hora_inicio AS fecha_inicio, fecha_hora_fin AS fecha_fin,
+                       num_comensales AS numero_comensales, estado, notas, fecha_creacion
+                FROM reservas WHERE id IN (SELECT value FROM json_each(?))
+                """,
+                ids["reservas"], conexion,
+            )
+            for reserva_id in ids["reservas"]:
+                if reserva_id in reservas:
+                    reserva = reservas[reserva_id]
+                    tipo = "reserva_creada" if ("reservas", reserva_id) in altas else EVENTOS_ESTADO[reserva["estado"]]
+                    eventos.append((ultimo_cambio[("reservas", reserva_id)], tipo, reserva))
+                    indice_reservas.registrar_reserva(reserva)
+                else:
+                    indice_reservas.quitar_reserva(reserva_id)
+        if ids["mesas"]:
+            mesas = _por_ids(
+                "SELECT id, numero, capacidad, ubicacion, activa FROM mesas WHERE id IN (SELECT value FROM json_each(?))",
+                ids["mesas"], conexion,
+            )
+            for mesa_id in ids["mesas"]:
+                cache_mesas.invalidar(mesa_id)
+                if mesa_id in mesas:
+                    tipo = "mesa_creada" if ("mesas", mesa_id) in altas else "mesa_actualizada"
+                    eventos.append((ultimo_cambio[("mesas", mesa_id)], tipo, mesas[mesa_id]))
+                    indice_reservas.registrar_mesa(mesas[mesa_id])
+                else:
+                    eventos.append((ultimo_cambio[("mesas", mesa_id)], "mesa_eliminada", {"id": mesa_id}))
+                    indice_reservas.quitar_mesa(mesa_id)
+        for cliente_id in ids["clientes"]:
+            cache_clientes.invalidar(cliente_id)
+        versiones.tocar(*(tabla for tabla in TABLAS if ids[tabla]))
+        for id_cambio, tipo, datos in sorted(eventos, key=lambda evento: evento[0]):
+            centro_eventos.publicar(tipo, datos, id_cambio)
+
+    def _recargar(self, ultimo_cambio: int):
+        """Recarga todo el estado en memoria cuando no se pueden aplicar los cambios uno a uno."""
+        indice_reservas.cargar()
+        cache_mesas.invalidar()
+        cache_clientes.invalidar()
+        versiones.tocar(*TABLAS)
+        # Los clientes de GET /eventos se han perdido cambios: tienen que volver a cargarlo todo
+        centro_eventos.reiniciar(ultimo_cambio)
+        with self._bloqueo:
+            self._recargas += 1
+
+    def metricas(self) -> dict:
+        with self._bloqueo:
+            return {
+                "activa": self._ultimo_id is not None,
+                "ultimo_cambio": self._ultimo_id,
+                "sincronizaciones": self._sincronizaciones,
+                "cambios_aplicados": self._cambios_aplicados,
+                "recargas": self._recargas,
+            }
+
+
+# Estado de coherencia de este proceso
+coherencia = Coherencia()
+
+
+def podar_cambios(retencion_segundos: int = RETENCION_SEGUNDOS) -> dict:
+    """Borra los cambios más antiguos que `retencion_segundos` (siempre se guarda el último)."""
+    limite = formatear_fecha(datetime.now() - timedelta(seconds=retencion_segundos))
+    with transaccion() as conexion:
+        borrados = conexion.execute(
+            f"DELETE FROM {TABLA_CAMBIOS} WHERE fecha < ? AND id < (SELECT MAX(id) FROM {TABLA_CAMBIOS})", (limite,)
+        ).rowcount
+    return {"borrados": borrados}
@@ -0,0 +1,47 @@
+"""Configuración de la base de datos a partir de variables de entorno."""
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# Raíz del proyecto: la ruta por defecto de la base de datos no depende del directorio de trabajo
+RAIZ_PROYECTO = Path(__file__).resolve().parent.parent
+RUTA_DB_POR_DEFECTO = RAIZ_PROYECTO / "data" / "restaurante.db"
+
+
+@dataclass(frozen=True)
+class ConfiguracionDB:
+    """
+    Ajustes de la base de datos.
+    Hay dos juegos de conexiones: el de escritura (transacciones y cambios) y el de lectura,
+    abierto en modo solo lectura, para que los listados y estadísticas no compitan con las reservas.
+    `ruta_lectura` permite leer de una réplica; por defecto es el mismo fichero.
+    """
+    ruta: str
+    ruta_lectura: str
+    tamano_escritura: int = 2
+    tamano_lectura: int = 8
+    timeout_pool: float = 10
+    cache_sentencias: int = 256
+
+
+def _ruta(valor: Optional[str], por_defecto: Path) -> str:
+    """Las rutas relativas se resuelven una sola vez al leer la configuración."""
+    return str(Path(valor).resolve()) if valor else str(por_defecto)
+
+
+def cargar_configuracion_db() -> ConfiguracionDB:
+    """Lee la configuración de la base de datos de las variables de entorno."""
+    ruta = _ruta(os.environ.get("RESERVAS_DB_RUTA"), RUTA_DB_POR_DEFECTO)
+    return ConfiguracionDB(
+        ruta=ruta,
+        ruta_lectura=_ruta(os.environ.get("RESERVAS_DB_RUTA_LECTURA"), Path(ruta)),
+        tamano_escritura=int(os.environ.get("RESERVAS_DB_POOL_ESCRITURA", "2")),
+        tamano_lectura=int(os.environ.get("RESERVAS_DB_POOL", "8")),
+        timeout_pool=float(os.environ.get("RESERVAS_DB_POOL_TIMEOUT", "10")),
+        cache_sentencias=int(os.environ.get("RESERVAS_DB_CACHE_SENTENCIAS", "256")),
+    )
+
+
+configuracion_db = cargar_configuracion_db()
@@ -1,47 +1,407 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
+
+from app import instrumentacion
+from app.config import ConfiguracionDB, configuracion_db
+from app.exceptions.custom_exceptions import PoolAgotadoError
+
+# Roles de las conexiones: las de escritura hacen transacciones y cambios;
+# las de lectura se abren en modo solo lectura (mode=ro y query_only)
+ROL_ESCRITURA = "escritura"
+ROL_LECTURA = "lectura"
+
+# Formato en el que se guardan todas las fechas con hora.
+# Es texto ordenable: comparar cadenas equivale a comparar fechas, así que los
+# filtros por rango pueden usar los índices sobre las columnas de fecha
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+# Pragmas que se aplican a cada conexión nueva
+# WAL permite lecturas concurrentes con una escritura, y synchronous=NORMAL es seguro con WAL
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-16000"),      # 16 MB de caché de páginas por conexión
+    ("mmap_size", "134217728"),    # 128 MB mapeados en memoria
+    ("busy_timeout", "5000"),      # esperar hasta 5 s si la base de datos está bloqueada
+    ("temp_store", "MEMORY"),
+)
+
+
+# Convierte una fecha al formato normalizado de la base de datos
+def formatear_fecha(valor):
+    """
+    Devuelve la fecha como texto 'YYYY-MM-DD HH:MM:SS' en hora local.
+    Las fechas con zona horaria se pasan a hora local antes de guardarse.
+    """
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    elif isinstance(valor, date) and not isinstance(valor, datetime):
+        valor = datetime.combine(valor, datetime.min.time())
+    if valor.tzinfo is not None:
+        valor = valor.astimezone().replace(tzinfo=None)
+    return valor.strftime(FORMATO_FECHA)
+
+
+# Devuelve el rango semiabierto [inicio, fin) que cubre uno o varios días completos
+def rango_dias(fecha, dias: int = 1):
+    """Calcula el inicio y el fin (exclusivo) de un rango de días para filtrar por fecha."""
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha)
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    inicio = datetime.combine(fecha, datetime.min.time())
+    return formatear_fecha(inicio), formatear_fecha(inicio + timedelta(days=dias))
+
+
+# Todas las fechas que se pasan como parámetro se guardan en el formato normalizado
+sqlite3.register_adapter(datetime, formatear_fecha)
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones SQLite reutilizables.
+    Cada petición toma prestada una conexión y la devuelve al terminar,
+    en lugar de abrir y cerrar una conexión por consulta.
+    """
+
+    def __init__(self, ruta: str, tamano: int = 8, timeout: float = 10, cache_sentencias: int = 256,
+                 solo_lectura: bool = False):
+        self.ruta = ruta
+        self.solo_lectura = solo_lectura
+        self.tamano = tamano
+        self.timeout = timeout
+        self.cache_sentencias = cache_sentencias
+        self._libres = queue.LifoQueue()
+        self._bloqueo = threading.Lock()
+        self._creadas = 0
+        self._cerrado = False
+        self._metricas = {
+            "conexiones_creadas": 0,
+            "conexiones_descartadas": 0,
+            "prestamos": 0,
+            "esperas": 0,
+            "tiempo_espera_total": 0.0,
+            "timeouts": 0,
+            "errores": 0,
+        }
+
+    # Abre una conexión nueva con los pragmas ajustados
+    def _crear_conexion(self):
+        """Crea una conexión nueva configurada para el pool."""
+        conexion = sqlite3.connect(
+            f"file:{quote(self.ruta)}?mode=ro" if self.solo_lectura else self.ruta,
+            timeout=5,
+            isolation_level=None,  # autocommit: las transacciones se abren explícitamente
+            check_same_thread=False,
+            cached_statements=self.cache_sentencias,
+            uri=self.solo_lectura,
+        )
+        conexion.row_factory = sqlite3.Row
+        for nombre, valor in PRAGMAS:
+            # El modo del journal lo fija la conexión de escritura (queda guardado en el fichero)
+            if self.solo_lectura and nombre == "journal_mode":
+                continue
+            conexion.execute(f"PRAGMA {nombre} = {valor}")
+        if self.solo_lectura:
+            conexion.execute("PRAGMA query_only = ON")
+        return conexion
+
+    # Toma una conexión libre, crea una nueva si hay hueco o espera a que se libere una
+    def _tomar(self):
+        """Saca una conexión del pool."""
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._bloqueo:
+            if self._cerrado:
+                raise PoolAgotadoError("El pool de conexiones está cerrado")
+            if self._creadas < self.tamano:
+                self._creadas += 1
+                self._metricas["conexiones_creadas"] += 1
+                crear = True
+            else:
+                crear = False
+        if crear:
+            try:
+                return self._crear_conexion()
+            except Exception:
+                with self._bloqueo:
+                    self._creadas -= 1
+                raise
+
+        inicio = time.perf_counter()
+        self._metricas["esperas"] += 1
+        try:
+            conexion = self._libres.get(timeout=self.timeout)
+        except queue.Empty:
+            self._metricas["timeouts"] += 1
+            raise PoolAgotadoError("No hay conexiones libres en el pool de base de datos")
+        finally:
+            self._metricas["tiempo_espera_total"] += time.perf_counter() - inicio
+        return conexion
+
+    # Devuelve la conexión al pool, o la cierra si quedó en mal estado
+    def _devolver(self, conexion, descartar: bool = False):
+        """Devuelve una conexión al pool."""
+        if not descartar:
+            try:
+                if conexion.in_transaction:
+                    conexion.rollback()
+            except sqlite3.Error:
+                descartar = True
+        if descartar or self._cerrado:
+            try:
+                conexion.close()
+            except sqlite3.Error:
+                pass
+            with self._bloqueo:
+                self._creadas -= 1
+                if descartar:
+                    self._metricas["conexiones_descartadas"] += 1
+            return
+        self._libres.put(conexion)
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión del pool durante el bloque `with`."""
+        conexion = self._tomar()
+        self._metricas["prestamos"] += 1
+        descartar = False
+        try:
+            yield conexion
+        except (sqlite3.ProgrammingError, sqlite3.InterfaceError):
+            self._metricas["errores"] += 1
+            descartar = True
+            raise
+        except sqlite3.Error:
+            self._metricas["errores"] += 1
+            raise
+        finally:
+            self._devolver(conexion, descartar)
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres del pool."""
+        with self._bloqueo:
+            self._cerrado = True
+        while True:
+            try:
+                conexion = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            conexion.close()
+            with self._bloqueo:
+                self._creadas -= 1
+
+    def metricas(self):
+        """Devuelve los contadores del pool."""
+        with self._bloqueo:
+            creadas = self._creadas
+        return {
+            **self._metricas,
+            "tamano": self.tamano,
+            "abiertas": creadas,
+            "libres": self._libres.qsize(),
+            "en_uso": creadas - self._libres.qsize(),
+        }
+
+    def salud(self):
+        """Comprueba que la base de datos responde y devuelve las métricas."""
+        try:
+            with self.conexion() as conexion:
+                conexion.execute("SELECT 1").fetchone()
+            estado = "ok"
+        except (sqlite3.Error, PoolAgotadoError) as e:
+            estado = f"error: {e}"
+        return {"estado": estado, **self.metricas()}
+
+
+# Pools globales del proceso, uno por rol. Se crean al primer uso y se recrean si el proceso
+# se ha bifurcado (por ejemplo con varios workers), porque las conexiones
+# SQLite no se pueden compartir entre procesos
+_configuracion = configuracion_db
+_pools = {}
+_pool_pid = None
+_pool_bloqueo = threading.Lock()
+
+
+def _crear_pool(rol: str, configuracion: ConfiguracionDB) -> PoolConexiones:
+    if rol == ROL_LECTURA:
+        return PoolConexiones(configuracion.ruta_lectura, configuracion.tamano_lectura, configuracion.timeout_pool,
+                              configuracion.cache_sentencias, solo_lectura=True)
+    return PoolConexiones(configuracion.ruta, configuracion.tamano_escritura, configuracion.timeout_pool,
+                          configuracion.cache_sentencias)
+
+
+def obtener_pool(rol: str = ROL_ESCRITURA):
+    """Devuelve el pool de conexiones del proceso actual para el rol indicado."""
+    global _pools, _pool_pid
+    pool = _pools.get(rol) if _pool_pid == os.getpid() else None
+    if pool is None:
+        with _pool_bloqueo:
+            if _pool_pid != os.getpid():
+                _pools = {}
+                _pool_pid = os.getpid()
+            pool = _pools.get(rol)
+            if pool is None:
+                pool = _pools[rol] = _crear_pool(rol, _configuracion)
+    return pool
+
+
+def configurar_pool(ruta: str = None, tamano: int = None, ruta_lectura: str = None):
+    """
+    Reemplaza los pools globales (útil para scripts y benchmarks).
+    Si se cambia la ruta y no se indica ruta de lectura, se lee del mismo fichero.
+    """
+    global _configuracion, _pools, _pool_pid
+    cambios = {}
+    if ruta is not None:
+        cambios["ruta"] = ruta
+        cambios["ruta_lectura"] = ruta
+    if ruta_lectura is not None:
+        cambios["ruta_lectura"] = ruta_lectura
+    if tamano is not None:
+        cambios["tamano_lectura"] = tamano
+    with _pool_bloqueo:
+        if _pool_pid == os.getpid():
+            for pool in _pools.values():
+                pool.cerrar()
+        _configuracion = replace(_configuracion, **cambios)
+        _pools = {}
+        _pool_pid = os.getpid()
+    return obtener_pool()
+
+
+def cerrar_pool():
+    """Cierra los pools globales."""
+    global _pools
+    with _pool_bloqueo:
+        if _pool_pid == os.getpid():
+            for pool in _pools.values():
+                pool.cerrar()
+        _pools = {}
+
+
+# Las consultas que solo leen (SELECT, o WITH sin cambios) van al pool de lectura;
+# el resto (INSERT/UPDATE/DELETE, también con RETURNING) al de escritura
+_ESCRITURAS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "RETURNING")
+_roles_consulta = {}
+
+
+def rol_consulta(consulta: str) -> str:
+    """Devuelve el rol de conexión que necesita una consulta (se guarda en caché por texto)."""
+    rol = _roles_consulta.get(consulta)
+    if rol is None:
+        palabras = consulta.upper().split()
+        solo_lee = bool(palabras) and palabras[0] in ("SELECT", "WITH") and not any(p in _ESCRITURAS for p in palabras)
+        rol = ROL_LECTURA if solo_lee else ROL_ESCRITURA
+        if len(_roles_consulta) < 4096:
+            _roles_consulta[consulta] = rol
+    return rol
+
+
+# Abre una transacción de escritura en una sola conexión del pool
+@contextmanager
+def transaccion():
+    """
+    Abre una transacción con BEGIN IMMEDIATE y devuelve la conexión.
+    BEGIN IMMEDIATE toma el bloqueo de escritura al empezar, así que dos transacciones
+    no pueden validar y escribir a la vez. Si el bloque termina bien se hace COMMIT,
+    si lanza una excepción se hace ROLLBACK.
+    """
+    with obtener_pool().conexion() as conexion:
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.rollback()
+            raise
+        conexion.commit()
+
+
+def _primera_fila(conexion, consulta, parametros):
+    """Devuelve la primera fila y cierra el cursor (así un INSERT/UPDATE ... RETURNING termina de ejecutarse)."""
+    cursor = conexion.execute(consulta, parametros)
+    try:
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
 
 # esta funcion es para obtener un solo resultado de la base de datos, por ejemplo, un cliente por su email
-def obtener_uno(consulta, parametros=()):
+def obtener_uno(consulta, parametros=(), conexion=None):
     """
     Ejecuta una consulta SQL y devuelve una sola fila.
     Si no hay resultados, devuelve None.
+    Si se pasa una conexión (por ejemplo la de una transacción) se usa esa.
     """
-    conexion = sqlite3.connect("data/restaurante.db")
-    conexion.row_factory = sqlite3.Row
-    cursor = conexion.cursor()
+    inicio = time.perf_counter()
+    if conexion is not None:
+        resultado = _primera_fila(conexion, consulta, parametros)
+    else:
+        with obtener_pool(rol_consulta(consulta)).conexion() as conexion:
+            resultado = _primera_fila(conexion, consulta, parametros)
+    instrumentacion.registrar_consulta(consulta, time.perf_counter() - inicio)
 
-    cursor.execute(consulta, parametros)
-    resultado = cursor.fetchone()
-
-    conexion.close()
     if resultado is None:
         return None
     return dict(resultado)
 
 # esta funcion es para obtener muchos resultados de la base de datos, por ejemplo, todas las reservas de un cliente
-def obtener_todos(consulta, parametros=()):
+def obtener_todos(consulta, parametros=(), conexion=None):
     """
     Ejecuta una consulta SQL y devuelve muchas filas.
-    Si no hay resultados, devuelve None.
+    Si no hay resultados, devuelve una lista vacía.
+    Si se pasa una conexión (por ejemplo la de una transacción) se usa esa.
     """
-    conexion = sqlite3.connect("data/restaurante.db")
-    conexion.row_factory = sqlite3.Row
-    cursor = conexion.cursor()
+    inicio = time.perf_counter()
+    if conexion is not None:
+        resultado = conexion.execute(consulta, parametros).fetchall()
+    else:
+        with obtener_pool(rol_consulta(consulta)).conexion() as conexion:
+            resultado = conexion.execute(consulta, parametros).fetchall()
+    instrumentacion.registrar_consulta(consulta, time.perf_counter() - inicio)
 
-    cursor.execute(consulta, parametros)
-    resultado = cursor.fetchall()
-
-    conexion.close()
     return [dict(fila) for fila in resultado]
 
-# esta funcion es para ejecutar una consulta SQL que no devuelve resultados, por ejemplo, para insertar un nuevo cliente o actualizar una reserva
-def ejecutar_consulta(consulta, parametros=()):
+# Recorre el resultado de una consulta por lotes, sin cargarlo entero en memoria (para exportaciones)
+def iterar_lotes(consulta, parametros=(), tamano_lote: int = 500):
     """
-    Ejecuta una consulta SQL que no devuelve resultados (INSERT, UPDATE, DELETE). 
+    Generador que devuelve las filas de la consulta en listas de como mucho `tamano_lote` filas (fetchmany).
+    La conexión del pool de lectura queda prestada hasta que el generador se agota o se cierra.
     """
-    conexion = sqlite3.connect("data/restaurante.db")
-    cursor = conexion.cursor()
+    with obtener_pool(ROL_LECTURA).conexion() as conexion:
+        inicio = time.perf_counter()
+        cursor = conexion.execute(consulta, parametros)
+        instrumentacion.registrar_consulta(consulta, time.perf_counter() - inicio)
+        try:
+            while True:
+                lote = cursor.fetchmany(tamano_lote)
+                if not lote:
+                    return
+                yield lote
+        finally:
+            cursor.close()
 
-    cursor.execute(consulta, parametros)
-    conexion.commit()  # Guardar cambios en la base de datos
-    conexion.close()
+# esta funcion es para ejecutar una consulta SQL que no devuelve resultados, por ejemplo, para insertar un nuevo cliente o actualizar una reserva
+def ejecutar_consulta(consulta, parametros=(), conexion=None):
+    """
+    Ejecuta una consulta SQL que no devuelve resultados (INSERT, UPDATE, DELETE).
+    Las conexiones del pool están en modo autocommit, así que el cambio queda guardado al terminar.
+    Si se pasa la conexión de una transacción, el cambio se guarda con el COMMIT de esa transacción.
+    """
+    inicio = time.perf_counter()
+    if conexion is not None:
+        conexion.execute(consulta, parametros)
+    else:
+        with obtener_pool().conexion() as conexion:
+            conexion.execute(consulta, parametros)
+    instrumentacion.registrar_consulta(consulta, time.perf_counter() - inicio)
@@ -0,0 +1,66 @@
+"""Acceso asíncrono a la base de datos."""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import database
+
+# Hilos dedicados a SQLite. Por defecto tantos como conexiones tienen los pools de lectura
+# y escritura juntos, así ningún hilo se queda esperando una conexión libre
+HILOS_DB = int(os.environ.get(
+    "RESERVAS_DB_HILOS",
+    str(database.configuracion_db.tamano_lectura + database.configuracion_db.tamano_escritura),
+))
+
+_ejecutor = None
+_ejecutor_pid = None
+_ejecutor_bloqueo = threading.Lock()
+
+
+def obtener_ejecutor() -> ThreadPoolExecutor:
+    """Devuelve el ejecutor de base de datos del proceso actual."""
+    global _ejecutor, _ejecutor_pid
+    if _ejecutor is None or _ejecutor_pid != os.getpid():
+        with _ejecutor_bloqueo:
+            if _ejecutor is None or _ejecutor_pid != os.getpid():
+                _ejecutor = ThreadPoolExecutor(max_workers=HILOS_DB, thread_name_prefix="db")
+                _ejecutor_pid = os.getpid()
+    return _ejecutor
+
+
+def cerrar_ejecutor():
+    """Espera a que terminen las tareas pendientes y cierra el ejecutor."""
+    global _ejecutor
+    with _ejecutor_bloqueo:
+        if _ejecutor is not None and _ejecutor_pid == os.getpid():
+            _ejecutor.shutdown(wait=True)
+        _ejecutor = None
+
+
+# Ejecuta una función síncrona de base de datos en el ejecutor dedicado,
+# sin bloquear el bucle de eventos. Se copia el contexto (contextvars) de la petición
+async def ejecutar_en_db(funcion, *args, **kwargs):
+    """Ejecuta `funcion(*args, **kwargs)` en un hilo de base de datos y espera el resultado."""
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    llamada = functools.partial(contexto.run, funcion, *args, **kwargs)
+    return await loop.run_in_executor(obtener_ejecutor(), llamada)
+
+
+async def obtener_uno(consulta, parametros=()):
+    """Versión asíncrona de database.obtener_uno."""
+    return await ejecutar_en_db(database.obtener_uno, consulta, parametros)
+
+
+async def obtener_todos(consulta, parametros=()):
+    """Versión asíncrona de database.obtener_todos."""
+    return await ejecutar_en_db(database.obtener_todos, consulta, parametros)
+
+
+async def ejecutar_consulta(consulta, parametros=()):
+    """Versión asíncrona de database.ejecutar_consulta."""
+    return await ejecutar_en_db(database.ejecutar_consulta, consulta, parametros)
@@ -0,0 +1,177 @@
+"""
+Escritor agrupado (group commit): un único hilo vacía una cola de escrituras pequeñas y las
+confirma por lotes, con una transacción y un COMMIT por lote en lugar de uno por escritura.
+Cada llamante recibe el resultado de su propia operación cuando el lote ya está confirmado.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from app.database import transaccion
+from app.indice_reservas import indice_reservas
+
+# Con RESERVAS_ESCRITURA_AGRUPADA=0 cada cambio de estado usa su propia transacción
+ACTIVO = os.environ.get("RESERVAS_ESCRITURA_AGRUPADA", "1") != "0"
+# Operaciones como mucho por lote y milisegundos que se espera a que lleguen más
+# antes de confirmar (0: se confirma lo que ya esté en la cola, sin esperar)
+TAMANO_LOTE = int(os.environ.get("RESERVAS_ESCRITURA_LOTE", "64"))
+ESPERA_MS = float(os.environ.get("RESERVAS_ESCRITURA_ESPERA_MS", "0"))
+
+log = logging.getLogger("app.escritor")
+
+
+class EscritorAgrupado:
+    """
+    Cada operación es una función que recibe la conexión de la transacción del lote. Se ejecuta
+    dentro de un SAVEPOINT propio: si falla, solo se deshace esa operación y su llamante recibe
+    la excepción; el resto del lote se confirma. Tras el COMMIT se llama a `al_confirmar` de cada
+    operación con su resultado (por ejemplo para actualizar el índice en memoria).
+    El lote se ejecuta con el bloqueo de escritura del índice de reservas, como las demás
+    escrituras de reservas.
+    """
+
+    def __init__(self, tamano_lote: int = TAMANO_LOTE, espera_ms: float = ESPERA_MS, activo: bool = ACTIVO):
+        self.tamano_lote = tamano_lote
+        self.espera_ms = espera_ms
+        self.activo = activo
+        self._cola = queue.Queue()
+        self._bloqueo = threading.Lock()
+        self._hilo = None
+        self._hilo_pid = None
+        self._lotes = 0
+        self._operaciones = 0
+        self._errores = 0
+        self._lote_maximo = 0
+
+    def _asegurar_hilo(self):
+        # Tras un fork (varios workers) el hilo del proceso padre no existe en el hijo
+        if self._hilo is None or self._hilo_pid != os.getpid() or not self._hilo.is_alive():
+            with self._bloqueo:
+                if self._hilo is None or self._hilo_pid != os.getpid() or not self._hilo.is_alive():
+                    self._cola = queue.Queue()
+                    self._hilo = threading.Thread(target=self._bucle, name="escritor", daemon=True)
+                    self._hilo_pid = os.getpid()
+                    self._hilo.start()
+
+    def encolar(self, operacion: Callable, al_confirmar: Optional[Callable] = None) -> Future:
+        """Añade una operación a la cola y devuelve un Future con su resultado."""
+        self._asegurar_hilo()
+        futuro = Future()
+        self._cola.put((operacion, al_confirmar, futuro))
+        return futuro
+
+    async def ejecutar(self, operacion: Callable, al_confirmar: Optional[Callable] = None):
+        """Versión asíncrona de encolar: espera a que el lote de la operación esté confirmado."""
+        return await asyncio.wrap_future(self.encolar(operacion, al_confirmar))
+
+    def detener(self):
+        """Confirma lo que quede en la cola y para el hilo."""
+        if self._hilo is not None and self._hilo_pid == os.getpid() and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join()
+        self._hilo = None
+
+    def _siguiente_lote(self) -> tuple[list, bool]:
+        """
+        Espera la primera operación y recoge las que lleguen hasta llenar el lote; indica si hay que parar.
+        Cada operación se marca en marcha al sacarla de la cola: las que su llamante ya canceló
+        (por ejemplo porque se cortó la petición) se descartan sin ejecutarse, y las demás ya no
+        se pueden cancelar, así que su Future siempre admite el resultado.
+        """
+        lote = []
+        while not lote:
+            primera = self._cola.get()
+            if primera is None:
+                return [], True
+            if primera[2].set_running_or_notify_cancel():
+                lote.append(primera)
+        limite = time.monotonic() + self.espera_ms / 1000
+        while len(lote) < self.tamano_lote:
+            try:
+                restante = limite - time.monotonic()
+                elemento = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if elemento is None:
+                return lote, True
+            if elemento[2].set_running_or_notify_cancel():
+                lote.append(elemento)
+        return lote, False
+
+    def _bucle(self):
+        parar = False
+        while not parar:
+            lote, parar = self._siguiente_lote()
+            if lote:
+                try:
+                    self._ejecutar_lote(lote)
+                except Exception as e:
+                    # El hilo no debe morir: dejaría sin respuesta lo que quede en la cola
+                    log.exception("Error al resolver un lote de %s escrituras", len(lote))
+                    for _, _, futuro in lote:
+                        if not futuro.done():
+                            futuro.set_exception(e)
+
+    def _ejecutar_lote(self, lote: list):
+        resultados = []
+        try:
+            with indice_reservas.escritura():
+                with transaccion() as conexion:
+                    for operacion, _, _ in lote:
+                        conexion.execute("SAVEPOINT operacion")
+                        try:
+                            resultados.append((True, operacion(conexion)))
+                            conexion.execute("RELEASE operacion")
+                        except Exception as e:
+                            conexion.execute("ROLLBACK TO operacion")
+                            conexion.execute("RELEASE operacion")
+                            resultados.append((False, e))
+                # El lote ya está guardado: un error aquí no cambia el resultado de las operaciones
+                for (_, al_confirmar, _), (correcta, resultado) in zip(lote, resultados):
+                    if correcta and al_confirmar is not None:
+                        try:
+                            al_confirmar(resultado)
+                        except Exception:
+                            log.exception("Error después de confirmar una escritura")
+        except Exception as e:
+            # Falló la transacción entera (por ejemplo el COMMIT): ninguna operación se ha guardado
+            log.exception("Error al confirmar un lote de %s escrituras", len(lote))
+            resultados = [(False, e)] * len(lote)
+        errores = 0
+        for (_, _, futuro), (correcta, resultado) in zip(lote, resultados):
+            if not correcta:
+                errores += 1
+            if futuro.done():
+                continue
+            if correcta:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(resultado)
+        with self._bloqueo:
+            self._lotes += 1
+            self._operaciones += len(lote)
+            self._errores += errores
+            self._lote_maximo = max(self._lote_maximo, len(lote))
+
+    def metricas(self) -> dict:
+        """Lotes confirmados, operaciones, errores y tamaño de los lotes."""
+        with self._bloqueo:
+            return {
+                "activo": self.activo,
+                "lotes": self._lotes,
+                "operaciones": self._operaciones,
+                "errores": self._errores,
+                "operaciones_por_lote": round(self._operaciones / self._lotes, 2) if self._lotes else 0,
+                "lote_maximo": self._lote_maximo,
+                "en_cola": self._cola.qsize(),
+            }
+
+
+# Escritor compartido por todo el proceso
+escritor = EscritorAgrupado()
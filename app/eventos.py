@@ -0,0 +1,222 @@
+"""
+Centro de eventos para `GET /eventos` (server-sent events): los servicios publican cada cambio
+de reservas y mesas y el centro lo reparte a todas las pantallas conectadas, en lugar de que
+cada una consulte los listados cada pocos segundos.
+Cada evento se serializa una sola vez al publicarlo y se guarda en un historial circular, de
+donde se reenvían los que un cliente se ha perdido al reconectar con `Last-Event-ID`.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# Eventos que se guardan para poder reanudar con Last-Event-ID
+HISTORIAL = int(os.environ.get("RESERVAS_EVENTOS_HISTORIAL", "1000"))
+# Eventos pendientes de enviar como mucho por cliente; un cliente que se queda atrás se desconecta
+# y, al reconectar, recupera lo que le falta del historial
+TAMANO_COLA = int(os.environ.get("RESERVAS_EVENTOS_COLA", "256"))
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+LATIDO_SEGUNDOS = float(os.environ.get("RESERVAS_EVENTOS_LATIDO", "15"))
+
+# Época de los ids con el registro de cambios: sus ids son los mismos en todos los procesos
+EPOCA_CAMBIOS = "cambios"
+
+# Tipo de evento de cada cambio de estado de una reserva
+EVENTOS_ESTADO = {
+    "pendiente": "reserva_actualizada",
+    "confirmada": "reserva_confirmada",
+    "completada": "reserva_completada",
+    "cancelada": "reserva_cancelada",
+}
+
+
+class Evento:
+    """Un evento ya serializado en formato SSE."""
+
+    __slots__ = ("numero", "tipo", "fecha", "texto")
+
+    def __init__(self, epoca: str, numero: int, tipo: str, datos: dict):
+        self.numero = numero
+        self.tipo = tipo
+        # Día de la reserva, para los clientes que solo siguen un día (los eventos de mesas no tienen)
+        self.fecha = str(datos["fecha_inicio"])[:10] if datos.get("fecha_inicio") else None
+        self.texto = f"id: {epoca}-{numero}\nevent: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+class Suscripcion:
+    """Cola acotada de eventos de un cliente conectado."""
+
+    def __init__(self, bucle: asyncio.AbstractEventLoop, fecha: Optional[str], desde: int):
+        self.bucle = bucle
+        self.fecha = fecha
+        self.desde = desde
+        self.cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.cerrada = False
+        self.desbordada = False
+
+    def acepta(self, evento: Evento) -> bool:
+        return evento.numero > self.desde and (self.fecha is None or evento.fecha is None or evento.fecha == self.fecha)
+
+    def entregar(self, evento: Optional[Evento]):
+        """Se ejecuta en el bucle del cliente. None cierra la suscripción cuando haya enviado lo pendiente."""
+        if self.cerrada or (evento is not None and not self.acepta(evento)):
+            return
+        if evento is not None and not self.cola.full():
+            self.cola.put_nowait(evento)
+            return
+        # Cierre, o cliente demasiado atrasado: se le desconecta en lugar de guardar sin límite
+        # (al reconectar con Last-Event-ID recupera lo que le falta del historial)
+        self.cerrada = True
+        if self.cola.full():
+            self.desbordada = evento is not None
+            while not self.cola.empty():
+                self.cola.get_nowait()
+        self.cola.put_nowait(None)
+
+
+class CentroEventos:
+    """
+    Reparte los eventos a los clientes conectados a `GET /eventos`.
+    `publicar` se puede llamar desde cualquier hilo (los servicios escriben en los hilos de base
+    de datos y en el del escritor agrupado): cada evento se entrega en el bucle de cada cliente.
+    Con un solo proceso publican los servicios y los ids son `<época>-<número>`, con una época
+    nueva en cada arranque. Con varios workers (RESERVAS_MULTIPROCESO=1) los eventos salen del
+    registro de cambios que aplica cada proceso (app/coherencia.py) y el número es el id del
+    cambio, así que un cliente puede reanudar en cualquier worker.
+    """
+
+    def __init__(self, historial: int = HISTORIAL):
+        self._bloqueo = threading.Lock()
+        self._historial = deque(maxlen=historial)
+        self._suscripciones = set()
+        self.epoca = format(int(time.time() * 1000), "x")
+        self.registro_cambios = False
+        self._ultimo = 0
+        self._descartado_hasta = 0
+        self._publicados = 0
+        self._desbordadas = 0
+
+    def usar_registro_cambios(self):
+        """Los eventos saldrán del registro de cambios (varios workers) y no de los servicios."""
+        with self._bloqueo:
+            self.registro_cambios = True
+            self.epoca = EPOCA_CAMBIOS
+
+    def publicar(self, tipo: str, datos: Optional[dict], id_cambio: Optional[int] = None):
+        """
+        Publica un evento con los datos de la fila cambiada. Los servicios no pasan `id_cambio`;
+        la coherencia entre procesos sí. Cada evento solo se publica por el camino activo.
+        """
+        if not datos or (id_cambio is not None) != self.registro_cambios:
+            return
+        with self._bloqueo:
+            numero = id_cambio if id_cambio is not None else self._ultimo + 1
+            if numero <= self._ultimo:
+                return
+            self._ultimo = numero
+            evento = Evento(self.epoca, numero, tipo, datos)
+            if len(self._historial) == self._historial.maxlen:
+                self._descartado_hasta = self._historial[0].numero
+            self._historial.append(evento)
+            self._publicados += 1
+            # Se entrega con el bloqueo tomado para que todos los clientes reciban los eventos en orden
+            self._enviar_a_todos(evento)
+
+    def publicar_reserva(self, reserva: Optional[dict], tipo: Optional[str] = None):
+        """Publica el cambio de una reserva; sin `tipo`, el que corresponde a su estado."""
+        if reserva:
+            self.publicar(tipo or EVENTOS_ESTADO[reserva["estado"]], reserva)
+
+    def reiniciar(self, hasta: Optional[int] = None):
+        """
+        Avisa a todos los clientes de que deben volver a cargar el estado completo (por ejemplo
+        cuando la coherencia recarga todo porque faltaban cambios) y los desconecta. `hasta` es el
+        último cambio ya incluido en el estado recargado; los ids anteriores dejan de poder reanudarse.
+        """
+        with self._bloqueo:
+            self._ultimo = hasta if hasta is not None else self._ultimo + 1
+            self._descartado_hasta = self._ultimo
+            self._historial.clear()
+            self._enviar_a_todos(None)
+
+    def _enviar_a_todos(self, evento: Optional[Evento]):
+        """Pasa el evento al bucle de cada cliente (llamar con el bloqueo tomado)."""
+        for suscripcion in list(self._suscripciones):
+            try:
+                suscripcion.bucle.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # El bucle del cliente ya está cerrado
+                self._suscripciones.discard(suscripcion)
+
+    def suscribir(self, ultimo_id: Optional[str] = None, fecha: Optional[str] = None) -> tuple[Suscripcion, list[str]]:
+        """
+        Registra un cliente y devuelve su suscripción y el texto inicial: los eventos del
+        historial posteriores a `ultimo_id`, o un evento `reinicio` si ya no están todos
+        (entonces el cliente debe volver a cargar el estado completo).
+        El registro y la lectura del historial van con el mismo bloqueo, así no se pierde ni
+        se repite ningún evento entre medias.
+        """
+        with self._bloqueo:
+            desde = self._ultimo
+            iniciales = []
+            if ultimo_id:
+                epoca, _, numero = ultimo_id.rpartition("-")
+                if epoca == self.epoca and numero.isdigit() and int(numero) >= self._descartado_hasta:
+                    desde = int(numero)
+                    iniciales = [evento.texto for evento in self._historial if evento.numero > desde and (fecha is None or evento.fecha in (None, fecha))]
+                else:
+                    iniciales = [f"id: {self.epoca}-{self._ultimo}\nevent: reinicio\ndata: {{}}\n\n"]
+            suscripcion = Suscripcion(asyncio.get_running_loop(), fecha, desde)
+            self._suscripciones.add(suscripcion)
+        return suscripcion, iniciales
+
+    def cancelar(self, suscripcion: Suscripcion):
+        """Quita un cliente (al desconectarse)."""
+        with self._bloqueo:
+            if suscripcion in self._suscripciones:
+                self._suscripciones.discard(suscripcion)
+                if suscripcion.desbordada:
+                    self._desbordadas += 1
+
+    def cerrar(self):
+        """Cierra todas las suscripciones (al apagar la API)."""
+        with self._bloqueo:
+            self._enviar_a_todos(None)
+
+    def metricas(self) -> dict:
+        with self._bloqueo:
+            return {
+                "clientes": len(self._suscripciones),
+                "publicados": self._publicados,
+                "ultimo_id": f"{self.epoca}-{self._ultimo}",
+                "en_historial": len(self._historial),
+                "desbordadas": self._desbordadas,
+            }
+
+
+# Centro de eventos compartido por todo el proceso
+centro_eventos = CentroEventos()
+
+
+async def flujo_eventos(suscripcion: Suscripcion, iniciales: list[str]):
+    """Genera el texto SSE de una suscripción hasta que se cierra o el cliente se desconecta."""
+    try:
+        # El navegador reintenta la conexión a los 3 segundos si se corta
+        yield "retry: 3000\n\n"
+        for texto in iniciales:
+            yield texto
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            if evento is None:
+                break
+            yield evento.texto
+    finally:
+        centro_eventos.cancelar(suscripcion)
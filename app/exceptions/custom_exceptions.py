@@ -30,4 +30,8 @@ class MesaNoExisteError(Exception):
 
 class MesaYaExisteError(Exception):
     """Ya existe una mesa con este numero de mesa"""
-    pass  
\ No newline at end of file
+    pass  
+
+class PoolAgotadoError(Exception):
+    """No hay conexiones libres en el pool de base de datos"""
+    pass
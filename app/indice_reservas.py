@@ -0,0 +1,324 @@
+"""Índice en memoria de las reservas activas por mesa."""
+
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from app.database import FORMATO_FECHA, formatear_fecha, obtener_todos
+from app.rejilla import FRANJAS_DIA, bits_intervalo, hora_franja, inicios_posibles, mascara, posiciones, tramos
+
+# Estados que ocupan la mesa
+ESTADOS_ACTIVOS = ("pendiente", "confirmada")
+# Días de la rejilla de disponibilidad que se guardan a la vez (se descartan los menos usados)
+DIAS_REJILLA_MAXIMO = 400
+
+
+def _a_datetime(valor) -> datetime:
+    """Convierte una fecha (texto o datetime) a datetime local sin zona horaria."""
+    return datetime.strptime(formatear_fecha(valor), FORMATO_FECHA)
+
+
+def _fila_mesa(mesa: dict) -> dict:
+    """Datos de una mesa que guarda el índice, con `activa` como booleano (como en las respuestas de /mesas)."""
+    return {
+        "id": mesa["id"],
+        "numero": mesa["numero"],
+        "capacidad": mesa["capacidad"],
+        "ubicacion": mesa["ubicacion"],
+        "activa": bool(mesa["activa"]),
+    }
+
+
+class IndiceReservas:
+    """
+    Índice de intervalos en memoria: para cada mesa guarda sus reservas pendientes y
+    confirmadas ordenadas por fecha de inicio.
+    Así la comprobación de solapamiento es una búsqueda binaria (O(log n)) y la búsqueda
+    de mesas libres no necesita consultar SQLite.
+    Además mantiene la rejilla de disponibilidad (app/rejilla.py): un mapa de bits por día y mesa
+    que se construye la primera vez que se consulta un día y se actualiza con cada cambio.
+    Se carga al arrancar la API y los servicios lo actualizan en cada cambio de reservas y mesas.
+    """
+
+    def __init__(self):
+        self._bloqueo = threading.RLock()
+        self._cargado = False
+        self._inicios = {}          # mesa_id -> lista ordenada de fechas de inicio
+        self._intervalos = {}       # mesa_id -> lista ordenada de (inicio, fin, reserva_id)
+        self._duracion_maxima = {}  # mesa_id -> duración de la reserva más larga
+        self._reservas = {}         # reserva_id -> (mesa_id, inicio, fin)
+        self._mesas = {}            # mesa_id -> fila de la mesa
+        self._orden_mesas = []      # (capacidad, numero, mesa_id) ordenado, para buscar la mesa más ajustada
+        self._rejilla = OrderedDict()  # fecha -> {mesa_id: franjas ocupadas}
+
+    # Carga completa desde la base de datos
+    def cargar(self):
+        """Reconstruye el índice a partir de la base de datos."""
+        mesas = obtener_todos("SELECT id, numero, capacidad, ubicacion, activa FROM mesas")
+        reservas = obtener_todos(
+            f"""
+            SELECT id, mesa_id, fecha_hora_inicio, fecha_hora_fin FROM reservas
+            WHERE estado IN ({", ".join("?" for _ in ESTADOS_ACTIVOS)})
+            """,
+            ESTADOS_ACTIVOS,
+        )
+        with self._bloqueo:
+            self._inicios = {}
+            self._intervalos = {}
+            self._duracion_maxima = {}
+            self._reservas = {}
+            self._rejilla = OrderedDict()
+            self._mesas = {mesa["id"]: _fila_mesa(mesa) for mesa in mesas}
+            self._ordenar_mesas()
+            for fila in reservas:
+                self._agregar(fila["id"], fila["mesa_id"], _a_datetime(fila["fecha_hora_inicio"]), _a_datetime(fila["fecha_hora_fin"]))
+            self._cargado = True
+
+    def asegurar_cargado(self):
+        """Carga el índice si todavía no se ha cargado."""
+        if not self._cargado:
+            with self._bloqueo:
+                if not self._cargado:
+                    self.cargar()
+
+    @contextmanager
+    def escritura(self):
+        """
+        Bloqueo que se mantiene durante una transacción que comprueba y modifica reservas.
+        Mientras una reserva se valida, se guarda y se registra en el índice,
+        ninguna otra puede consultar el índice para validarse.
+        """
+        self.asegurar_cargado()
+        with self._bloqueo:
+            yield self
+
+    def _agregar(self, reserva_id: int, mesa_id: int, inicio: datetime, fin: datetime):
+        self._quitar(reserva_id)
+        insort(self._inicios.setdefault(mesa_id, []), inicio)
+        insort(self._intervalos.setdefault(mesa_id, []), (inicio, fin, reserva_id))
+        duracion = fin - inicio
+        if duracion > self._duracion_maxima.get(mesa_id, timedelta(0)):
+            self._duracion_maxima[mesa_id] = duracion
+        self._reservas[reserva_id] = (mesa_id, inicio, fin)
+        self._actualizar_rejilla(mesa_id, inicio, fin)
+
+    def _quitar(self, reserva_id: int):
+        actual = self._reservas.pop(reserva_id, None)
+        if actual is None:
+            return
+        mesa_id, inicio, fin = actual
+        intervalos = self._intervalos[mesa_id]
+        posicion = bisect_left(intervalos, (inicio, fin, reserva_id))
+        del intervalos[posicion]
+        del self._inicios[mesa_id][posicion]
+        self._actualizar_rejilla(mesa_id, inicio, fin)
+
+    def _ordenar_mesas(self):
+        self._orden_mesas = sorted((mesa["capacidad"], mesa["numero"], mesa["id"]) for mesa in self._mesas.values())
+
+    # Rejilla de disponibilidad: mapas de bits por día calculados a partir de los intervalos
+    def _bits_dia(self, mesa_id: int, dia: date) -> int:
+        inicios = self._inicios.get(mesa_id)
+        if not inicios:
+            return 0
+        comienzo = datetime.combine(dia, time())
+        desde = bisect_left(inicios, comienzo - self._duracion_maxima[mesa_id])
+        hasta = bisect_left(inicios, comienzo + timedelta(days=1))
+        bits = 0
+        for inicio, fin, _ in self._intervalos[mesa_id][desde:hasta]:
+            bits |= bits_intervalo(inicio, fin, dia)
+        return bits
+
+    def _dia_rejilla(self, dia: date) -> dict:
+        ocupadas = self._rejilla.get(dia)
+        if ocupadas is None:
+            ocupadas = {mesa_id: self._bits_dia(mesa_id, dia) for mesa_id in self._intervalos}
+            self._rejilla[dia] = ocupadas
+            if len(self._rejilla) > DIAS_REJILLA_MAXIMO:
+                self._rejilla.popitem(last=False)
+        else:
+            self._rejilla.move_to_end(dia)
+        return ocupadas
+
+    def _actualizar_rejilla(self, mesa_id: int, inicio: datetime, fin: datetime):
+        # Solo se recalculan los días ya construidos que toca el intervalo
+        dia = inicio.date()
+        while datetime.combine(dia, time()) < fin:
+            if dia in self._rejilla:
+                self._rejilla[dia][mesa_id] = self._bits_dia(mesa_id, dia)
+            dia += timedelta(days=1)
+
+    # Actualiza el índice con la fila de una reserva tal y como ha quedado en la base de datos
+    def registrar_reserva(self, reserva: Optional[dict]):
+        """Añade, mueve o quita una reserva según su estado actual."""
+        if not reserva or not self._cargado:
+            return
+        with self._bloqueo:
+            if reserva["estado"] in ESTADOS_ACTIVOS:
+                self._agregar(
+                    reserva["id"],
+                    reserva["mesa_id"],
+                    _a_datetime(reserva["fecha_inicio"]),
+                    _a_datetime(reserva["fecha_fin"]),
+                )
+            else:
+                self._quitar(reserva["id"])
+
+    def quitar_reserva(self, reserva_id: int):
+        """Quita una reserva del índice."""
+        with self._bloqueo:
+            self._quitar(reserva_id)
+
+    def registrar_mesa(self, mesa: Optional[dict]):
+        """Añade o actualiza los datos de una mesa."""
+        if not mesa or not self._cargado:
+            return
+        with self._bloqueo:
+            self._mesas[mesa["id"]] = _fila_mesa(mesa)
+            self._ordenar_mesas()
+
+    def quitar_mesa(self, mesa_id: int):
+        """Quita una mesa (y sus reservas) del índice."""
+        with self._bloqueo:
+            self._mesas.pop(mesa_id, None)
+            self._ordenar_mesas()
+            for _, _, reserva_id in list(self._intervalos.get(mesa_id, [])):
+                self._quitar(reserva_id)
+            for ocupadas in self._rejilla.values():
+                ocupadas.pop(mesa_id, None)
+
+    def obtener_mesa(self, mesa_id: int) -> Optional[dict]:
+        """Devuelve los datos de una mesa tal y como están en el índice (None si no existe)."""
+        self.asegurar_cargado()
+        with self._bloqueo:
+            mesa = self._mesas.get(mesa_id)
+            return dict(mesa) if mesa else None
+
+    # Comprobación de solapamiento en O(log n + k)
+    def hay_solapamiento(self, mesa_id: int, fecha_inicio, fecha_fin, excluir_id: Optional[int] = None) -> bool:
+        """Indica si la mesa tiene alguna reserva activa que se solape con [fecha_inicio, fecha_fin)."""
+        self.asegurar_cargado()
+        fecha_inicio = _a_datetime(fecha_inicio)
+        fecha_fin = _a_datetime(fecha_fin)
+        with self._bloqueo:
+            inicios = self._inicios.get(mesa_id)
+            if not inicios:
+                return False
+            intervalos = self._intervalos[mesa_id]
+            # Solo pueden solaparse las reservas que empiezan después de (inicio - duración máxima) y antes del fin
+            desde = bisect_left(inicios, fecha_inicio - self._duracion_maxima[mesa_id])
+            hasta = bisect_left(inicios, fecha_fin)
+            for inicio, fin, reserva_id in intervalos[desde:hasta]:
+                if fin > fecha_inicio and reserva_id != excluir_id:
+                    return True
+            return False
+
+    def mesas_libres(self, fecha_inicio, fecha_fin, capacidad_minima: int = 1, ubicacion: Optional[str] = None) -> list[dict]:
+        """Devuelve las mesas activas con capacidad suficiente y libres en [fecha_inicio, fecha_fin)."""
+        self.asegurar_cargado()
+        with self._bloqueo:
+            candidatas = [
+                mesa for mesa in self._mesas.values()
+                if mesa["activa"] and mesa["capacidad"] >= capacidad_minima
+                and (ubicacion is None or mesa["ubicacion"] == ubicacion)
+            ]
+            libres = [mesa for mesa in candidatas if not self.hay_solapamiento(mesa["id"], fecha_inicio, fecha_fin)]
+        return sorted(libres, key=lambda mesa: (mesa["capacidad"], mesa["numero"]))
+
+    def mejor_mesa_libre(self, fecha_inicio, fecha_fin, comensales: int, ubicacion: Optional[str] = None) -> Optional[dict]:
+        """
+        Devuelve la mesa activa más pequeña (y de menor número) en la que caben los comensales
+        y que está libre en [fecha_inicio, fecha_fin), o None si no hay ninguna.
+        Las mesas se recorren por capacidad desde la primera suficiente y se para en la primera libre.
+        """
+        self.asegurar_cargado()
+        with self._bloqueo:
+            for _, _, mesa_id in self._orden_mesas[bisect_left(self._orden_mesas, (comensales,)):]:
+                mesa = self._mesas[mesa_id]
+                if not mesa["activa"] or (ubicacion is not None and mesa["ubicacion"] != ubicacion):
+                    continue
+                if not self.hay_solapamiento(mesa_id, fecha_inicio, fecha_fin):
+                    return mesa
+        return None
+
+    # Disponibilidad de un día con la rejilla de franjas de 15 minutos
+    def disponibilidad(self, dia: date, franja_desde: int = 0, franja_hasta: int = FRANJAS_DIA, franjas_duracion: int = 8,
+                       capacidad_minima: int = 1, ubicacion: Optional[str] = None) -> list[dict]:
+        """
+        Devuelve las mesas activas con capacidad suficiente en las que cabe una reserva de
+        `franjas_duracion` franjas dentro de [franja_desde, franja_hasta), con las horas de inicio
+        posibles y los tramos libres de la ventana. Ordenadas por capacidad y número de mesa.
+        """
+        self.asegurar_cargado()
+        ventana = mascara(franja_desde, franja_hasta)
+        # Una reserva puede empezar en una franja si las `franjas_duracion` siguientes están libres dentro de la ventana
+        resultado = []
+        with self._bloqueo:
+            ocupadas = self._dia_rejilla(dia)
+            for mesa in self._mesas.values():
+                if not mesa["activa"] or mesa["capacidad"] < capacidad_minima:
+                    continue
+                if ubicacion is not None and mesa["ubicacion"] != ubicacion:
+                    continue
+                libres = ventana & ~ocupadas.get(mesa["id"], 0)
+                inicios = inicios_posibles(libres, franjas_duracion)
+                if inicios:
+                    resultado.append((mesa, libres, inicios))
+        resultado.sort(key=lambda elemento: (elemento[0]["capacidad"], elemento[0]["numero"]))
+        return [
+            {
+                **mesa,
+                "inicios": [hora_franja(numero) for numero in posiciones(inicios)],
+                "tramos_libres": [{"desde": hora_franja(desde), "hasta": hora_franja(hasta)} for desde, hasta in tramos(libres)],
+            }
+            for mesa, libres, inicios in resultado
+        ]
+
+    def verificar_consistencia(self) -> dict:
+        """Compara el índice con la base de datos y devuelve las diferencias encontradas."""
+        self.asegurar_cargado()
+        reservas = obtener_todos(
+            f"""
+            SELECT id, mesa_id, fecha_hora_inicio, fecha_hora_fin FROM reservas
+            WHERE estado IN ({", ".join("?" for _ in ESTADOS_ACTIVOS)})
+            """,
+            ESTADOS_ACTIVOS,
+        )
+        mesas = obtener_todos("SELECT id, numero, capacidad, ubicacion, activa FROM mesas")
+        en_db = {
+            fila["id"]: (fila["mesa_id"], _a_datetime(fila["fecha_hora_inicio"]), _a_datetime(fila["fecha_hora_fin"]))
+            for fila in reservas
+        }
+        with self._bloqueo:
+            en_indice = dict(self._reservas)
+            mesas_indice = dict(self._mesas)
+            # Los días construidos de la rejilla tienen que coincidir con los intervalos del índice
+            dias_distintos = sorted(
+                dia.isoformat() for dia, ocupadas in self._rejilla.items()
+                if {mesa_id: bits for mesa_id, bits in ocupadas.items() if bits}
+                != {mesa_id: bits for mesa_id in self._intervalos if (bits := self._bits_dia(mesa_id, dia))}
+            )
+        faltan = sorted(set(en_db) - set(en_indice))
+        sobran = sorted(set(en_indice) - set(en_db))
+        distintas = sorted(reserva_id for reserva_id in set(en_db) & set(en_indice) if en_db[reserva_id] != en_indice[reserva_id])
+        mesas_distintas = sorted(
+            mesa["id"] for mesa in mesas if mesas_indice.get(mesa["id"]) != _fila_mesa(mesa)
+        ) + sorted(set(mesas_indice) - {mesa["id"] for mesa in mesas})
+        return {
+            "consistente": not (faltan or sobran or distintas or mesas_distintas or dias_distintos),
+            "reservas_en_indice": len(en_indice),
+            "reservas_activas_en_db": len(en_db),
+            "faltan_en_indice": faltan,
+            "sobran_en_indice": sobran,
+            "reservas_distintas": distintas,
+            "mesas_distintas": mesas_distintas,
+            "dias_rejilla": len(self._rejilla),
+            "dias_rejilla_distintos": dias_distintos,
+        }
+
+
+# Índice compartido por todo el proceso
+indice_reservas = IndiceReservas()
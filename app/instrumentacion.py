@@ -0,0 +1,236 @@
+"""Instrumentación: latencia por ruta, consultas SQL por petición y métricas en formato Prometheus."""
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+# Se puede desactivar con RESERVAS_INSTRUMENTACION=0 (el benchmark lo usa para medir el coste)
+ACTIVA = os.environ.get("RESERVAS_INSTRUMENTACION", "1") != "0"
+# Las consultas que tardan más de este umbral se escriben en el log "app.sql"
+UMBRAL_CONSULTA_LENTA_MS = float(os.environ.get("RESERVAS_CONSULTA_LENTA_MS", "100"))
+
+# Límites (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites de los buckets del histograma de consultas SQL por petición
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+log_sql = logging.getLogger("app.sql")
+
+
+class Histograma:
+    """Histograma acumulado al estilo Prometheus (contador por bucket, suma y total)."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.contadores = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        posicion = 0
+        for limite in self.buckets:
+            if valor <= limite:
+                break
+            posicion += 1
+        self.contadores[posicion] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self) -> list[tuple[str, int]]:
+        """Pares (le, contador acumulado) incluido +Inf."""
+        acumulado = 0
+        resultado = []
+        for limite, contador in zip(list(self.buckets) + ["+Inf"], self.contadores):
+            acumulado += contador
+            resultado.append((str(limite), acumulado))
+        return resultado
+
+
+class EstadisticaConsulta:
+    """Veces que se ha ejecutado una sentencia normalizada, tiempo total y máximo."""
+
+    __slots__ = ("total", "segundos", "maximo")
+
+    def __init__(self):
+        self.total = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+
+
+class Metricas:
+    """Métricas acumuladas del proceso. Todas las escrituras se hacen con el bloqueo."""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.latencia = {}      # (metodo, ruta, estado) -> Histograma
+        self.consultas = {}     # (metodo, ruta) -> Histograma de consultas por petición
+        self.sentencias = {}    # sentencia normalizada -> EstadisticaConsulta
+        self.consultas_lentas = 0
+
+    def registrar_peticion(self, metodo: str, ruta: str, estado: int, segundos: float, consultas: int):
+        with self._bloqueo:
+            histograma = self.latencia.get((metodo, ruta, estado))
+            if histograma is None:
+                histograma = self.latencia[(metodo, ruta, estado)] = Histograma(BUCKETS_LATENCIA)
+            histograma.observar(segundos)
+            histograma = self.consultas.get((metodo, ruta))
+            if histograma is None:
+                histograma = self.consultas[(metodo, ruta)] = Histograma(BUCKETS_CONSULTAS)
+            histograma.observar(consultas)
+
+    def registrar_sentencia(self, sentencia: str, segundos: float, lenta: bool):
+        with self._bloqueo:
+            estadistica = self.sentencias.get(sentencia)
+            if estadistica is None:
+                estadistica = self.sentencias[sentencia] = EstadisticaConsulta()
+            estadistica.total += 1
+            estadistica.segundos += segundos
+            if segundos > estadistica.maximo:
+                estadistica.maximo = segundos
+            if lenta:
+                self.consultas_lentas += 1
+
+    def reiniciar(self):
+        with self._bloqueo:
+            self.latencia.clear()
+            self.consultas.clear()
+            self.sentencias.clear()
+            self.consultas_lentas = 0
+
+
+# Métricas compartidas por todo el proceso
+metricas = Metricas()
+
+# Contador de consultas de la petición en curso. Es una lista de un elemento para que los
+# hilos de base de datos (que reciben una copia del contexto) sumen sobre el mismo objeto
+_consultas_peticion: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("consultas_peticion", default=None)
+
+
+# Normalización de SQL: espacios colapsados y listas de parámetros/literales sustituidas,
+# para que las consultas con distinto número de '?' o valores cuenten como la misma sentencia
+_ESPACIOS = re.compile(r"\s+")
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\?(?:\s*,\s*\?)+")
+_normalizadas = {}
+MAXIMO_NORMALIZADAS = 2048
+
+
+def normalizar_sql(consulta: str) -> str:
+    """Devuelve la forma normalizada de una sentencia SQL (se guarda en caché por texto)."""
+    normalizada = _normalizadas.get(consulta)
+    if normalizada is None:
+        normalizada = _ESPACIOS.sub(" ", consulta).strip()
+        normalizada = _LITERALES.sub("?", normalizada)
+        normalizada = _LISTAS.sub("?, ...", normalizada)
+        if len(_normalizadas) < MAXIMO_NORMALIZADAS:
+            _normalizadas[consulta] = normalizada
+    return normalizada
+
+
+# Lo llaman los helpers de app.database después de ejecutar cada consulta
+def registrar_consulta(consulta: str, segundos: float):
+    """Cuenta la consulta en la petición en curso, acumula su tiempo y avisa si es lenta."""
+    if not ACTIVA:
+        return
+    contador = _consultas_peticion.get()
+    if contador is not None:
+        contador[0] += 1
+    sentencia = normalizar_sql(consulta)
+    lenta = segundos * 1000 >= UMBRAL_CONSULTA_LENTA_MS
+    metricas.registrar_sentencia(sentencia, segundos, lenta)
+    if lenta:
+        log_sql.warning("Consulta lenta (%.1f ms): %s", segundos * 1000, sentencia)
+
+
+class MiddlewareInstrumentacion:
+    """
+    Middleware ASGI que mide la latencia de cada petición por ruta (la plantilla, por ejemplo
+    /reservas/{reserva_id}, no la URL concreta) y cuántas consultas SQL ha hecho.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ACTIVA:
+            await self.app(scope, receive, send)
+            return
+
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        contador = [0]
+        token = _consultas_peticion.set(contador)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            segundos = time.perf_counter() - inicio
+            _consultas_peticion.reset(token)
+            ruta = scope.get("route")
+            ruta = getattr(ruta, "path", None) or "sin_ruta"
+            metricas.registrar_peticion(scope["method"], ruta, estado[0], segundos, contador[0])
+
+
+def _etiquetas(**valores) -> str:
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _escribir_histograma(lineas: list, nombre: str, etiquetas: dict, histograma: Histograma):
+    for limite, acumulado in histograma.acumulados():
+        lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le=limite)} {acumulado}")
+    lineas.append(f"{nombre}_sum{_etiquetas(**etiquetas)} {histograma.suma}")
+    lineas.append(f"{nombre}_count{_etiquetas(**etiquetas)} {histograma.total}")
+
+
+def exportar_prometheus(extra: Optional[dict] = None) -> str:
+    """
+    Devuelve las métricas en formato de texto de Prometheus.
+    `extra` son métricas adicionales: nombre -> (tipo, ayuda, [(etiquetas, valor), ...]).
+    """
+    lineas = []
+    with metricas._bloqueo:
+        lineas.append("# HELP reservas_http_duracion_segundos Latencia de las peticiones HTTP por ruta.")
+        lineas.append("# TYPE reservas_http_duracion_segundos histogram")
+        for (metodo, ruta, estado), histograma in sorted(metricas.latencia.items()):
+            _escribir_histograma(lineas, "reservas_http_duracion_segundos", {"metodo": metodo, "ruta": ruta, "estado": estado}, histograma)
+
+        lineas.append("# HELP reservas_http_consultas_sql Consultas SQL por petición HTTP.")
+        lineas.append("# TYPE reservas_http_consultas_sql histogram")
+        for (metodo, ruta), histograma in sorted(metricas.consultas.items()):
+            _escribir_histograma(lineas, "reservas_http_consultas_sql", {"metodo": metodo, "ruta": ruta}, histograma)
+
+        lineas.append("# HELP reservas_sql_ejecuciones_total Ejecuciones de cada sentencia SQL normalizada.")
+        lineas.append("# TYPE reservas_sql_ejecuciones_total counter")
+        for sentencia, estadistica in sorted(metricas.sentencias.items()):
+            lineas.append(f"reservas_sql_ejecuciones_total{_etiquetas(sentencia=sentencia)} {estadistica.total}")
+        lineas.append("# HELP reservas_sql_segundos_total Tiempo acumulado de cada sentencia SQL normalizada.")
+        lineas.append("# TYPE reservas_sql_segundos_total counter")
+        for sentencia, estadistica in sorted(metricas.sentencias.items()):
+            lineas.append(f"reservas_sql_segundos_total{_etiquetas(sentencia=sentencia)} {estadistica.segundos}")
+        lineas.append("# HELP reservas_sql_segundos_maximo Ejecución más lenta de cada sentencia SQL normalizada.")
+        lineas.append("# TYPE reservas_sql_segundos_maximo gauge")
+        for sentencia, estadistica in sorted(metricas.sentencias.items()):
+            lineas.append(f"reservas_sql_segundos_maximo{_etiquetas(sentencia=sentencia)} {estadistica.maximo}")
+        lineas.append("# HELP reservas_sql_consultas_lentas_total Consultas por encima del umbral de consulta lenta.")
+        lineas.append("# TYPE reservas_sql_consultas_lentas_total counter")
+        lineas.append(f"reservas_sql_consultas_lentas_total {metricas.consultas_lentas}")
+
+    for nombre, (tipo, ayuda, valores) in (extra or {}).items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for etiquetas, valor in valores:
+            lineas.append(f"{nombre}{_etiquetas(**etiquetas) if etiquetas else ''} {valor}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,230 @@
+"""
+Lista de espera: clientes que quieren reservar a una hora en la que no hay mesa libre.
+Cuando se libera una mesa (se cancela o se mueve una reserva, se activa o se amplía una mesa)
+se ofrece el hueco a la primera entrada en espera que cabe en él y se reserva en la misma
+transacción en la que la entrada pasa a asignada.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.coherencia import coherencia
+from app.database import formatear_fecha, obtener_todos, obtener_uno, transaccion
+from app.eventos import centro_eventos
+from app.indice_reservas import ESTADOS_ACTIVOS, indice_reservas
+from app.versiones import versiones
+
+# Entradas en espera que se examinan como mucho cada vez que se libera un hueco
+CANDIDATOS_MAXIMOS = int(os.environ.get("RESERVAS_ESPERA_CANDIDATOS", "50"))
+
+TABLA_ESPERA = "lista_espera"
+ESTADOS_ESPERA = ("esperando", "asignada", "cancelada", "caducada")
+# Las reservas de la lista de espera duran lo mismo que las demás
+DURACION_RESERVA = timedelta(hours=2)
+
+log = logging.getLogger("app.lista_espera")
+
+# El índice (estado, fecha_hora_inicio) deja buscar las entradas en espera de un intervalo
+# sin recorrer la lista entera; el orden de prioridad es el de llegada (id)
+ESQUEMA_ESPERA = f"""
+CREATE TABLE IF NOT EXISTS {TABLA_ESPERA} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER NOT NULL,
+    fecha_hora_inicio TIMESTAMP NOT NULL,
+    fecha_hora_fin TIMESTAMP NOT NULL,
+    num_comensales INTEGER NOT NULL,
+    ubicacion TEXT,
+    notas TEXT,
+    estado TEXT NOT NULL DEFAULT 'esperando' CHECK (estado IN ({", ".join(f"'{estado}'" for estado in ESTADOS_ESPERA)})),
+    reserva_id INTEGER,
+    fecha_creacion TIMESTAMP NOT NULL,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id),
+    FOREIGN KEY (reserva_id) REFERENCES reservas(id)
+);
+CREATE INDEX IF NOT EXISTS idx_lista_espera_estado_inicio ON {TABLA_ESPERA} (estado, fecha_hora_inicio);
+CREATE INDEX IF NOT EXISTS idx_lista_espera_cliente ON {TABLA_ESPERA} (cliente_id);
+"""
+
+COLUMNAS_ESPERA = """
+    id, cliente_id,
+    fecha_hora_inicio AS fecha_inicio,
+    fecha_hora_fin AS fecha_fin,
+    num_comensales AS numero_comensales,
+    ubicacion, notas, estado, reserva_id, fecha_creacion
+"""
+
+COLUMNAS_RESPUESTA_RESERVA = """
+    id, cliente_id, mesa_id,
+    fecha_hora_inicio AS fecha_inicio,
+    fecha_hora_fin AS fecha_fin,
+    num_comensales AS numero_comensales,
+    estado, notas, fecha_creacion
+"""
+
+
+def _a_fecha(valor) -> datetime:
+    return datetime.fromisoformat(formatear_fecha(valor))
+
+
+def _se_solapan(inicio_a, fin_a, inicio_b, fin_b) -> bool:
+    return inicio_a < fin_b and inicio_b < fin_a
+
+
+class ListaEspera:
+    """
+    Emparejamiento de huecos libres con entradas en espera.
+    Los candidatos de un hueco se buscan con el índice (estado, fecha_hora_inicio): solo las
+    entradas que empiezan dentro del hueco o hasta una duración antes pueden solaparse con él,
+    y se filtran en la misma consulta por capacidad y ubicación de la mesa. Así el coste depende
+    de las entradas que compiten por ese hueco y no del tamaño de la lista de espera.
+    Si no hay candidatos no se abre ninguna transacción de escritura.
+    """
+
+    def __init__(self, candidatos_maximos: int = CANDIDATOS_MAXIMOS):
+        self.candidatos_maximos = candidatos_maximos
+        self._bloqueo = threading.Lock()
+        self._huecos = 0
+        self._huecos_con_candidatos = 0
+        self._asignadas = 0
+
+    def _candidatos(self, mesa: dict, desde: datetime, hasta: Optional[datetime], ahora: datetime, conexion=None) -> list[dict]:
+        """
+        Entradas en espera que caben en la mesa, se solapan con [desde, hasta) y todavía no han
+        empezado, por orden de llegada.
+        El límite inferior de fecha_hora_inicio (desde - DURACION_RESERVA) cuenta con que toda entrada
+        dura exactamente DURACION_RESERVA, como las crea `_crear_espera`: una entrada más larga que
+        empezara antes se quedaría fuera aunque se solapara con el hueco.
+        """
+        return obtener_todos(
+            f"""
+            SELECT {COLUMNAS_ESPERA} FROM {TABLA_ESPERA}
+            WHERE estado = 'esperando'
+              AND fecha_hora_inicio > ? AND fecha_hora_inicio < ? AND fecha_hora_fin > ?
+              AND num_comensales <= ? AND (ubicacion IS NULL OR ubicacion = ?)
+            ORDER BY id
+            LIMIT ?
+            """,
+            (
+                formatear_fecha(max(desde - DURACION_RESERVA, ahora)),
+                formatear_fecha(hasta or datetime.max),
+                formatear_fecha(desde),
+                mesa["capacidad"], mesa["ubicacion"],
+                self.candidatos_maximos,
+            ),
+            conexion,
+        )
+
+    def asignar(self, conexion, entrada: dict, mesa_id: int) -> dict:
+        """
+        Crea la reserva de una entrada en la mesa y marca la entrada como asignada, dentro de
+        la transacción de `conexion`. Quien llama ya ha comprobado que la mesa está libre y
+        registra la reserva en el índice después del COMMIT.
+        """
+        reserva = obtener_uno(
+            f"""
+            INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, notas, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, 'pendiente', ?, ?)
+            RETURNING {COLUMNAS_RESPUESTA_RESERVA}
+            """,
+            (
+                entrada["cliente_id"], mesa_id, entrada["fecha_inicio"], entrada["fecha_fin"],
+                entrada["numero_comensales"], entrada["notas"], formatear_fecha(datetime.now()),
+            ),
+            conexion,
+        )
+        conexion.execute(
+            f"UPDATE {TABLA_ESPERA} SET estado = 'asignada', reserva_id = ? WHERE id = ?", (reserva["id"], entrada["id"])
+        )
+        with self._bloqueo:
+            self._asignadas += 1
+        return reserva
+
+    def emparejar(self, mesa_id: int, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> list[dict]:
+        """
+        Ofrece la mesa en [desde, hasta) (sin `hasta`, desde ahora en adelante) a las entradas en
+        espera y devuelve las reservas creadas. Las entradas se recorren por orden de llegada y
+        cada una se queda la mesa si sigue libre en su horario.
+        """
+        ahora = datetime.now()
+        desde = max(_a_fecha(desde) if desde is not None else ahora, ahora)
+        hasta = _a_fecha(hasta) if hasta is not None else None
+        with self._bloqueo:
+            self._huecos += 1
+        mesa = indice_reservas.obtener_mesa(mesa_id)
+        # Comprobación sin bloqueos: casi siempre no hay nadie esperando ese hueco
+        if mesa is None or not mesa["activa"] or not self._candidatos(mesa, desde, hasta, ahora):
+            return []
+        with self._bloqueo:
+            self._huecos_con_candidatos += 1
+
+        asignadas = []
+        with indice_reservas.escritura():
+            with transaccion() as conexion:
+                coherencia.sincronizar(conexion)
+                mesa = indice_reservas.obtener_mesa(mesa_id)
+                if mesa is None or not mesa["activa"]:
+                    return []
+                for entrada in self._candidatos(mesa, desde, hasta, ahora, conexion):
+                    inicio, fin = _a_fecha(entrada["fecha_inicio"]), _a_fecha(entrada["fecha_fin"])
+                    if indice_reservas.hay_solapamiento(mesa_id, inicio, fin):
+                        continue
+                    # Las reservas de este mismo emparejamiento todavía no están en el índice
+                    if any(_se_solapan(inicio, fin, _a_fecha(r["fecha_inicio"]), _a_fecha(r["fecha_fin"])) for r in asignadas):
+                        continue
+                    asignadas.append(self.asignar(conexion, entrada, mesa_id))
+            for reserva in asignadas:
+                indice_reservas.registrar_reserva(reserva)
+                centro_eventos.publicar_reserva(reserva, "reserva_creada")
+            if asignadas:
+                versiones.tocar("reservas")
+        return asignadas
+
+    def liberar_hueco(self, mesa_id: int, desde, hasta=None) -> list[dict]:
+        """
+        Ofrece un hueco que se acaba de liberar. Se llama con el cambio ya guardado, así que un
+        error aquí se registra en el log y no se propaga al cambio que liberó la mesa.
+        """
+        try:
+            return self.emparejar(mesa_id, desde, hasta)
+        except Exception:
+            log.exception("Error al ofrecer la mesa %s a la lista de espera", mesa_id)
+            return []
+
+    def ofrecer_hueco(self, reserva: Optional[dict]) -> list[dict]:
+        """Tras cambiar el estado de una reserva: si ya no ocupa su mesa, ofrece su horario a la lista de espera."""
+        if not reserva or reserva["estado"] in ESTADOS_ACTIVOS:
+            return []
+        return self.liberar_hueco(reserva["mesa_id"], reserva["fecha_inicio"], reserva["fecha_fin"])
+
+    def ofrecer_mesa(self, mesa: Optional[dict]) -> list[dict]:
+        """Tras crear o cambiar una mesa: la ofrece a la lista de espera desde ahora en adelante."""
+        if not mesa or not mesa["activa"]:
+            return []
+        return self.liberar_hueco(mesa["id"], None)
+
+    def metricas(self) -> dict:
+        """Huecos ofrecidos, huecos con alguien esperando y entradas asignadas."""
+        with self._bloqueo:
+            return {
+                "huecos_ofrecidos": self._huecos,
+                "huecos_con_candidatos": self._huecos_con_candidatos,
+                "asignadas": self._asignadas,
+            }
+
+
+# Lista de espera compartida por todo el proceso
+lista_espera = ListaEspera()
+
+
+def caducar_esperas(ahora: Optional[datetime] = None) -> dict:
+    """Marca como caducadas las entradas en espera cuya hora de inicio ya ha pasado."""
+    ahora = ahora or datetime.now()
+    with transaccion() as conexion:
+        caducadas = conexion.execute(
+            f"UPDATE {TABLA_ESPERA} SET estado = 'caducada' WHERE estado = 'esperando' AND fecha_hora_inicio <= ?",
+            (formatear_fecha(ahora),),
+        ).rowcount
+    return {"caducadas": caducadas}
@@ -1,25 +1,179 @@
 """Punto de entrada de la API."""
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routers import clientes, mesas, reservas, estadisticas
+from fastapi.responses import PlainTextResponse
+from app.cache import cache_clientes, cache_mesas
+from app.cache_http import MiddlewareCacheHTTP, cache_respuestas
+from app.coherencia import ACTIVO as MULTIPROCESO, INTERVALO_MS as INTERVALO_COHERENCIA_MS, coherencia, podar_cambios
+from app.database import ROL_ESCRITURA, ROL_LECTURA, cerrar_pool, obtener_pool
+from app.database_async import cerrar_ejecutor, ejecutar_en_db
+from app.escritor import escritor
+from app.eventos import centro_eventos
+from app.migraciones import aplicar_migraciones
+from app.indice_reservas import indice_reservas
+from app.lista_espera import lista_espera
+from app.mapa_ocupacion import memo_mapas
+from app.instrumentacion import MiddlewareInstrumentacion, exportar_prometheus
+from app.planificador import ACTIVO as PLANIFICADOR_ACTIVO, INTERVALO_PODA_CAMBIOS, planificador, registrar_tareas
+from app.routers import clientes, mesas, reservas, estadisticas, metricas, disponibilidad, espera, eventos
+
+
+# Ciclo de vida de la aplicación: al arrancar se aplican las migraciones pendientes, se carga
+# el índice de reservas en memoria y se arrancan las tareas periódicas; al apagar se cierran los
+# flujos de GET /eventos que sigan abiertos, se paran las tareas, se confirma lo que quede en la cola
+# del escritor agrupado y se cierran las conexiones del pool.
+# La posición en el registro de cambios se toma siempre, antes de cargar el índice: lo que cambie
+# mientras se carga se vuelve a aplicar después, y las escrituras que validan reservas aplican los
+# cambios de otros procesos dentro de su transacción aunque falte RESERVAS_MULTIPROCESO=1, así que
+# nunca se aceptan reservas solapadas. Con RESERVAS_MULTIPROCESO=1 además se buscan cambios cada
+# pocos milisegundos y los eventos salen del registro para que sus ids sean los mismos en todos los workers
+# Los triggers apuntan los cambios en el registro aunque haya un solo proceso, así que su poda se
+# registra siempre, también con RESERVAS_PLANIFICADOR=0 (el planificador la ejecuta ya al arrancar)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ejecutar_en_db(aplicar_migraciones)
+    if MULTIPROCESO:
+        centro_eventos.usar_registro_cambios()
+        planificador.registrar("coherencia", INTERVALO_COHERENCIA_MS / 1000, coherencia.sincronizar_si_hay_cambios)
+    await ejecutar_en_db(coherencia.iniciar)
+    await ejecutar_en_db(indice_reservas.cargar)
+    planificador.registrar("poda_cambios", INTERVALO_PODA_CAMBIOS, podar_cambios)
+    if PLANIFICADOR_ACTIVO:
+        registrar_tareas()
+    planificador.iniciar()
+    yield
+    centro_eventos.cerrar()
+    await planificador.detener()
+    await ejecutar_en_db(escritor.detener)
+    coherencia.detener()
+    cerrar_ejecutor()
+    cerrar_pool()
+
 
-app = FastAPI(title="API Sistema de Reservas - La Mesa Dorada", version="0.1.0")
+app = FastAPI(title="API Sistema de Reservas - La Mesa Dorada", version="0.1.0", lifespan=lifespan)
+
+# Respuestas ya serializadas de las rutas con ETag (solo con RESERVAS_CACHE_HTTP > 0)
+app.add_middleware(MiddlewareCacheHTTP)
+# Latencia por ruta y consultas SQL por petición (ver GET /metrics); va por fuera para medir también la caché
+app.add_middleware(MiddlewareInstrumentacion)
 
 # Incluir routers
 app.include_router(clientes.router)
 app.include_router(mesas.router)
+# La lista de espera va antes que reservas: /reservas/espera no debe llegar a /reservas/{reserva_id}
+app.include_router(espera.router)
 app.include_router(reservas.router)
 app.include_router(estadisticas.router)
+app.include_router(metricas.router)
+app.include_router(disponibilidad.router)
+app.include_router(eventos.router)
 
 # Endpoint raíz para verificar que la API está funcionando
 @app.get("/")
-def root():
+async def root():
     """Endpoint raíz para verificar la API."""
     return {"mensaje": "API de La Mesa Dorada funcionando (Creado por SAAD FAHAM)"}
 
 # Endpoint para obtener la versión de la API
 @app.get("/version")
-def version():
+async def version():
     """Devuelve la versión de la API."""
     return {"version": "0.1.0"}
 
+# Endpoint para comprobar la base de datos y ver las métricas de los pools de conexiones
+@app.get("/salud")
+async def salud():
+    """Devuelve el estado de la base de datos y de los pools de escritura y lectura."""
+    return {
+        "api": "ok",
+        "base_datos": {rol: await ejecutar_en_db(obtener_pool(rol).salud) for rol in (ROL_ESCRITURA, ROL_LECTURA)},
+    }
+
+# Endpoint para comparar el índice de reservas en memoria con la base de datos
+@app.get("/salud/indice")
+async def salud_indice():
+    """Comprueba que el índice de reservas en memoria coincide con la base de datos."""
+    return await ejecutar_en_db(indice_reservas.verificar_consistencia)
+
+# Endpoint con las métricas en formato de texto de Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Devuelve latencias por ruta, consultas SQL y contadores del pool y de las cachés para Prometheus."""
+    pools = {rol: obtener_pool(rol).metricas() for rol in (ROL_ESCRITURA, ROL_LECTURA)}
+    tareas = planificador.metricas()
+    escritura = escritor.metricas()
+    emparejamiento = lista_espera.metricas()
+    difusion = centro_eventos.metricas()
+    caches = [cache_mesas.metricas(), cache_clientes.metricas(), cache_respuestas.metricas(), memo_mapas.metricas()]
+    extra = {
+        "reservas_pool_conexiones": (
+            "gauge",
+            "Conexiones del pool de SQLite por estado.",
+            [({"rol": rol, "estado": estado}, pool[estado]) for rol, pool in pools.items() for estado in ("abiertas", "libres", "en_uso")],
+        ),
+        "reservas_cache_eventos_total": (
+            "counter",
+            "Aciertos, fallos y expulsiones de las cachés de mesas, clientes, respuestas y mapas de ocupación.",
+            [({"cache": cache["nombre"], "evento": evento}, cache[evento]) for cache in caches for evento in ("aciertos", "fallos", "expulsiones")],
+        ),
+        "reservas_tareas_ejecuciones_total": (
+            "counter",
+            "Ejecuciones de las tareas periódicas, con y sin error.",
+            [({"tarea": nombre, "resultado": "error"}, tarea["errores"]) for nombre, tarea in tareas.items()]
+            + [({"tarea": nombre, "resultado": "ok"}, tarea["ejecuciones"] - tarea["errores"]) for nombre, tarea in tareas.items()],
+        ),
+        "reservas_tareas_filas_total": (
+            "counter",
+            "Filas procesadas por las tareas periódicas (por ejemplo reservas completadas o no presentadas).",
+            [
+                ({"tarea": nombre, "tipo": tipo}, valor)
+                for nombre, tarea in tareas.items() for tipo, valor in tarea["totales"].items() if tipo != "lotes"
+            ],
+        ),
+        "reservas_tareas_duracion_segundos": (
+            "gauge",
+            "Duración de la última ejecución de cada tarea periódica.",
+            [({"tarea": nombre}, tarea["ultima_duracion_segundos"] or 0) for nombre, tarea in tareas.items()],
+        ),
+        "reservas_escritor_lotes_total": (
+            "counter",
+            "Lotes (transacciones) confirmados por el escritor agrupado.",
+            [({}, escritura["lotes"])],
+        ),
+        "reservas_escritor_operaciones_total": (
+            "counter",
+            "Escrituras confirmadas por el escritor agrupado, con y sin error.",
+            [({"resultado": "error"}, escritura["errores"]), ({"resultado": "ok"}, escritura["operaciones"] - escritura["errores"])],
+        ),
+        "reservas_lista_espera_huecos_total": (
+            "counter",
+            "Huecos liberados que se han ofrecido a la lista de espera, con y sin entradas esperando.",
+            [
+                ({"candidatos": "si"}, emparejamiento["huecos_con_candidatos"]),
+                ({"candidatos": "no"}, emparejamiento["huecos_ofrecidos"] - emparejamiento["huecos_con_candidatos"]),
+            ],
+        ),
+        "reservas_lista_espera_asignadas_total": (
+            "counter",
+            "Entradas de la lista de espera que han conseguido mesa.",
+            [({}, emparejamiento["asignadas"])],
+        ),
+        "reservas_eventos_clientes": (
+            "gauge",
+            "Clientes conectados a GET /eventos.",
+            [({}, difusion["clientes"])],
+        ),
+        "reservas_eventos_publicados_total": (
+            "counter",
+            "Eventos de reservas y mesas publicados.",
+            [({}, difusion["publicados"])],
+        ),
+        "reservas_eventos_desbordados_total": (
+            "counter",
+            "Clientes de GET /eventos desconectados por ir demasiado atrasados.",
+            [({}, difusion["desbordadas"])],
+        ),
+    }
+    return PlainTextResponse(exportar_prometheus(extra), media_type="text/plain; version=0.0.4")
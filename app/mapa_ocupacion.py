@@ -0,0 +1,183 @@
+"""
+Mapa de ocupación (heatmap) para `GET /estadisticas/heatmap`: comensales sentados de media en
+cada franja de 15 minutos por día de la semana y ubicación, y la utilización frente a la
+capacidad total de las mesas.
+Las reservas del rango se leen en una sola consulta, que ya las agrupa por franja de inicio y
+de fin, y cada grupo suma sus comensales en la franja en que empieza y los resta en la que
+termina (array de diferencias); una suma acumulada da la ocupación de todas las franjas a la
+vez. Con NumPy instalado la acumulación va vectorizada; si no, con listas de Python.
+Los rangos ya cerrados (terminados antes de ayer) no cambian, así que su resultado se memoiza.
+"""
+
+import calendar
+import os
+from datetime import date, timedelta
+from itertools import accumulate
+from typing import Optional
+
+from app.archivo import origen_reservas
+from app.cache import CacheLRU
+from app.database import formatear_fecha, iterar_lotes, obtener_todos, rango_dias
+from app.versiones import versiones
+
+try:
+    import numpy
+except ImportError:  # numpy es opcional
+    numpy = None
+
+# Minutos que puede tener cada franja
+MINUTOS_FRANJA = (15, 30, 60)
+# Días como mucho de un rango (tres años)
+DIAS_MAXIMOS = int(os.environ.get("RESERVAS_HEATMAP_DIAS", "1096"))
+# Mapas memoizados y segundos que vive cada uno (por si se corrige a mano una reserva antigua)
+TAMANO_MEMO = int(os.environ.get("RESERVAS_HEATMAP_MEMO", "64"))
+TTL_MEMO = float(os.environ.get("RESERVAS_HEATMAP_TTL", "3600"))
+# Filas por lote al leer las reservas
+TAMANO_LOTE = 2000
+
+# Las reservas canceladas no ocupan mesa
+ESTADOS_OCUPAN = ("pendiente", "confirmada", "completada")
+DIAS_SEMANA = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+
+# Mapas de rangos cerrados ya calculados
+memo_mapas = CacheLRU("heatmap", TAMANO_MEMO, TTL_MEMO)
+
+
+def _capacidades(ubicacion: Optional[str]) -> dict:
+    """Capacidad total de las mesas por ubicación."""
+    consulta = "SELECT ubicacion, SUM(capacidad) AS capacidad FROM mesas GROUP BY ubicacion ORDER BY ubicacion"
+    return {
+        fila["ubicacion"]: fila["capacidad"]
+        for fila in obtener_todos(consulta)
+        if ubicacion is None or fila["ubicacion"] == ubicacion
+    }
+
+
+def _diferencias(desde: date, dias: int, minutos: int, ubicaciones: list[str]) -> tuple:
+    """
+    Recorre una vez las reservas que se solapan con el rango y devuelve, agrupadas por ubicación,
+    primera franja que ocupan y franja en la que dejan de ocupar, esas franjas y los comensales.
+    Las franjas (contadas desde `desde` a medianoche y recortadas al rango) las calcula SQLite con
+    aritmética entera sobre las fechas, así Python no tiene que interpretar cada fecha; como las
+    reservas empiezan y acaban en unos pocos turnos, quedan unos pocos miles de grupos.
+    """
+    inicio, fin = rango_dias(desde, dias)
+    segundos = minutos * 60
+    total = dias * 24 * 60 // minutos
+    # strftime('%s') trata las fechas guardadas como UTC: da igual, solo se restan entre ellas
+    base = calendar.timegm(desde.timetuple())
+    posicion = {nombre: indice for indice, nombre in enumerate(ubicaciones)}
+
+    # Las reservas duran menos de un día: basta con mirar las que empiezan desde el día anterior
+    anterior = formatear_fecha(desde - timedelta(days=1))
+    consulta = f"""
+    SELECT m.ubicacion,
+           MAX(0, (CAST(strftime('%s', r.fecha_hora_inicio) AS INTEGER) - ?) / ?) AS primera,
+           MIN(?, (CAST(strftime('%s', r.fecha_hora_fin) AS INTEGER) - ? + ? - 1) / ?) AS ultima,
+           SUM(r.num_comensales) AS comensales,
+           COUNT(*) AS reservas
+    FROM {origen_reservas(anterior)} r JOIN mesas m ON m.id = r.mesa_id
+    WHERE r.fecha_hora_inicio >= ? AND r.fecha_hora_inicio < ? AND r.fecha_hora_fin > ?
+      AND r.estado IN ({", ".join("?" * len(ESTADOS_OCUPAN))})
+      AND m.ubicacion IN ({", ".join("?" * len(ubicaciones))})
+    GROUP BY m.ubicacion, primera, ultima
+    """
+    parametros = (base, segundos, total, base, segundos, segundos, anterior, fin, inicio, *ESTADOS_OCUPAN, *ubicaciones)
+    indices, primeras, ultimas, comensales = [], [], [], []
+    reservas = 0
+    for lote in iterar_lotes(consulta, parametros, TAMANO_LOTE):
+        for fila in lote:
+            if fila["primera"] < fila["ultima"]:
+                indices.append(posicion[fila["ubicacion"]])
+                primeras.append(fila["primera"])
+                ultimas.append(fila["ultima"])
+                comensales.append(fila["comensales"])
+                reservas += fila["reservas"]
+    return (indices, primeras, ultimas, comensales), reservas
+
+
+def _acumular_numpy(diferencias: tuple, ubicaciones: int, dias: int, franjas_dia: int, dia_semana: int):
+    """Suma por día de la semana de los comensales sentados en cada franja, con NumPy: matriz (ubicación, 7, franjas)."""
+    indices, primeras, ultimas, comensales = (numpy.asarray(valores, dtype=numpy.int64) for valores in diferencias)
+    ocupacion = numpy.zeros((ubicaciones, dias * franjas_dia + 1), dtype=numpy.int64)
+    numpy.add.at(ocupacion, (indices, primeras), comensales)
+    numpy.add.at(ocupacion, (indices, ultimas), -comensales)
+    ocupacion = numpy.cumsum(ocupacion[:, :-1], axis=1).reshape(ubicaciones, dias, franjas_dia)
+    semana = numpy.zeros((ubicaciones, 7, franjas_dia), dtype=numpy.int64)
+    numpy.add.at(semana, (slice(None), (numpy.arange(dias) + dia_semana) % 7), ocupacion)
+    return semana.tolist()
+
+
+def _acumular_python(diferencias: tuple, ubicaciones: int, dias: int, franjas_dia: int, dia_semana: int):
+    """Lo mismo que `_acumular_numpy` con listas de Python."""
+    lineas = [[0] * (dias * franjas_dia + 1) for _ in range(ubicaciones)]
+    for indice, primera, ultima, comensales in zip(*diferencias):
+        linea = lineas[indice]
+        linea[primera] += comensales
+        linea[ultima] -= comensales
+    semana = []
+    for linea in lineas:
+        ocupacion = list(accumulate(linea))
+        filas = [[0] * franjas_dia for _ in range(7)]
+        for dia in range(dias):
+            semanal = (dia + dia_semana) % 7
+            desplazamiento = dia * franjas_dia
+            filas[semanal] = [a + b for a, b in zip(filas[semanal], ocupacion[desplazamiento:desplazamiento + franjas_dia])]
+        semana.append(filas)
+    return semana
+
+
+# Calcula el mapa de ocupación de un rango de días (ambos incluidos)
+def calcular_mapa(desde: date, hasta: date, minutos: int = 15, ubicacion: Optional[str] = None, vectorizado: Optional[bool] = None) -> dict:
+    """
+    Comensales sentados de media en cada franja por día de la semana y ubicación, y su utilización
+    (comensales / capacidad total de las mesas de la ubicación). `vectorizado` fuerza o evita
+    NumPy (por defecto se usa si está instalado).
+    """
+    dias = (hasta - desde).days + 1
+    franjas_dia = 24 * 60 // minutos
+    capacidades = _capacidades(ubicacion)
+    ubicaciones = list(capacidades)
+    diferencias, reservas = _diferencias(desde, dias, minutos, ubicaciones) if ubicaciones else (([], [], [], []), 0)
+    usar_numpy = numpy is not None if vectorizado is None else vectorizado
+    acumular = _acumular_numpy if usar_numpy else _acumular_python
+    semana = acumular(diferencias, len(ubicaciones), dias, franjas_dia, desde.weekday()) if ubicaciones else []
+
+    # Cuántas veces aparece cada día de la semana en el rango, para sacar la media
+    veces = [0] * 7
+    for dia in range(dias):
+        veces[(desde.weekday() + dia) % 7] += 1
+    resultado = {}
+    for nombre, filas in zip(ubicaciones, semana):
+        capacidad = capacidades[nombre]
+        medias = [[round(suma / veces[dia], 2) if veces[dia] else 0 for suma in fila] for dia, fila in enumerate(filas)]
+        resultado[nombre] = {
+            "capacidad": capacidad,
+            "comensales": dict(zip(DIAS_SEMANA, medias)),
+            "utilizacion": {
+                DIAS_SEMANA[dia]: [round(media / capacidad, 4) if capacidad else 0 for media in fila]
+                for dia, fila in enumerate(medias)
+            },
+        }
+    return {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "minutos": minutos,
+        "reservas": reservas,
+        "franjas": [f"{minuto // 60:02d}:{minuto % 60:02d}" for minuto in range(0, 24 * 60, minutos)],
+        "ubicaciones": resultado,
+    }
+
+
+# Mapa de ocupación, memoizado si el rango ya está cerrado
+def mapa_ocupacion(desde: date, hasta: date, minutos: int = 15, ubicacion: Optional[str] = None) -> dict:
+    """
+    Devuelve el mapa de ocupación del rango. Si el rango terminó antes de ayer (el cierre de
+    reservas vencidas ya no lo toca) el resultado se guarda; la clave lleva la versión de las
+    tablas de mesas y reservas, así que un cambio de capacidad o una reserva corregida
+    o borrada lo recalcula.
+    """
+    if hasta >= date.today() - timedelta(days=1):
+        return calcular_mapa(desde, hasta, minutos, ubicacion)
+    clave = (desde, hasta, minutos, ubicacion, versiones.actual(("mesas", "reservas")))
+    return memo_mapas.obtener_o_cargar(clave, lambda: calcular_mapa(desde, hasta, minutos, ubicacion))
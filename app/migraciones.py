@@ -0,0 +1,222 @@
+"""Migraciones del esquema de la base de datos."""
+
+import sqlite3
+
+from app.database import formatear_fecha, transaccion
+from app.archivo import ESQUEMA_ARCHIVO, TABLA_ARCHIVO
+from app.coherencia import ESQUEMA_CAMBIOS, TABLA_CAMBIOS, triggers_cambios
+from app.lista_espera import ESQUEMA_ESPERA
+from app.resumenes import TABLAS_RESUMEN, reconstruir_resumenes, trigger_resumen_borrado, triggers_resumen
+
+
+# Esquema base: las tablas tal y como estaban antes de las migraciones.
+# Con IF NOT EXISTS no hace nada en una base de datos ya existente,
+# y permite crear una base de datos vacía desde cero
+ESQUEMA_BASE = """
+CREATE TABLE IF NOT EXISTS clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    telefono TEXT NOT NULL,
+    notas TEXT,
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS mesas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero INTEGER UNIQUE NOT NULL,
+    capacidad INTEGER NOT NULL CHECK(capacidad IN (2, 4, 6, 8)),
+    ubicacion TEXT NOT NULL CHECK(ubicacion IN ('interior', 'terraza', 'privado')),
+    activa BOOLEAN DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS reservas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER NOT NULL,
+    mesa_id INTEGER NOT NULL,
+    fecha_hora_inicio TIMESTAMP NOT NULL,
+    fecha_hora_fin TIMESTAMP NOT NULL,
+    num_comensales INTEGER NOT NULL,
+    estado TEXT DEFAULT 'pendiente' CHECK(estado IN ('pendiente', 'confirmada', 'completada', 'cancelada')),
+    notas TEXT,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id),
+    FOREIGN KEY (mesa_id) REFERENCES mesas(id)
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_fecha ON reservas(fecha_hora_inicio);
+CREATE INDEX IF NOT EXISTS idx_reservas_mesa ON reservas(mesa_id);
+CREATE INDEX IF NOT EXISTS idx_reservas_cliente ON reservas(cliente_id);
+"""
+
+
+def _ejecutar_script(conexion, script: str):
+    """Ejecuta varias sentencias separadas por ';' dentro de la transacción actual."""
+    # executescript() hace COMMIT antes de empezar, por eso se ejecutan una a una
+    for sentencia in script.split(";"):
+        if sentencia.strip():
+            conexion.execute(sentencia)
+
+
+# Migración 1: crear el esquema base si la base de datos está vacía
+def _migracion_esquema_base(conexion):
+    _ejecutar_script(conexion, ESQUEMA_BASE)
+
+
+# Migración 2: normalizar las fechas guardadas al formato 'YYYY-MM-DD HH:MM:SS'
+# y añadir el índice compuesto que usa la comprobación de solapamiento
+def _migracion_fechas_normalizadas(conexion):
+    columnas = {
+        "reservas": ("fecha_hora_inicio", "fecha_hora_fin", "fecha_creacion"),
+        "clientes": ("fecha_registro",),
+    }
+    for tabla, nombres in columnas.items():
+        for columna in nombres:
+            # Solo se tocan los valores que no tienen ya 19 caracteres con espacio en medio
+            filas = conexion.execute(
+                f"""
+                SELECT id, {columna} AS valor FROM {tabla}
+                WHERE {columna} IS NOT NULL
+                  AND (length({columna}) != 19 OR substr({columna}, 11, 1) != ' ')
+                """
+            ).fetchall()
+            for fila in filas:
+                try:
+                    valor = formatear_fecha(str(fila["valor"]).replace("Z", "+00:00"))
+                except ValueError:
+                    continue
+                conexion.execute(f"UPDATE {tabla} SET {columna} = ? WHERE id = ?", (valor, fila["id"]))
+
+    conexion.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservas_mesa_fecha ON reservas(mesa_id, fecha_hora_inicio)"
+    )
+
+
+# Migración 3: índices compuestos para la paginación por cursor de reservas.
+# Cada filtro del listado tiene un índice que ya devuelve las filas en orden (fecha_hora_inicio, id),
+# así que no hace falta ordenar en memoria. Los índices de una sola columna sobre mesa_id y
+# cliente_id quedan cubiertos por los compuestos y se eliminan para abaratar las escrituras
+def _migracion_indices_paginacion(conexion):
+    _ejecutar_script(conexion, """
+        CREATE INDEX IF NOT EXISTS idx_reservas_cliente_fecha ON reservas(cliente_id, fecha_hora_inicio);
+        CREATE INDEX IF NOT EXISTS idx_reservas_estado_fecha ON reservas(estado, fecha_hora_inicio);
+        DROP INDEX IF EXISTS idx_reservas_mesa;
+        DROP INDEX IF EXISTS idx_reservas_cliente
+    """)
+
+
+# Migración 4: tablas resumen de estadísticas (por estado, cliente, mesa y día),
+# los triggers que las mantienen y su cálculo inicial con los datos existentes
+def _migracion_resumenes(conexion):
+    _ejecutar_script(conexion, TABLAS_RESUMEN)
+    for trigger in triggers_resumen():
+        conexion.execute(trigger)
+    # En esta versión del esquema todavía no existe el archivo de reservas
+    reconstruir_resumenes(conexion, origen="reservas")
+
+
+# Migración 5: índice de texto completo (FTS5 con trigramas) sobre nombre, email y teléfono
+# de los clientes, sincronizado con triggers. Si la versión de SQLite no trae FTS5,
+# no se crea y la búsqueda usa LIKE
+def _migracion_busqueda_clientes(conexion):
+    try:
+        conexion.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+                nombre, email, telefono,
+                content='clientes', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+    # Los triggers llevan ';' dentro de BEGIN ... END, así que se ejecutan de uno en uno
+    triggers = (
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_fts_insert AFTER INSERT ON clientes BEGIN
+            INSERT INTO clientes_fts (rowid, nombre, email, telefono) VALUES (NEW.id, NEW.nombre, NEW.email, NEW.telefono);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_fts_delete AFTER DELETE ON clientes BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, nombre, email, telefono) VALUES ('delete', OLD.id, OLD.nombre, OLD.email, OLD.telefono);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_fts_update AFTER UPDATE OF nombre, email, telefono ON clientes BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, nombre, email, telefono) VALUES ('delete', OLD.id, OLD.nombre, OLD.email, OLD.telefono);
+            INSERT INTO clientes_fts (rowid, nombre, email, telefono) VALUES (NEW.id, NEW.nombre, NEW.email, NEW.telefono);
+        END
+        """,
+    )
+    for trigger in triggers:
+        conexion.execute(trigger)
+    conexion.execute("INSERT INTO clientes_fts (clientes_fts) VALUES ('rebuild')")
+
+
+# Migración 6: tabla de archivo de reservas históricas y vista con todo el historial.
+# El trigger de borrado de los resúmenes se cambia para que mover una reserva al archivo
+# no la descuente de las estadísticas
+def _migracion_archivo_reservas(conexion):
+    _ejecutar_script(conexion, ESQUEMA_ARCHIVO)
+    conexion.execute("DROP TRIGGER IF EXISTS trg_reservas_resumen_delete")
+    conexion.execute(trigger_resumen_borrado("reservas", archivo=TABLA_ARCHIVO))
+
+
+# Migración 7: registro de cambios de mesas, clientes y reservas, que los procesos leen para
+# mantener al día su estado en memoria cuando la API se sirve con varios workers
+def _migracion_registro_cambios(conexion):
+    conexion.execute(ESQUEMA_CAMBIOS)
+    # Los triggers llevan ';' dentro de BEGIN ... END, así que se ejecutan de uno en uno
+    for trigger in triggers_cambios():
+        conexion.execute(trigger)
+
+
+# Migración 8: lista de espera de clientes que quieren reservar a una hora sin mesas libres
+def _migracion_lista_espera(conexion):
+    _ejecutar_script(conexion, ESQUEMA_ESPERA)
+
+
+# Migración 9: el registro de cambios apunta también la operación (INSERT, UPDATE o DELETE),
+# para que los eventos de GET /eventos con varios workers distingan las altas de los cambios
+def _migracion_operacion_cambios(conexion):
+    columnas = {fila[1] for fila in conexion.execute(f"PRAGMA table_info({TABLA_CAMBIOS})")}
+    if "operacion" not in columnas:
+        conexion.execute(f"ALTER TABLE {TABLA_CAMBIOS} ADD COLUMN operacion TEXT")
+    # Se borran los triggers que escriben en el registro y se crean de nuevo con la operación
+    anteriores = conexion.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE ?", (f"%INSERT INTO {TABLA_CAMBIOS}%",)
+    ).fetchall()
+    for (nombre,) in anteriores:
+        conexion.execute(f"DROP TRIGGER {nombre}")
+    for trigger in triggers_cambios():
+        conexion.execute(trigger)
+
+
+# Migración 10: índice del teléfono de los clientes, para que la búsqueda encuentre un teléfono
+# completo o su comienzo sin pasar por el índice de trigramas (el email ya tiene el de UNIQUE)
+def _migracion_indice_telefono(conexion):
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_clientes_telefono ON clientes(telefono)")
+
+
+# Lista ordenada de migraciones. La posición en la lista es la versión del esquema
+# (PRAGMA user_version), así que las nuevas migraciones se añaden siempre al final
+MIGRACIONES = [
+    _migracion_esquema_base,
+    _migracion_fechas_normalizadas,
+    _migracion_indices_paginacion,
+    _migracion_resumenes,
+    _migracion_busqueda_clientes,
+    _migracion_archivo_reservas,
+    _migracion_registro_cambios,
+    _migracion_lista_espera,
+    _migracion_operacion_cambios,
+    _migracion_indice_telefono,
+]
+
+
+def aplicar_migraciones():
+    """Aplica las migraciones pendientes y devuelve la versión final del esquema."""
+    while True:
+        with transaccion() as conexion:
+            # La versión se vuelve a leer dentro de la transacción por si otro proceso ya migró
+            version = conexion.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRACIONES):
+                return version
+            MIGRACIONES[version](conexion)
+            conexion.execute(f"PRAGMA user_version = {version + 1}")
@@ -26,6 +26,23 @@ class ReservaCreate(ReservaBase):
 		return value
 
 
+# Para crear reserva sin elegir mesa (POST /reservas/auto)
+class ReservaAutoCreate(BaseModel):
+	"""Modelo para crear una reserva en la mesa libre más pequeña en la que caben los comensales."""
+	cliente_id: int = Field(..., ge=1)
+	fecha_inicio: datetime
+	numero_comensales: int = Field(..., ge=1)
+	ubicacion: Optional[Literal["interior", "terraza", "privado"]] = None
+	estado: Literal["pendiente", "confirmada"] = "pendiente"
+	notas: Optional[str] = None
+
+	@validator("fecha_inicio")
+	def fecha_inicio_futura(cls, value: datetime) -> datetime:
+		if value <= datetime.now(value.tzinfo):
+			raise ValueError("La fecha de inicio debe ser futura")
+		return value
+
+
 # Para actualizar reserva (PUT)
 class ReservaUpdate(BaseModel):
 	"""Modelo para actualizar una reserva."""
@@ -52,3 +69,38 @@ class ReservaResponse(ReservaBase):
 
 	class Config:
 		from_attributes = True
+
+
+# Para apuntarse a la lista de espera (POST /reservas/espera)
+class EsperaCreate(BaseModel):
+	"""Modelo para pedir mesa a una hora: se reserva ya si hay mesa libre y si no se queda en espera."""
+	cliente_id: int = Field(..., ge=1)
+	fecha_inicio: datetime
+	# Las mesas más grandes son de 8: una entrada para más comensales no podría asignarse nunca
+	numero_comensales: int = Field(..., ge=1, le=8)
+	ubicacion: Optional[Literal["interior", "terraza", "privado"]] = None
+	notas: Optional[str] = None
+
+	@validator("fecha_inicio")
+	def fecha_inicio_futura(cls, value: datetime) -> datetime:
+		if value <= datetime.now(value.tzinfo):
+			raise ValueError("La fecha de inicio debe ser futura")
+		return value
+
+
+# Para respuestas de la lista de espera (GET /reservas/espera)
+class EsperaResponse(BaseModel):
+	"""Entrada de la lista de espera; `reserva_id` es la reserva creada cuando se asigna mesa."""
+	id: int
+	cliente_id: int
+	fecha_inicio: datetime
+	fecha_fin: datetime
+	numero_comensales: int
+	ubicacion: Optional[str] = None
+	notas: Optional[str] = None
+	estado: Literal["esperando", "asignada", "cancelada", "caducada"]
+	reserva_id: Optional[int] = None
+	fecha_creacion: datetime
+
+	class Config:
+		from_attributes = True
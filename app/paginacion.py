@@ -0,0 +1,55 @@
+"""Paginación por cursor y proyección de campos para los listados."""
+
+import base64
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+from app.respuestas import RespuestaJSONRapida, filas_confiables
+
+# Cabecera en la que se devuelve el cursor de la página siguiente
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+LIMITE_MAXIMO = 1000
+
+
+# Convierte el parámetro `campos` ("id,nombre,email") en una lista validada
+def campos_solicitados(campos: Optional[str], modelo) -> Optional[list[str]]:
+    """Devuelve la lista de campos pedidos o None si se piden todos."""
+    if not campos:
+        return None
+    lista = [campo.strip() for campo in campos.split(",") if campo.strip()]
+    desconocidos = [campo for campo in lista if campo not in modelo.model_fields]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(desconocidos)}")
+    return lista
+
+
+# El cursor de reservas es la pareja (fecha_hora_inicio, id) de la última fila devuelta
+def codificar_cursor(fecha: str, id_fila: int) -> str:
+    """Codifica un cursor opaco para la página siguiente."""
+    return base64.urlsafe_b64encode(f"{fecha}|{id_fila}".encode()).decode()
+
+
+def decodificar_cursor(cursor: str) -> tuple[str, int]:
+    """Decodifica un cursor creado con codificar_cursor."""
+    try:
+        fecha, id_fila = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return fecha, int(id_fila)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor no válido")
+
+
+def responder_pagina(filas: list[dict], response: Response, siguiente_cursor: Optional[str] = None,
+                     campos: Optional[list[str]] = None, modelo=None, rapida: bool = False):
+    """
+    Prepara la respuesta de un listado.
+    Si hay página siguiente, su cursor va en la cabecera X-Siguiente-Cursor.
+    Si se pidió una proyección, o la ruta usa la respuesta rápida (`rapida=True`), las filas se
+    convierten directamente al JSON del modelo sin pasar por el response_model (app/respuestas.py).
+    """
+    cabeceras = {CABECERA_CURSOR: siguiente_cursor} if siguiente_cursor else {}
+    if campos is None and not rapida:
+        response.headers.update(cabeceras)
+        return filas
+    # Las cabeceras que ya se pusieron en `response` (por ejemplo la ETag) se mantienen
+    return RespuestaJSONRapida(content=filas_confiables(filas, modelo, campos), headers={**response.headers, **cabeceras})
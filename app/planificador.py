@@ -0,0 +1,151 @@
+"""
+Planificador de tareas periódicas en segundo plano. Lo arranca y lo para el lifespan de app/main.py.
+Cada tarea es una función síncrona de base de datos que se ejecuta en el ejecutor de app/database_async.py.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from app.archivo import archivar_reservas
+from app.database_async import ejecutar_en_db
+from app.lista_espera import caducar_esperas
+from app.services.reserva_service import cerrar_reservas_vencidas
+
+# Con RESERVAS_PLANIFICADOR=0 no se arrancan las tareas de registrar_tareas()
+ACTIVO = os.environ.get("RESERVAS_PLANIFICADOR", "1") != "0"
+# Cierre de reservas: cada cuántos segundos, minutos de tolerancia antes de dar una pendiente
+# por no presentada, filas por lote y lotes como mucho por ejecución
+INTERVALO_CIERRE = float(os.environ.get("RESERVAS_CIERRE_INTERVALO", "60"))
+MINUTOS_NO_PRESENTADO = int(os.environ.get("RESERVAS_NO_PRESENTADO_MINUTOS", "30"))
+LOTE_CIERRE = int(os.environ.get("RESERVAS_CIERRE_LOTE", "500"))
+LOTES_MAXIMOS_CIERRE = int(os.environ.get("RESERVAS_CIERRE_LOTES_MAXIMOS", "20"))
+# Archivo de reservas: antigüedad en días a partir de la que se archivan (0 desactiva la tarea),
+# cada cuántos segundos, filas por lote y lotes como mucho por ejecución
+DIAS_ARCHIVO = int(os.environ.get("RESERVAS_ARCHIVO_DIAS", "365"))
+INTERVALO_ARCHIVO = float(os.environ.get("RESERVAS_ARCHIVO_INTERVALO", "3600"))
+LOTE_ARCHIVO = int(os.environ.get("RESERVAS_ARCHIVO_LOTE", "1000"))
+LOTES_MAXIMOS_ARCHIVO = int(os.environ.get("RESERVAS_ARCHIVO_LOTES_MAXIMOS", "20"))
+# Cada cuántos segundos se borran los cambios viejos de registro_cambios
+INTERVALO_PODA_CAMBIOS = 600
+
+log = logging.getLogger("app.planificador")
+
+
+class Tarea:
+    """Una tarea periódica con sus contadores."""
+
+    def __init__(self, nombre: str, intervalo: float, funcion: Callable[[], Optional[dict]]):
+        self.nombre = nombre
+        self.intervalo = intervalo
+        self.funcion = funcion
+        self.ejecuciones = 0
+        self.errores = 0
+        self.ultima_ejecucion = None
+        self.ultima_duracion = None
+        self.ultimo_resultado = None
+        self.ultimo_error = None
+        # Suma de los valores numéricos que devuelve la función (por ejemplo filas cerradas)
+        self.totales = {}
+
+
+class Planificador:
+    """
+    Ejecuta cada tarea al arrancar y después cada `intervalo` segundos, en una tarea asyncio propia.
+    Un error en una ejecución se registra en el log y en los contadores, y la tarea sigue.
+    Si hay varios procesos de la API, cada uno ejecuta sus tareas: las del cierre de reservas
+    solo tocan filas que siguen en el estado de origen, así que repetirlas no tiene efecto.
+    """
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._tareas = {}
+        self._en_marcha = []
+
+    def registrar(self, nombre: str, intervalo: float, funcion: Callable[[], Optional[dict]]):
+        """Añade (o sustituye) una tarea."""
+        with self._bloqueo:
+            self._tareas[nombre] = Tarea(nombre, intervalo, funcion)
+
+    async def ejecutar(self, nombre: str) -> Optional[dict]:
+        """Ejecuta una tarea una vez y actualiza sus contadores."""
+        tarea = self._tareas[nombre]
+        inicio = time.perf_counter()
+        try:
+            resultado = await ejecutar_en_db(tarea.funcion)
+        except Exception as e:
+            with self._bloqueo:
+                tarea.errores += 1
+                tarea.ultimo_error = repr(e)
+            log.exception("Error en la tarea %s", nombre)
+            return None
+        finally:
+            with self._bloqueo:
+                tarea.ejecuciones += 1
+                tarea.ultima_ejecucion = time.time()
+                tarea.ultima_duracion = time.perf_counter() - inicio
+        with self._bloqueo:
+            tarea.ultimo_resultado = resultado
+            for clave, valor in (resultado or {}).items():
+                if isinstance(valor, (int, float)):
+                    tarea.totales[clave] = tarea.totales.get(clave, 0) + valor
+        return resultado
+
+    async def _bucle(self, nombre: str):
+        while True:
+            await self.ejecutar(nombre)
+            await asyncio.sleep(self._tareas[nombre].intervalo)
+
+    def iniciar(self):
+        """Arranca todas las tareas registradas (hay que llamarlo con el bucle de eventos en marcha)."""
+        self._en_marcha = [asyncio.create_task(self._bucle(nombre), name=f"tarea-{nombre}") for nombre in self._tareas]
+
+    async def detener(self):
+        """Cancela las tareas en marcha y espera a que terminen."""
+        for tarea in self._en_marcha:
+            tarea.cancel()
+        await asyncio.gather(*self._en_marcha, return_exceptions=True)
+        self._en_marcha = []
+
+    def metricas(self) -> dict:
+        """Contadores de cada tarea."""
+        with self._bloqueo:
+            return {
+                tarea.nombre: {
+                    "intervalo_segundos": tarea.intervalo,
+                    "ejecuciones": tarea.ejecuciones,
+                    "errores": tarea.errores,
+                    "ultima_ejecucion": tarea.ultima_ejecucion,
+                    "ultima_duracion_segundos": tarea.ultima_duracion,
+                    "ultimo_resultado": tarea.ultimo_resultado,
+                    "ultimo_error": tarea.ultimo_error,
+                    "totales": dict(tarea.totales),
+                }
+                for tarea in self._tareas.values()
+            }
+
+
+# Planificador compartido por todo el proceso
+planificador = Planificador()
+
+
+def registrar_tareas():
+    """Registra las tareas periódicas de la API."""
+    planificador.registrar(
+        "cierre_reservas",
+        INTERVALO_CIERRE,
+        lambda: cerrar_reservas_vencidas(
+            minutos_no_presentado=MINUTOS_NO_PRESENTADO, tamano_lote=LOTE_CIERRE, lotes_maximos=LOTES_MAXIMOS_CIERRE,
+        ),
+    )
+    # Las entradas de la lista de espera cuya hora ya ha pasado se caducan con el mismo intervalo que el cierre
+    planificador.registrar("caducidad_espera", INTERVALO_CIERRE, caducar_esperas)
+    if DIAS_ARCHIVO > 0:
+        planificador.registrar(
+            "archivo_reservas",
+            INTERVALO_ARCHIVO,
+            lambda: archivar_reservas(dias=DIAS_ARCHIVO, tamano_lote=LOTE_ARCHIVO, lotes_maximos=LOTES_MAXIMOS_ARCHIVO),
+        )
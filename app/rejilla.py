@@ -0,0 +1,81 @@
+"""
+Rejilla de disponibilidad: cada día de una mesa es un mapa de bits de franjas de 15 minutos
+(bit i = franja que empieza en el minuto 15*i). Los mapas son enteros de Python, así que
+las operaciones (&, |, ~, >>) trabajan sobre todas las franjas a la vez.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+MINUTOS_FRANJA = 15
+FRANJAS_DIA = 24 * 60 // MINUTOS_FRANJA
+DIA_COMPLETO = (1 << FRANJAS_DIA) - 1
+
+
+def franja(momento: time) -> int:
+    """Franja en la que cae una hora del día (redondeando hacia abajo)."""
+    return (momento.hour * 60 + momento.minute) // MINUTOS_FRANJA
+
+
+def hora_franja(numero: int) -> str:
+    """Hora de inicio de una franja en formato HH:MM (la franja FRANJAS_DIA es el final del día, 24:00)."""
+    minutos = numero * MINUTOS_FRANJA
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def mascara(desde: int, hasta: int) -> int:
+    """Bits de las franjas [desde, hasta)."""
+    if hasta <= desde:
+        return 0
+    return ((1 << (hasta - desde)) - 1) << desde
+
+
+def bits_intervalo(inicio: datetime, fin: datetime, dia: date) -> int:
+    """
+    Franjas del día `dia` ocupadas por el intervalo [inicio, fin).
+    Una franja tocada solo en parte cuenta como ocupada, así que la rejilla nunca da por libre
+    una franja que no lo está (con reservas en múltiplos de 15 minutos es exacta).
+    """
+    comienzo_dia = datetime.combine(dia, time())
+    desde = max(inicio, comienzo_dia) - comienzo_dia
+    hasta = min(fin, comienzo_dia + timedelta(days=1)) - comienzo_dia
+    if hasta <= desde:
+        return 0
+    franja_desde = int(desde.total_seconds()) // (MINUTOS_FRANJA * 60)
+    franja_hasta = -(-int(hasta.total_seconds()) // (MINUTOS_FRANJA * 60))
+    return mascara(franja_desde, franja_hasta)
+
+
+def inicios_posibles(libres: int, franjas: int) -> int:
+    """
+    Bits de las franjas desde las que hay `franjas` franjas libres seguidas.
+    Se calcula con desplazamientos que duplican la longitud cubierta: O(log franjas) operaciones.
+    """
+    posibles = libres
+    cubiertas = 1
+    while cubiertas < franjas:
+        paso = min(cubiertas, franjas - cubiertas)
+        posibles &= posibles >> paso
+        cubiertas += paso
+    return posibles
+
+
+def tramos(bits: int) -> list[tuple[int, int]]:
+    """Tramos de bits consecutivos a 1, como pares (desde, hasta) de franjas."""
+    resultado = []
+    while bits:
+        desde = (bits & -bits).bit_length() - 1
+        resto = bits >> desde
+        longitud = ((resto + 1) & ~resto).bit_length() - 1
+        resultado.append((desde, desde + longitud))
+        bits &= ~mascara(desde, desde + longitud)
+    return resultado
+
+
+def posiciones(bits: int) -> list[int]:
+    """Índices de los bits a 1, de menor a mayor."""
+    resultado = []
+    while bits:
+        menor = bits & -bits
+        resultado.append(menor.bit_length() - 1)
+        bits ^= menor
+    return resultado
@@ -0,0 +1,63 @@
+"""
+Respuestas JSON rápidas para los listados: las filas de la base de datos se convierten
+directamente al formato de los modelos de respuesta, sin volver a validarlas con Pydantic,
+y se serializan con orjson si está instalado (si no, con json).
+"""
+
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+
+class RespuestaJSONRapida(JSONResponse):
+    """JSONResponse que serializa con orjson si está disponible (mismo JSON compacto que json)."""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def _campos_modelo(modelo) -> tuple:
+    """(nombre, es_fecha, es_booleano) de cada campo del modelo, en el orden en que Pydantic los escribe."""
+    return tuple(
+        (nombre, campo.annotation is datetime, campo.annotation is bool)
+        for nombre, campo in modelo.model_fields.items()
+    )
+
+
+# Convierte filas de la base de datos (ya válidas) al JSON del modelo de respuesta
+def filas_confiables(filas: list[dict], modelo, campos: Optional[list[str]] = None) -> list[dict]:
+    """
+    Devuelve las filas con los campos del modelo (o solo `campos`) y los tipos ajustados como los
+    escribiría Pydantic: fechas en ISO 8601 con 'T' y booleanos como true/false.
+    Solo para filas leídas de la base de datos, que ya cumplen el modelo: no se valida nada.
+    """
+    definicion = _campos_modelo(modelo)
+    if campos is not None:
+        por_nombre = {campo[0]: campo for campo in definicion}
+        definicion = tuple(por_nombre[nombre] for nombre in campos if nombre in por_nombre)
+    fechas = [nombre for nombre, es_fecha, _ in definicion if es_fecha]
+    booleanos = [nombre for nombre, _, es_booleano in definicion if es_booleano]
+    nombres = [nombre for nombre, _, _ in definicion]
+    resultado = []
+    for fila in filas:
+        salida = {nombre: fila.get(nombre) for nombre in nombres}
+        for nombre in fechas:
+            valor = salida[nombre]
+            if isinstance(valor, str):
+                salida[nombre] = valor.replace(" ", "T", 1)
+        for nombre in booleanos:
+            if salida[nombre] is not None:
+                salida[nombre] = bool(salida[nombre])
+        resultado.append(salida)
+    return resultado
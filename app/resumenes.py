@@ -0,0 +1,133 @@
+"""Tablas resumen de estadísticas mantenidas por triggers."""
+
+from typing import Optional
+
+from app.archivo import VISTA_HISTORICO
+from app.database import obtener_todos, transaccion
+
+# Estados que cuentan para la ocupación (igual que en estadisticas_service)
+ESTADOS_OCUPACION = "('pendiente', 'confirmada', 'completada')"
+
+# Tablas resumen. Cada fila guarda un contador que los triggers de `reservas`
+# suben y bajan en cada INSERT, UPDATE y DELETE
+TABLAS_RESUMEN = """
+CREATE TABLE IF NOT EXISTS resumen_estados (
+    estado TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS resumen_clientes (
+    cliente_id INTEGER PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_clientes_total ON resumen_clientes(total DESC);
+CREATE TABLE IF NOT EXISTS resumen_mesas (
+    mesa_id INTEGER PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_mesas_total ON resumen_mesas(total DESC);
+CREATE TABLE IF NOT EXISTS resumen_dias (
+    fecha TEXT PRIMARY KEY,
+    total_reservas INTEGER NOT NULL DEFAULT 0,
+    total_comensales INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def _sumar(fila: str, signo: str) -> str:
+    """
+    Sentencias que suman (signo '+') o restan (signo '-') una reserva a los resúmenes.
+    `fila` es NEW u OLD dentro del trigger.
+    """
+    return f"""
+        INSERT INTO resumen_estados (estado, total) VALUES ({fila}.estado, {signo}1)
+            ON CONFLICT(estado) DO UPDATE SET total = total + excluded.total;
+        INSERT INTO resumen_clientes (cliente_id, total) VALUES ({fila}.cliente_id, {signo}1)
+            ON CONFLICT(cliente_id) DO UPDATE SET total = total + excluded.total;
+        INSERT INTO resumen_mesas (mesa_id, total) VALUES ({fila}.mesa_id, {signo}1)
+            ON CONFLICT(mesa_id) DO UPDATE SET total = total + excluded.total;
+        INSERT INTO resumen_dias (fecha, total_reservas, total_comensales)
+            SELECT substr({fila}.fecha_hora_inicio, 1, 10), {signo}1, {signo}{fila}.num_comensales
+            WHERE {fila}.estado IN {ESTADOS_OCUPACION}
+            ON CONFLICT(fecha) DO UPDATE SET
+                total_reservas = total_reservas + excluded.total_reservas,
+                total_comensales = total_comensales + excluded.total_comensales;
+    """
+
+
+def trigger_resumen_borrado(tabla: str = "reservas", archivo: Optional[str] = None) -> str:
+    """
+    Sentencia CREATE TRIGGER que resta de los resúmenes las reservas borradas de `tabla`.
+    Con `archivo`, las reservas que se borran porque se han movido a esa tabla no se restan.
+    """
+    condicion = f"WHEN NOT EXISTS (SELECT 1 FROM {archivo} WHERE id = OLD.id)" if archivo else ""
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_resumen_delete AFTER DELETE ON {tabla} {condicion}
+        BEGIN {_sumar("OLD", "-")} END
+        """
+
+
+def triggers_resumen(tabla: str = "reservas") -> list[str]:
+    """Devuelve las sentencias CREATE TRIGGER que mantienen los resúmenes para `tabla`."""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_resumen_insert AFTER INSERT ON {tabla}
+        BEGIN {_sumar("NEW", "+")} END
+        """,
+        trigger_resumen_borrado(tabla),
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_resumen_update
+        AFTER UPDATE OF estado, cliente_id, mesa_id, fecha_hora_inicio, num_comensales ON {tabla}
+        BEGIN {_sumar("OLD", "-")} {_sumar("NEW", "+")} END
+        """,
+    ]
+
+
+# Consultas de agregación directa sobre las reservas: son las que se usaban antes de
+# tener resúmenes y sirven para reconstruirlos y para verificarlos. `{origen}` es la vista
+# con todo el historial (tabla viva y archivo), porque los resúmenes cuentan también lo archivado
+AGREGADOS = {
+    "resumen_estados": "SELECT estado, COUNT(*) AS total FROM {origen} GROUP BY estado",
+    "resumen_clientes": "SELECT cliente_id, COUNT(*) AS total FROM {origen} GROUP BY cliente_id",
+    "resumen_mesas": "SELECT mesa_id, COUNT(*) AS total FROM {origen} GROUP BY mesa_id",
+    "resumen_dias": f"""
+        SELECT substr(fecha_hora_inicio, 1, 10) AS fecha,
+            COUNT(*) AS total_reservas,
+            SUM(num_comensales) AS total_comensales
+        FROM {{origen}}
+        WHERE estado IN {ESTADOS_OCUPACION}
+        GROUP BY substr(fecha_hora_inicio, 1, 10)
+    """,
+}
+
+
+def reconstruir_resumenes(conexion=None, origen: str = VISTA_HISTORICO):
+    """Vacía y vuelve a calcular las tablas resumen a partir de las reservas de `origen`."""
+    if conexion is None:
+        with transaccion() as conexion:
+            return reconstruir_resumenes(conexion, origen)
+    for tabla, consulta in AGREGADOS.items():
+        conexion.execute(f"DELETE FROM {tabla}")
+        conexion.execute(f"INSERT INTO {tabla} {consulta.format(origen=origen)}")
+    return {tabla: conexion.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0] for tabla in AGREGADOS}
+
+
+def verificar_resumenes(origen: str = VISTA_HISTORICO) -> dict:
+    """Compara cada tabla resumen con la agregación directa y devuelve las claves que no coinciden."""
+    diferencias = {}
+    for tabla, consulta in AGREGADOS.items():
+        consulta = consulta.format(origen=origen)
+        # La primera columna es la clave y el resto los contadores.
+        # Las filas que han bajado a cero equivalen a no tener fila
+        resumen = {}
+        for fila in obtener_todos(f"SELECT * FROM {tabla}"):
+            clave, *contadores = fila.values()
+            if any(contadores):
+                resumen[clave] = tuple(contadores)
+        reales = {}
+        for fila in obtener_todos(consulta):
+            clave, *contadores = fila.values()
+            reales[clave] = tuple(contadores)
+        distintas = sorted(str(clave) for clave in set(resumen) | set(reales) if resumen.get(clave) != reales.get(clave))
+        if distintas:
+            diferencias[tabla] = distintas
+    return {"consistente": not diferencias, "diferencias": diferencias}
@@ -1,47 +1,69 @@
 """Rutas de clientes."""
 
-from fastapi import APIRouter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from app.cache_http import condicional
 from app.models.cliente import ClienteCreate, ClienteResponse
-from app.services.cliente_service import crear_cliente, obtener_todos_clientes, obtener_cliente_por_id, actualizar_cliente, eliminar_cliente
+from app.services.cliente_service import crear_cliente, obtener_todos_clientes, obtener_cliente_por_id, actualizar_cliente, eliminar_cliente, buscar_clientes
 from app.exceptions.custom_exceptions import ClienteNoEncontradoError
+from app.paginacion import LIMITE_MAXIMO, campos_solicitados, responder_pagina
+from app.respuestas import RespuestaJSONRapida
 
 router = APIRouter(prefix="/clientes", tags=["Clientes"])
 
 # Endpoint Get /clientes/
 @router.post("/", response_model=ClienteResponse)
-def crear(cliente: ClienteCreate):
+async def crear(cliente: ClienteCreate):
     """Crea un cliente nuevo."""
-    return crear_cliente(cliente)
+    return await crear_cliente(cliente)
+
+# Endpoint Get /clientes/buscar (va antes de /{cliente_id} para que "buscar" no se lea como id)
+@router.get("/buscar", response_model=list[ClienteResponse])
+async def buscar(q: str = Query(..., min_length=1), limite: int = Query(20, ge=1, le=100)):
+    """Busca clientes por nombre, email o teléfono, ordenados por relevancia."""
+    return await buscar_clientes(q, limite)
 
 # Endpoint Get /clientes/{id}
-@router.get("/{cliente_id}", response_model=ClienteResponse)
-def obtener_cliente(cliente_id: int):
+@router.get("/{cliente_id}", response_model=ClienteResponse, dependencies=[Depends(condicional("clientes"))])
+async def obtener_cliente(cliente_id: int):
     """Obtiene un cliente por su id."""
-    cliente = obtener_cliente_por_id(cliente_id)
+    cliente = await obtener_cliente_por_id(cliente_id)
     if not cliente:
         raise ClienteNoEncontradoError("No existe un cliente con ese id")
     return cliente
 
 # Endpoint Post /clientes/
-@router.get("/", response_model=list[ClienteResponse])
-def obtener_clientes():
-    """Lista todos los clientes."""
-    return obtener_todos_clientes()
+@router.get("/", response_model=list[ClienteResponse], response_class=RespuestaJSONRapida)
+async def obtener_clientes(
+    response: Response,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues_de_id: Optional[int] = None,
+    campos: Optional[str] = Query(None, description="Campos separados por comas, por ejemplo id,nombre"),
+):
+    """
+    Lista clientes. Con `limite` pagina por cursor: el id para la página siguiente va en X-Siguiente-Cursor.
+    Las filas salen con la respuesta rápida, sin volver a validarlas con ClienteResponse.
+    """
+    lista_campos = campos_solicitados(campos, ClienteResponse)
+    filas = await obtener_todos_clientes(limite, despues_de_id, lista_campos)
+    siguiente = str(filas[-1]["id"]) if limite is not None and len(filas) == limite else None
+    return responder_pagina(filas, response, siguiente, lista_campos, ClienteResponse, rapida=True)
 
 # Endpoint Put /clientes/{id}
 @router.put("/{cliente_id}", response_model=ClienteResponse)
-def actualizar(cliente_id: int, datos_actualizados: ClienteCreate):
+async def actualizar(cliente_id: int, datos_actualizados: ClienteCreate):
     """Actualiza los datos de un cliente."""
-    cliente = actualizar_cliente(cliente_id, datos_actualizados)
+    cliente = await actualizar_cliente(cliente_id, datos_actualizados)
     if not cliente:
         raise ClienteNoEncontradoError("No existe un cliente con ese id")
     return cliente
 
 # Endpoint Delete /clientes/{id}
 @router.delete("/{cliente_id}", response_model=ClienteResponse)
-def eliminar(cliente_id: int):
+async def eliminar(cliente_id: int):
     """Elimina un cliente por su id."""
-    cliente = eliminar_cliente(cliente_id)
+    cliente = await eliminar_cliente(cliente_id)
     if not cliente:
         raise ClienteNoEncontradoError("No existe un cliente con ese id")
     return cliente
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""Rutas de disponibilidad."""
+
+from datetime import date, time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.services.mesa_service import obtener_disponibilidad
+
+router = APIRouter(prefix="/disponibilidad", tags=["Disponibilidad"])
+
+# Endpoint Get /disponibilidad
+@router.get("")
+async def disponibilidad(
+    fecha: date,
+    desde: Optional[time] = None,
+    hasta: Optional[time] = None,
+    duracion: int = Query(120, ge=15, le=24 * 60, description="Minutos de la reserva"),
+    capacidad: int = Query(1, ge=1),
+    ubicacion: Optional[str] = None,
+):
+    """
+    Devuelve las mesas libres de un día para una capacidad y ubicación: en cada una, las horas
+    (cada 15 minutos) a las que puede empezar una reserva de `duracion` minutos dentro de la
+    ventana [desde, hasta) y los tramos libres de la ventana.
+    """
+    if desde is not None and hasta is not None and hasta <= desde:
+        raise HTTPException(status_code=400, detail="hasta debe ser posterior a desde")
+    return await obtener_disponibilidad(fecha, desde, hasta, duracion, capacidad, ubicacion)
@@ -0,0 +1,46 @@
+"""Rutas de la lista de espera."""
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException
+from app.models.reserva import EsperaCreate, EsperaResponse
+from app.services.lista_espera_service import cancelar_espera, crear_espera, obtener_esperas
+from app.exceptions.custom_exceptions import ClienteNoEncontradoError
+
+# Se incluye en app/main.py antes que el router de reservas, para que "espera" no se lea como id de reserva
+router = APIRouter(prefix="/reservas/espera", tags=["Lista de espera"])
+
+
+# Endpoint Get /reservas/espera
+@router.get("", response_model=list[EsperaResponse])
+async def listar_esperas(
+    fecha: Optional[str] = None,
+    estado: Optional[Literal["esperando", "asignada", "cancelada", "caducada"]] = None,
+    cliente_id: Optional[int] = None,
+):
+    """Lista la lista de espera por orden de llegada (el orden en que se ofrecen las mesas que se liberan)."""
+    return await obtener_esperas(fecha, estado, cliente_id)
+
+# Endpoint Post /reservas/espera
+@router.post("", response_model=EsperaResponse)
+async def apuntar(espera: EsperaCreate):
+    """
+    Pide mesa para una hora. Si hay una mesa libre se reserva en el momento (estado asignada y
+    `reserva_id`); si no, la entrada queda esperando y se reserva sola cuando se libere una mesa
+    en la que quepa (por una cancelación, una reserva movida o una mesa nueva o ampliada).
+    """
+    try:
+        return await crear_espera(espera)
+    except ClienteNoEncontradoError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Endpoint DELETE /reservas/espera/{id}
+@router.delete("/{espera_id}", response_model=EsperaResponse)
+async def cancelar(espera_id: int):
+    """Saca a un cliente de la lista de espera. Si ya tiene mesa asignada hay que cancelar su reserva."""
+    espera = await cancelar_espera(espera_id)
+    if espera is None:
+        raise HTTPException(status_code=404, detail="No existe una entrada de la lista de espera con ese id")
+    if espera["estado"] != "cancelada":
+        raise HTTPException(status_code=409, detail=f"La entrada no está esperando (estado {espera['estado']})")
+    return espera
@@ -1,53 +1,79 @@
 """Rutas de estadísticas."""
 
-from fastapi import APIRouter
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.cache_http import condicional
+from app.respuestas import RespuestaJSONRapida
 from app.services.estadisticas_service import (
 	obtener_ocupacion_diaria,
 	obtener_ocupacion_semanal,
 	obtener_clientes_frecuentes,
 	obtener_mesas_populares,
 	obtener_resumen_general,
+	obtener_mapa_ocupacion,
 )
 
 
-router = APIRouter(prefix="/estadisticas", tags=["Estadisticas"])
+# Todas las estadísticas se calculan a partir de reservas, mesas y clientes: ETag y 304 con sus versiones
+router = APIRouter(prefix="/estadisticas", tags=["Estadisticas"], dependencies=[Depends(condicional("reservas", "mesas", "clientes"))])
 
 # Endpoint raíz de estadísticas
 @router.get("/")
-def estadisticas_root():
+async def estadisticas_root():
 	"""Devuelve un resumen general de estadísticas."""
-	return obtener_resumen_general()
+	return await obtener_resumen_general()
 
 # Endpoint para obtener la ocupación diaria
+# Las fechas van tipadas como `date`: una fecha mal escrita es un 422 y no un 500
 @router.get("/ocupacion/diaria")
-def ocupacion_diaria(fecha: str):
+async def ocupacion_diaria(fecha: date):
 	"""Devuelve la ocupación diaria para una fecha."""
-	return obtener_ocupacion_diaria(fecha)
+	return await obtener_ocupacion_diaria(fecha)
 
 
 # Endpoint para obtener la ocupación semanal
 @router.get("/ocupacion/semanal")
-def ocupacion_semanal(fecha_inicio: str):
+async def ocupacion_semanal(fecha_inicio: date):
 	"""Devuelve la ocupación de una semana."""
-	return obtener_ocupacion_semanal(fecha_inicio)
+	return await obtener_ocupacion_semanal(fecha_inicio)
 
 
 # Endpoint para obtener los clientes más frecuentes
 @router.get("/clientes-frecuentes")
-def clientes_frecuentes():
+async def clientes_frecuentes():
 	"""Devuelve el top de clientes con más reservas."""
-	return obtener_clientes_frecuentes()
+	return await obtener_clientes_frecuentes()
 
 
 # Endpoint para obtener las mesas más populares
 @router.get("/mesas-populares")
-def mesas_populares():
+async def mesas_populares():
 	"""Devuelve las mesas más reservadas."""
-	return obtener_mesas_populares()
+	return await obtener_mesas_populares()
 
 
 # Endpoint para obtener un resumen general de estadísticas
 @router.get("/resumen")
-def resumen_general():
+async def resumen_general():
 	"""Devuelve un resumen general de reservas."""
-	return obtener_resumen_general()
+	return await obtener_resumen_general()
+
+
+# Endpoint para obtener el mapa de ocupación (heatmap) por franja, día de la semana y ubicación
+@router.get("/heatmap", response_class=RespuestaJSONRapida)
+async def mapa_ocupacion(
+	desde: date,
+	hasta: date,
+	minutos: int = Query(15, description="Minutos de cada franja: 15, 30 o 60"),
+	ubicacion: Optional[str] = Query(None, description="Solo una ubicación (interior, terraza o privado)"),
+):
+	"""
+	Devuelve, por ubicación y día de la semana, los comensales sentados de media en cada franja
+	del rango (ambos días incluidos) y la utilización frente a la capacidad total de las mesas.
+	"""
+	try:
+		return await obtener_mapa_ocupacion(desde, hasta, minutos, ubicacion)
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,31 @@
+"""Rutas de eventos en tiempo real."""
+
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from app.eventos import centro_eventos, flujo_eventos
+
+router = APIRouter(prefix="/eventos", tags=["Eventos"])
+
+# Endpoint Get /eventos (server-sent events)
+@router.get("")
+async def eventos(
+    fecha: Optional[date] = Query(None, description="Solo los eventos de reservas de ese día (los de mesas llegan siempre)"),
+    ultimo_id: Optional[str] = Query(None, description="Alternativa a la cabecera Last-Event-ID"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Envía en streaming (text/event-stream) los cambios de reservas (reserva_creada, reserva_actualizada,
+    reserva_confirmada, reserva_completada, reserva_cancelada) y de mesas (mesa_creada,
+    mesa_actualizada, mesa_eliminada), con la fila completa en `data`.
+    Al reconectar con Last-Event-ID se reciben los eventos perdidos; si ya no están en el
+    historial llega un evento `reinicio` y hay que volver a cargar los listados.
+    """
+    suscripcion, iniciales = centro_eventos.suscribir(last_event_id or ultimo_id, fecha.isoformat() if fecha else None)
+    return StreamingResponse(
+        flujo_eventos(suscripcion, iniciales),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
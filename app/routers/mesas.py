@@ -1,54 +1,73 @@
 """Rutas de mesas."""
 
-from fastapi import APIRouter
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from app.cache_http import condicional
 from app.models.mesa import MesaCreate, MesaResponse
 from app.services.mesa_service import crear_mesa, obtener_todas_mesas, obtener_mesa_por_id, actualizar_mesa, eliminar_mesa, obtener_mesa_disponible
 from app.exceptions.custom_exceptions import MesaNoExisteError
+from app.paginacion import LIMITE_MAXIMO, campos_solicitados, responder_pagina
+from app.respuestas import RespuestaJSONRapida
 
 router = APIRouter(prefix="/mesas", tags=["Mesas"])
 
 # Endpoint Get /mesas/
 @router.post("/", response_model=MesaResponse)
-def crear(mesa: MesaCreate):
+async def crear(mesa: MesaCreate):
     """Crea una mesa nueva."""
-    return crear_mesa(mesa)
+    return await crear_mesa(mesa)
 
 # Endpoint Get /mesas/{id}
-@router.get("/{mesa_id}", response_model=MesaResponse)
-def obtener_mesa(mesa_id: int):
+@router.get("/{mesa_id}", response_model=MesaResponse, dependencies=[Depends(condicional("mesas"))])
+async def obtener_mesa(mesa_id: int):
     """Obtiene una mesa por su id."""
-    mesa = obtener_mesa_por_id(mesa_id)
+    mesa = await obtener_mesa_por_id(mesa_id)
     if not mesa:
         raise MesaNoExisteError("No existe una mesa con ese id")
     return mesa
 
 # Endpoint Post /mesas/
-@router.get("/", response_model=list[MesaResponse])
-def obtener_mesas():
-    """Lista todas las mesas."""
-    return obtener_todas_mesas()    
+@router.get("/", response_model=list[MesaResponse], response_class=RespuestaJSONRapida, dependencies=[Depends(condicional("mesas"))])
+async def obtener_mesas(
+    response: Response,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues_de_id: Optional[int] = None,
+    campos: Optional[str] = Query(None, description="Campos separados por comas, por ejemplo id,numero"),
+):
+    """
+    Lista mesas. Con `limite` pagina por cursor: el id para la página siguiente va en X-Siguiente-Cursor.
+    Las filas salen con la respuesta rápida, sin volver a validarlas con MesaResponse.
+    """
+    lista_campos = campos_solicitados(campos, MesaResponse)
+    filas = await obtener_todas_mesas(limite, despues_de_id, lista_campos)
+    siguiente = str(filas[-1]["id"]) if limite is not None and len(filas) == limite else None
+    return responder_pagina(filas, response, siguiente, lista_campos, MesaResponse, rapida=True)
 
 # Endpoint Put /mesas/{id}
 @router.put("/{mesa_id}", response_model=MesaResponse)
-def actualizar(mesa_id: int, datos_actualizados: MesaCreate):
+async def actualizar(mesa_id: int, datos_actualizados: MesaCreate):
     """Actualiza los datos de una mesa."""
-    mesa = actualizar_mesa(mesa_id, datos_actualizados)
+    mesa = await actualizar_mesa(mesa_id, datos_actualizados)
     if not mesa:
         raise MesaNoExisteError("No existe una mesa con ese id")
     return mesa 
 
 # Endpoint Delete /mesas/{id}
 @router.delete("/{mesa_id}", response_model=MesaResponse)
-def eliminar(mesa_id: int):
+async def eliminar(mesa_id: int):
     """Elimina una mesa por su id."""
-    mesa = eliminar_mesa(mesa_id)
+    mesa = await eliminar_mesa(mesa_id)
     if not mesa:
         raise MesaNoExisteError("No existe una mesa con ese id")
     return mesa
 
 # Endpoint Get /mesas/disponibles/
 @router.get("/disponibles/", response_model=list[MesaResponse])
-def obtener_mesas_disponibles(fecha_inicio: str, fecha_fin: str, capacidad: int):
-    """Devuelve mesas disponibles según filtros."""
-    return obtener_mesa_disponible(fecha_inicio, fecha_fin, capacidad)
+async def obtener_mesas_disponibles(fecha_inicio: datetime, fecha_fin: datetime, capacidad: int = Query(1, ge=1), ubicacion: Optional[str] = None):
+    """Devuelve las mesas libres con capacidad suficiente entre fecha_inicio y fecha_fin."""
+    if fecha_fin <= fecha_inicio:
+        raise HTTPException(status_code=400, detail="fecha_fin debe ser posterior a fecha_inicio")
+    return await obtener_mesa_disponible(fecha_inicio, fecha_fin, capacidad, ubicacion)
 
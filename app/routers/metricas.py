@@ -0,0 +1,41 @@
+"""Rutas de métricas internas."""
+
+from fastapi import APIRouter
+from app.cache import cache_clientes, cache_mesas
+from app.cache_http import cache_respuestas
+from app.coherencia import coherencia
+from app.escritor import escritor
+from app.mapa_ocupacion import memo_mapas
+from app.planificador import planificador
+from app.versiones import versiones
+
+
+router = APIRouter(prefix="/metricas", tags=["Metricas"])
+
+# Endpoint para ver los contadores de las cachés de mesas y clientes
+@router.get("/cache")
+async def metricas_cache():
+    """
+    Devuelve aciertos, fallos y expulsiones de las cachés, las versiones de las tablas y
+    los cambios de otros procesos aplicados (con RESERVAS_MULTIPROCESO=1).
+    """
+    return {
+        "mesas": cache_mesas.metricas(),
+        "clientes": cache_clientes.metricas(),
+        "respuestas": cache_respuestas.metricas(),
+        "heatmap": memo_mapas.metricas(),
+        "versiones": versiones.metricas(),
+        "coherencia": coherencia.metricas(),
+    }
+
+# Endpoint con los contadores de las tareas periódicas (cierre de reservas)
+@router.get("/tareas")
+async def metricas_tareas():
+    """Devuelve ejecuciones, errores, duración y filas procesadas de cada tarea periódica."""
+    return planificador.metricas()
+
+# Endpoint con los contadores del escritor agrupado de cambios de estado
+@router.get("/escritor")
+async def metricas_escritor():
+    """Devuelve lotes confirmados, escrituras, errores y tamaño medio y máximo de los lotes."""
+    return escritor.metricas()
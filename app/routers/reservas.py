@@ -1,76 +1,178 @@
 """Rutas de reservas."""
 
-from fastapi import APIRouter
-from app.models.reserva import ReservaCreate, ReservaResponse, ReservaUpdate
-from app.services.reserva_service import obtener_reservas, obtener_reserva_por_id, crear_reserva, actualizar_reserva, cancelar_reserva, confirmar_llegada_cliente_patch, marcar_reserva_como_completada_patch
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from app.models.reserva import ReservaAutoCreate, ReservaCreate, ReservaResponse, ReservaUpdate
+from app.services.reserva_service import obtener_reservas, obtener_reserva_por_id, crear_reserva, crear_reserva_auto, actualizar_reserva, cancelar_reserva, confirmar_llegada_cliente_patch, marcar_reserva_como_completada_patch, importar_reservas, exportar_reservas, FORMATOS_EXPORTACION
 from app.exceptions.custom_exceptions import (
     ReservaSolapadaError,
     CapacidadExcedidaError,
     MesaNoExisteError,
     ClienteNoEncontradoError,
     CancelacionNoPermitidaError,
+    MesaNoDisponibleError,
 )
+from app.paginacion import LIMITE_MAXIMO, campos_solicitados, codificar_cursor, decodificar_cursor, responder_pagina
+from app.respuestas import RespuestaJSONRapida, filas_confiables
 
 router = APIRouter(prefix="/reservas", tags=["Reservas"])
 
 
 # Endpoint Get /reservas/
-@router.get("/", response_model=list[ReservaResponse])
-def listar_reservas(fecha: str = None, cliente_id: int = None, mesa_id: int = None, estado: str = None):
-    """Lista reservas con filtros opcionales."""
-    return obtener_reservas(fecha, cliente_id, mesa_id, estado)
+@router.get("/", response_model=list[ReservaResponse], response_class=RespuestaJSONRapida)
+async def listar_reservas(
+    response: Response,
+    fecha: str = None,
+    cliente_id: int = None,
+    mesa_id: int = None,
+    estado: str = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    despues_de: Optional[str] = Query(None, description="Cursor devuelto en X-Siguiente-Cursor"),
+    campos: Optional[str] = Query(None, description="Campos separados por comas, por ejemplo id,fecha_inicio"),
+):
+    """
+    Lista reservas con filtros opcionales. Con `limite` pagina por cursor sobre (fecha_inicio, id).
+    Las filas salen con la respuesta rápida, sin volver a validarlas con ReservaResponse.
+    """
+    lista_campos = campos_solicitados(campos, ReservaResponse)
+    cursor = decodificar_cursor(despues_de) if despues_de else None
+    filas = await obtener_reservas(fecha, cliente_id, mesa_id, estado, limite, cursor, lista_campos)
+    siguiente = None
+    if limite is not None and len(filas) == limite:
+        siguiente = codificar_cursor(filas[-1]["fecha_inicio"], filas[-1]["id"])
+    return responder_pagina(filas, response, siguiente, lista_campos, ReservaResponse, rapida=True)
+
+# Endpoint Get /reservas/export (va antes de /{reserva_id} para que "export" no se lea como id)
+@router.get("/export")
+async def exportar(
+    formato: Literal["ndjson", "csv"] = "ndjson",
+    fecha: str = None,
+    cliente_id: int = None,
+    mesa_id: int = None,
+    estado: str = None,
+):
+    """Exporta las reservas que cumplen los filtros en NDJSON o CSV, en streaming."""
+    return StreamingResponse(
+        exportar_reservas(formato, fecha, cliente_id, mesa_id, estado),
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="reservas.{formato}"'},
+    )
 
 # Endpoint Get /reservas/{id}
 @router.get("/{reserva_id}", response_model=ReservaResponse)
-def obtener_reserva(reserva_id: int):
+async def obtener_reserva(reserva_id: int):
     """Obtiene una reserva por su id."""
-    reserva = obtener_reserva_por_id(reserva_id)
+    reserva = await obtener_reserva_por_id(reserva_id)
     if not reserva:
         raise ReservaSolapadaError("No existe una reserva con ese id")
     return reserva
 
 # Endpoint Post /reservas/
 @router.post("/", response_model=ReservaResponse)
-def crear(reserva: ReservaCreate):
+async def crear(reserva: ReservaCreate):
     """Crea una reserva nueva."""
     try:
-        return crear_reserva(reserva)
+        return await crear_reserva(reserva)
     except (ReservaSolapadaError, CapacidadExcedidaError, MesaNoExisteError, ClienteNoEncontradoError) as e:
         raise e
-    
+
+# Endpoint Post /reservas/auto
+@router.post("/auto", response_model=ReservaResponse)
+async def crear_auto(reserva: ReservaAutoCreate):
+    """
+    Crea una reserva sin indicar la mesa: se asigna la mesa activa más pequeña en la que caben
+    los comensales y que está libre (opcionalmente en una ubicación). Si no hay ninguna, responde 409.
+    """
+    try:
+        return await crear_reserva_auto(reserva)
+    except MesaNoDisponibleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Número máximo de reservas por lote
+LOTE_MAXIMO = 5000
+
+# Convierte un elemento del lote en ReservaCreate, o en el motivo por el que no es válido
+def _leer_elemento(dato):
+    try:
+        return ReservaCreate.model_validate(dato)
+    except ValidationError as e:
+        return "; ".join(f"{'.'.join(str(p) for p in error['loc']) or 'reserva'}: {error['msg']}" for error in e.errors())
+
+# Endpoint Post /reservas/lote
+# El cuerpo es un array JSON o, con Content-Type application/x-ndjson, una reserva JSON por línea
+@router.post("/lote")
+async def crear_lote(request: Request, response: Response, modo: Literal["todo", "parcial"] = "todo"):
+    """
+    Crea varias reservas de una vez.
+    modo=todo inserta el lote solo si todas las reservas son válidas; modo=parcial inserta las válidas.
+    Devuelve el resultado de cada reserva (aceptada o el motivo del rechazo) en el mismo orden.
+    """
+    cuerpo = await request.body()
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = []
+        for linea in cuerpo.decode().splitlines():
+            if not linea.strip():
+                continue
+            try:
+                items.append(_leer_elemento(json.loads(linea)))
+            except json.JSONDecodeError as e:
+                items.append(f"JSON no válido: {e.msg}")
+    else:
+        try:
+            datos = json.loads(cuerpo)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"JSON no válido: {e.msg}")
+        if not isinstance(datos, list):
+            raise HTTPException(status_code=400, detail="El cuerpo debe ser un array de reservas")
+        items = [_leer_elemento(dato) for dato in datos]
+    if len(items) > LOTE_MAXIMO:
+        raise HTTPException(status_code=413, detail=f"El lote no puede tener más de {LOTE_MAXIMO} reservas")
+    resultado = await importar_reservas(items, modo)
+    # Las reservas aceptadas salen como en POST /reservas (fechas ISO 8601), no como filas de la base de datos
+    aceptadas = [elemento for elemento in resultado["resultados"] if elemento["reserva"] is not None]
+    for elemento, reserva in zip(aceptadas, filas_confiables([elemento["reserva"] for elemento in aceptadas], ReservaResponse)):
+        elemento["reserva"] = reserva
+    if modo == "todo" and resultado["rechazadas"]:
+        response.status_code = 422
+    return resultado
+
 # Endpoint Put /reservas/{id}
 @router.put("/{reserva_id}", response_model=ReservaResponse)
-def actualizar(reserva_id: int, datos_actualizados: ReservaUpdate):
+async def actualizar(reserva_id: int, datos_actualizados: ReservaUpdate):
     """Actualiza una reserva existente."""
     try:
-        return actualizar_reserva(reserva_id, datos_actualizados)
+        return await actualizar_reserva(reserva_id, datos_actualizados)
     except (ReservaSolapadaError, CapacidadExcedidaError, MesaNoExisteError, ClienteNoEncontradoError) as e:
         raise e
 
 # Endpoint DELETE /reservas/{id}
 @router.delete("/{reserva_id}", response_model=ReservaResponse)
-def cancelar(reserva_id: int):
+async def cancelar(reserva_id: int):
     """Cancela una reserva por su id."""
     try:
-        return cancelar_reserva(reserva_id)
+        return await cancelar_reserva(reserva_id)
     except CancelacionNoPermitidaError as e:
         raise e
 
 # Endpoint PATCH /reservas/{id}/confirmar
 @router.patch("/{reserva_id}/confirmar", response_model=ReservaResponse)
-def confirmar_llegada(reserva_id: int):
+async def confirmar_llegada(reserva_id: int):
     """Confirma la llegada del cliente."""
     try:
-        return confirmar_llegada_cliente_patch(reserva_id)
+        return await confirmar_llegada_cliente_patch(reserva_id)
     except ReservaSolapadaError as e:
         raise e
     
 # Endpoint PATCH /reservas/{id}/completar
 @router.patch("/{reserva_id}/completar", response_model=ReservaResponse)
-def completar_reserva(reserva_id: int):
+async def completar_reserva(reserva_id: int):
     """Marca la reserva como completada."""
     try:
-        return marcar_reserva_como_completada_patch(reserva_id)
+        return await marcar_reserva_como_completada_patch(reserva_id)
     except ReservaSolapadaError as e:
         raise e
 
@@ -1,15 +1,22 @@
 """Servicios de clientes."""
 
-from app.database import ejecutar_consulta, obtener_uno, obtener_todos
+import os
+import re
+
+from app.cache import cache_clientes
+from app.versiones import versiones
+from app import database
+from app.database_async import ejecutar_consulta, ejecutar_en_db, obtener_uno, obtener_todos
 from app.models.cliente import ClienteCreate
 from app.exceptions.custom_exceptions import ClienteYaExisteError
+from typing import Optional
 
 
-def crear_cliente(cliente: ClienteCreate):
+async def crear_cliente(cliente: ClienteCreate):
     """Crea un cliente si el email no existe."""
     # 1. Comprobar si ya existe email
     consulta = "SELECT * FROM clientes WHERE email = ?"
-    existente = obtener_uno(consulta, (cliente.email,))
+    existente = await obtener_uno(consulta, (cliente.email,))
 
     if existente:
         raise ClienteYaExisteError("Ya existe un cliente con ese email")
@@ -19,7 +26,7 @@ def crear_cliente(cliente: ClienteCreate):
     INSERT INTO clientes (nombre, email, telefono, notas)
     VALUES (?, ?, ?, ?)
     """
-    ejecutar_consulta(insert, (
+    await ejecutar_consulta(insert, (
         cliente.nombre,
         cliente.email,
         cliente.telefono,
@@ -27,28 +34,51 @@ def crear_cliente(cliente: ClienteCreate):
     ))
 
     # 3. Devolver cliente creado
-    return obtener_uno("SELECT * FROM clientes WHERE email = ?", (cliente.email,))
+    nuevo = await obtener_uno("SELECT * FROM clientes WHERE email = ?", (cliente.email,))
+    if nuevo:
+        cache_clientes.invalidar(nuevo["id"])
+    versiones.tocar("clientes")
+    return nuevo
 
-def obtener_todos_clientes():
-    """Obtiene la lista completa de clientes."""
-    consulta = "SELECT * FROM clientes"
-    return obtener_todos(consulta)
+# Columnas que se pueden pedir en la proyección de campos
+COLUMNAS_CLIENTE = ("id", "nombre", "email", "telefono", "notas", "fecha_registro")
 
+async def obtener_todos_clientes(limite: Optional[int] = None, despues_de_id: Optional[int] = None, campos: Optional[list[str]] = None):
+    """
+    Obtiene la lista de clientes ordenada por id.
+    Con `limite` y `despues_de_id` se pagina por cursor (WHERE id > ?), sin OFFSET.
+    """
+    columnas = ", ".join(["id"] + [c for c in (campos or COLUMNAS_CLIENTE) if c in COLUMNAS_CLIENTE and c != "id"])
+    consulta = f"SELECT {columnas} FROM clientes"
+    parametros = []
+    if despues_de_id is not None:
+        consulta += " WHERE id > ?"
+        parametros.append(despues_de_id)
+    consulta += " ORDER BY id"
+    if limite is not None:
+        consulta += " LIMIT ?"
+        parametros.append(limite)
+    return await obtener_todos(consulta, tuple(parametros))
 
-def obtener_cliente_por_id(cliente_id: int):
-    """Obtiene un cliente por su id."""
+
+async def obtener_cliente_por_id(cliente_id: int):
+    """Obtiene un cliente por su id (primero en la caché de clientes)."""
     # 1. Comprobar si existe id
-    consulta = "SELECT * FROM clientes WHERE id = ?"
-    cliente = obtener_uno(consulta, (cliente_id,))
+    cliente = cache_clientes.obtener(cliente_id)
+    if cliente is None:
+        generacion = cache_clientes.generacion
+        consulta = "SELECT * FROM clientes WHERE id = ?"
+        cliente = await obtener_uno(consulta, (cliente_id,))
+        cache_clientes.guardar(cliente_id, cliente, generacion)
     if not cliente:
         return None
     return cliente
 
-def actualizar_cliente(cliente_id: int, datos_actualizados: ClienteCreate):
+async def actualizar_cliente(cliente_id: int, datos_actualizados: ClienteCreate):
     """Actualiza los datos de un cliente."""
     # 1. Comprobar si existe id
     consulta = "SELECT * FROM clientes WHERE id = ?"
-    cliente = obtener_uno(consulta, (cliente_id,))
+    cliente = await obtener_uno(consulta, (cliente_id,))
     if not cliente:
         return None
 
@@ -58,7 +88,7 @@ def actualizar_cliente(cliente_id: int, datos_actualizados: ClienteCreate):
     SET nombre = ?, email = ?, telefono = ?, notas = ?
     WHERE id = ?
     """
-    ejecutar_consulta(update, (
+    await ejecutar_consulta(update, (
         datos_actualizados.nombre,
         datos_actualizados.email,
         datos_actualizados.telefono,
@@ -67,13 +97,15 @@ def actualizar_cliente(cliente_id: int, datos_actualizados: ClienteCreate):
     ))
 
     # 3. Devolver cliente actualizado
-    return obtener_uno("SELECT * FROM clientes WHERE id = ?", (cliente_id,))
+    cache_clientes.invalidar(cliente_id)
+    versiones.tocar("clientes")
+    return await obtener_uno("SELECT * FROM clientes WHERE id = ?", (cliente_id,))
 
-def eliminar_cliente(cliente_id: int):
+async def eliminar_cliente(cliente_id: int):
     """Elimina un cliente si no tiene reservas activas."""
     # 1. Comprobar si existe id
     consulta = "SELECT * FROM clientes WHERE id = ?"
-    cliente = obtener_uno(consulta, (cliente_id,))
+    cliente = await obtener_uno(consulta, (cliente_id,))
     if not cliente:
         return None
     # 2. Comprobar si tiene reservas activas
@@ -81,19 +113,121 @@ def eliminar_cliente(cliente_id: int):
     SELECT * FROM reservas
     WHERE cliente_id = ? AND estado IN ('pendiente', 'confirmada')
     """
-    reservas_activas = ejecutar_consulta(consulta_reservas, (cliente_id,))
+    reservas_activas = await ejecutar_consulta(consulta_reservas, (cliente_id,))
     if reservas_activas:
         return "No se puede eliminar el cliente porque tiene reservas activas"
     # 3. Eliminar cliente
     delete = "DELETE FROM clientes WHERE id = ?"
-    ejecutar_consulta(delete, (cliente_id,))
+    await ejecutar_consulta(delete, (cliente_id,))
+    cache_clientes.invalidar(cliente_id)
+    versiones.tocar("clientes")
     return "Cliente eliminado correctamente"
 
-def obtener_cliente_por_nombre_o_email_o_telefono(busqueda: str):
-    """Busca clientes por nombre, email o teléfono."""
+# La búsqueda usa el índice FTS5 de trigramas (clientes_fts) si existe.
+# Los trigramas necesitan al menos 3 caracteres; con menos, o sin FTS5, se usa LIKE
+LONGITUD_MINIMA_FTS = 3
+# Coincidencias del índice FTS que se ordenan por relevancia como mucho (las de los clientes más recientes).
+# Ordenar por bm25 todas las coincidencias de un apellido común cuesta cientos de ms con 1M de clientes
+CANDIDATOS_FTS = int(os.environ.get("RESERVAS_BUSQUEDA_CANDIDATOS", "250"))
+_fts_disponible = None
+
+async def _hay_indice_fts():
+    """Comprueba (una sola vez por proceso) si existe la tabla clientes_fts."""
+    global _fts_disponible
+    if _fts_disponible is None:
+        fila = await obtener_uno("SELECT 1 AS existe FROM sqlite_master WHERE name = 'clientes_fts'")
+        _fts_disponible = fila is not None
+    return _fts_disponible
+
+def _relevancia(cliente, termino: str):
+    """
+    Nivel de relevancia de un cliente para `termino` (ya en minúsculas): 0 si un campo es igual,
+    1 si un campo empieza por él, 2 si una palabra del nombre empieza por él y 3 si solo lo contiene.
+    Devuelve None si ningún campo lo contiene.
+    """
+    nombre = (cliente["nombre"] or "").casefold()
+    email = (cliente["email"] or "").casefold()
+    telefono = (cliente["telefono"] or "").casefold()
+    if termino == nombre or termino == email or termino == telefono:
+        return 0
+    if nombre.startswith(termino) or email.startswith(termino) or telefono.startswith(termino):
+        return 1
+    if f" {termino}" in nombre:
+        return 2
+    if termino in nombre or termino in email or termino in telefono:
+        return 3
+    return None
+
+def _parece_email_o_telefono(busqueda: str) -> bool:
+    """Una búsqueda con '@' o solo con dígitos (y '+', espacios o guiones) se trata como un email o un teléfono."""
+    return "@" in busqueda or re.fullmatch(r"\+?[\d\s-]+", busqueda) is not None
+
+def _ordenar_por_relevancia(filas, busqueda: str, limite: int):
+    """Quita repetidos y los clientes que no contienen la búsqueda; a igualdad de relevancia, los más recientes primero."""
+    termino = busqueda.casefold()
+    encontrados = {}
+    for fila in filas:
+        if fila["id"] not in encontrados:
+            nivel = _relevancia(fila, termino)
+            if nivel is not None:
+                encontrados[fila["id"]] = (nivel, -fila["id"], fila)
+    return [fila for _, _, fila in sorted(encontrados.values(), key=lambda clave: clave[:2])[:limite]]
+
+def _buscar_con_indices(busqueda: str, limite: int):
+    """Búsqueda con los índices de email y teléfono y con clientes_fts (se ejecuta en un hilo de la base de datos)."""
+    # 1. Camino rápido: email o teléfono iguales o que empiezan por la búsqueda, por sus índices B-tree.
+    # Si la búsqueda es un email o un teléfono y hay clientes así, no se buscan subcadenas: una frase
+    # rara hecha de trigramas frecuentes (un teléfono entre un millón) obliga a FTS a leer listas largas
+    fin_prefijo = busqueda + chr(0x10FFFF)
+    filas = database.obtener_todos(
+        """
+        SELECT * FROM (SELECT * FROM clientes WHERE email >= ? AND email < ? ORDER BY email LIMIT ?)
+        UNION
+        SELECT * FROM (SELECT * FROM clientes WHERE telefono >= ? AND telefono < ? ORDER BY telefono LIMIT ?)
+        """,
+        (busqueda, fin_prefijo, limite, busqueda, fin_prefijo, limite),
+    )
+    if filas and _parece_email_o_telefono(busqueda):
+        return _ordenar_por_relevancia(filas, busqueda, limite)
+    # 2. Candidatos del índice de trigramas. Cada palabra va entre comillas, para que caracteres
+    # como '@' o '-' no sean sintaxis FTS, y se unen con AND: una frase con trigramas muy comunes
+    # ("123456@correo") es mucho más lenta que sus palabras por separado. Es un superconjunto de
+    # las coincidencias, que se filtran después con _relevancia
+    palabras = re.findall(r"\w{3,}", busqueda) or [busqueda]
+    expresion = " AND ".join('"' + palabra.replace('"', '""') + '"' for palabra in palabras)
+    # Sin rank el índice devuelve las coincidencias por rowid y el LIMIT corta pronto
+    filas += database.obtener_todos(
+        """
+        SELECT c.* FROM (
+            SELECT rowid FROM clientes_fts WHERE clientes_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+        ) AS f
+        JOIN clientes c ON c.id = f.rowid
+        """,
+        (expresion, max(CANDIDATOS_FTS, limite)),
+    )
+    return _ordenar_por_relevancia(filas, busqueda, limite)
+
+async def buscar_clientes(busqueda: str, limite: int = 20):
+    """
+    Busca clientes por nombre, email o teléfono, ordenados por relevancia.
+    Primero van los clientes con ese email o teléfono (o uno que empieza por la búsqueda); si la
+    búsqueda es un email o un teléfono y los hay, solo esos. Si más de CANDIDATOS_FTS clientes
+    contienen la búsqueda, se ordenan solo los más recientes de ellos.
+    """
+    busqueda = busqueda.strip()
+    if not busqueda:
+        return []
+    if len(busqueda) >= LONGITUD_MINIMA_FTS and await _hay_indice_fts():
+        return await ejecutar_en_db(_buscar_con_indices, busqueda, limite)
+
     consulta = """
     SELECT * FROM clientes
     WHERE nombre LIKE ? OR email LIKE ? OR telefono LIKE ?
+    LIMIT ?
     """
     parametro_busqueda = f"%{busqueda}%"
-    return ejecutar_consulta(consulta, (parametro_busqueda, parametro_busqueda, parametro_busqueda))
+    return await obtener_todos(consulta, (parametro_busqueda, parametro_busqueda, parametro_busqueda, limite))
+
+async def obtener_cliente_por_nombre_o_email_o_telefono(busqueda: str):
+    """Busca clientes por nombre, email o teléfono."""
+    return await buscar_clientes(busqueda)
@@ -1,41 +1,40 @@
 """Servicios de estadísticas."""
 
-from datetime import datetime, timedelta
-from app.database import obtener_todos, obtener_uno
+from datetime import date, timedelta
+from typing import Optional
+from app.database_async import ejecutar_en_db, obtener_todos, obtener_uno
+from app.mapa_ocupacion import DIAS_MAXIMOS, MINUTOS_FRANJA, mapa_ocupacion
+
+# Las estadísticas se leen de las tablas resumen (resumen_estados, resumen_clientes,
+# resumen_mesas y resumen_dias), que los triggers de `reservas` mantienen al día.
+# Así cada endpoint lee unas pocas filas en lugar de recorrer toda la tabla de reservas.
+# Los resúmenes incluyen las reservas archivadas (app/archivo.py): mover una reserva al
+# archivo no la descuenta. Las consultas que lean reservas sueltas de un rango de fechas
+# deben usar archivo.origen_reservas(), que solo une el archivo si el rango lo necesita
 
 # Funcion para calcular la ocupación diaria, semanal, clientes frecuentes, mesas populares y resumen general de reservas
-def obtener_ocupacion_diaria(fecha: str):
+async def obtener_ocupacion_diaria(fecha: date):
     """Calcula la ocupación de un día."""
-    consulta = """
-    SELECT
-        COUNT(*) as total_reservas,
-        COALESCE(SUM(num_comensales), 0) as total_comensales
-    FROM reservas
-    WHERE DATE(fecha_hora_inicio) = DATE(?)
-      AND estado IN ('pendiente', 'confirmada', 'completada')
-    """
-    resultado = obtener_uno(consulta, (fecha,))
+    consulta = "SELECT total_reservas, total_comensales FROM resumen_dias WHERE fecha = ?"
+    resultado = await obtener_uno(consulta, (fecha.isoformat(),))
     return {
-        "fecha": fecha,
+        "fecha": fecha.isoformat(),
         "total_reservas": resultado["total_reservas"] if resultado else 0,
         "total_comensales": resultado["total_comensales"] if resultado else 0,
     }
 
 # Función para calcular la ocupación semanal
-def obtener_ocupacion_semanal(fecha_inicio: str):
+async def obtener_ocupacion_semanal(inicio: date):
     """Calcula la ocupación de una semana completa."""
-    inicio = datetime.fromisoformat(fecha_inicio).date()
     fin = inicio + timedelta(days=6)
 
     consulta = """
-    SELECT DATE(fecha_hora_inicio) as fecha, COUNT(*) as total_reservas
-    FROM reservas
-    WHERE DATE(fecha_hora_inicio) BETWEEN DATE(?) AND DATE(?)
-      AND estado IN ('pendiente', 'confirmada', 'completada')
-    GROUP BY DATE(fecha_hora_inicio)
-    ORDER BY DATE(fecha_hora_inicio)
+    SELECT fecha, total_reservas
+    FROM resumen_dias
+    WHERE fecha BETWEEN ? AND ? AND total_reservas > 0
+    ORDER BY fecha
     """
-    filas = obtener_todos(consulta, (inicio.isoformat(), fin.isoformat()))
+    filas = await obtener_todos(consulta, (inicio.isoformat(), fin.isoformat()))
     return {
         "fecha_inicio": inicio.isoformat(),
         "fecha_fin": fin.isoformat(),
@@ -46,61 +45,56 @@ def obtener_ocupacion_semanal(fecha_inicio: str):
     }
 
 # Función para obtener los clientes más frecuentes
-def obtener_clientes_frecuentes():
+async def obtener_clientes_frecuentes():
     """Devuelve el top 10 de clientes con más reservas."""
     consulta = """
-    SELECT cliente_id, COUNT(*) as total_reservas
-    FROM reservas
-    GROUP BY cliente_id
-    ORDER BY total_reservas DESC
+    SELECT cliente_id, total as total_reservas
+    FROM resumen_clientes
+    WHERE total > 0
+    ORDER BY total DESC
     LIMIT 10
     """
-    filas = obtener_todos(consulta)
+    filas = await obtener_todos(consulta)
     return [
         {"cliente_id": fila["cliente_id"], "total_reservas": fila["total_reservas"]}
         for fila in (filas or [])
     ]
 
 # Función para obtener las mesas más populares
-def obtener_mesas_populares():
+async def obtener_mesas_populares():
     """Devuelve las mesas más reservadas."""
     consulta = """
-    SELECT mesa_id, COUNT(*) as total_reservas
-    FROM reservas
-    GROUP BY mesa_id
-    ORDER BY total_reservas DESC
+    SELECT mesa_id, total as total_reservas
+    FROM resumen_mesas
+    WHERE total > 0
+    ORDER BY total DESC
     """
-    filas = obtener_todos(consulta)
+    filas = await obtener_todos(consulta)
     return [
         {"mesa_id": fila["mesa_id"], "total_reservas": fila["total_reservas"]}
         for fila in (filas or [])
     ]
 
 # Función para obtener un resumen general de reservas
-def obtener_resumen_general():
+async def obtener_resumen_general():
     """Devuelve un resumen general de reservas."""
-    consulta = """
-    SELECT
-        COUNT(*) as total_reservas,
-        SUM(CASE WHEN estado = 'cancelada' THEN 1 ELSE 0 END) as total_canceladas,
-        SUM(CASE WHEN estado = 'completada' THEN 1 ELSE 0 END) as total_completadas,
-        SUM(CASE WHEN estado = 'pendiente' THEN 1 ELSE 0 END) as total_pendientes,
-        SUM(CASE WHEN estado = 'confirmada' THEN 1 ELSE 0 END) as total_confirmadas
-    FROM reservas
-    """
-    fila = obtener_uno(consulta)
-    if not fila:
-        return {
-            "total_reservas": 0,
-            "total_canceladas": 0,
-            "total_completadas": 0,
-            "total_pendientes": 0,
-            "total_confirmadas": 0,
-        }
+    filas = await obtener_todos("SELECT estado, total FROM resumen_estados")
+    totales = {fila["estado"]: fila["total"] for fila in filas}
     return {
-        "total_reservas": fila["total_reservas"],
-        "total_canceladas": fila["total_canceladas"],
-        "total_completadas": fila["total_completadas"],
-        "total_pendientes": fila["total_pendientes"],
-        "total_confirmadas": fila["total_confirmadas"],
+        "total_reservas": sum(totales.values()),
+        "total_canceladas": totales.get("cancelada", 0),
+        "total_completadas": totales.get("completada", 0),
+        "total_pendientes": totales.get("pendiente", 0),
+        "total_confirmadas": totales.get("confirmada", 0),
     }
+
+# Función para obtener el mapa de ocupación por franja, día de la semana y ubicación de un rango de días
+async def obtener_mapa_ocupacion(desde: date, hasta: date, minutos: int = 15, ubicacion: Optional[str] = None):
+    """Calcula el mapa de ocupación (heatmap) de un rango de días, ambos incluidos."""
+    if hasta < desde:
+        raise ValueError("La fecha final no puede ser anterior a la inicial")
+    if (hasta - desde).days + 1 > DIAS_MAXIMOS:
+        raise ValueError(f"El rango no puede tener más de {DIAS_MAXIMOS} días")
+    if minutos not in MINUTOS_FRANJA:
+        raise ValueError(f"Las franjas deben ser de {', '.join(str(valor) for valor in MINUTOS_FRANJA)} minutos")
+    return await ejecutar_en_db(mapa_ocupacion, desde, hasta, minutos, ubicacion)
@@ -0,0 +1,91 @@
+"""Servicios de la lista de espera."""
+
+from datetime import datetime
+from typing import Optional
+
+from app.coherencia import coherencia
+from app.database import formatear_fecha, obtener_uno, rango_dias, transaccion
+from app.database_async import ejecutar_en_db, obtener_todos
+from app.eventos import centro_eventos
+from app.indice_reservas import indice_reservas
+from app.lista_espera import COLUMNAS_ESPERA, DURACION_RESERVA, TABLA_ESPERA, lista_espera
+from app.models.reserva import EsperaCreate
+from app.services.reserva_service import _asegurar_datetime, _validar_cliente
+from app.versiones import versiones
+
+# Función para obtener una entrada de la lista de espera por su id
+def _obtener_espera(espera_id: int, conexion=None):
+    """Obtiene una entrada de la lista de espera por su id."""
+    return obtener_uno(f"SELECT {COLUMNAS_ESPERA} FROM {TABLA_ESPERA} WHERE id = ?", (espera_id,), conexion)
+
+# Función para apuntar a un cliente en la lista de espera. Si ya hay una mesa libre se reserva en el
+# momento (la entrada queda asignada); si no, la entrada espera a que se libere una mesa.
+# La búsqueda de mesa y la inserción van con el bloqueo de escritura del índice y en una sola transacción
+def _crear_espera(espera: EsperaCreate):
+    """Crea una entrada de la lista de espera (síncrono, se ejecuta en un hilo de base de datos)."""
+    fecha_inicio = _asegurar_datetime(espera.fecha_inicio)
+    if fecha_inicio <= datetime.now(fecha_inicio.tzinfo):
+        raise ValueError("La fecha de inicio debe ser futura")
+    # Toda entrada dura DURACION_RESERVA: ListaEspera._candidatos busca las que se solapan con un hueco contando con ello
+    fecha_fin = fecha_inicio + DURACION_RESERVA
+
+    reserva = None
+    with indice_reservas.escritura():
+        with transaccion() as conexion:
+            coherencia.sincronizar(conexion)
+            _validar_cliente(espera.cliente_id, conexion)
+            insert = f"""
+            INSERT INTO {TABLA_ESPERA} (cliente_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, ubicacion, notas, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            RETURNING {COLUMNAS_ESPERA}
+            """
+            entrada = obtener_uno(insert, (
+                espera.cliente_id,
+                formatear_fecha(fecha_inicio),
+                formatear_fecha(fecha_fin),
+                espera.numero_comensales,
+                espera.ubicacion,
+                espera.notas,
+                formatear_fecha(datetime.now()),
+            ), conexion)
+            mesa = indice_reservas.mejor_mesa_libre(fecha_inicio, fecha_fin, espera.numero_comensales, espera.ubicacion)
+            if mesa is not None:
+                reserva = lista_espera.asignar(conexion, entrada, mesa["id"])
+                entrada = _obtener_espera(entrada["id"], conexion)
+        if reserva is not None:
+            indice_reservas.registrar_reserva(reserva)
+            versiones.tocar("reservas")
+            centro_eventos.publicar_reserva(reserva, "reserva_creada")
+    return entrada
+
+async def crear_espera(espera: EsperaCreate):
+    """Apunta a un cliente en la lista de espera (o le reserva mesa si ya hay una libre)."""
+    return await ejecutar_en_db(_crear_espera, espera)
+
+# Función para listar la lista de espera por orden de llegada, con filtros opcionales
+async def obtener_esperas(fecha: Optional[str] = None, estado: Optional[str] = None, cliente_id: Optional[int] = None):
+    """Lista las entradas de la lista de espera por orden de llegada."""
+    condiciones = []
+    parametros = []
+    if fecha:
+        condiciones.append("fecha_hora_inicio >= ? AND fecha_hora_inicio < ?")
+        parametros.extend(rango_dias(fecha))
+    if estado:
+        condiciones.append("estado = ?")
+        parametros.append(estado)
+    if cliente_id:
+        condiciones.append("cliente_id = ?")
+        parametros.append(cliente_id)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return await obtener_todos(f"SELECT {COLUMNAS_ESPERA} FROM {TABLA_ESPERA} {where} ORDER BY id", tuple(parametros))
+
+# Función para sacar a un cliente de la lista de espera (solo si sigue esperando)
+def _cancelar_espera(espera_id: int):
+    """Cancela una entrada en espera y devuelve cómo ha quedado (None si no existe)."""
+    with transaccion() as conexion:
+        conexion.execute(f"UPDATE {TABLA_ESPERA} SET estado = 'cancelada' WHERE id = ? AND estado = 'esperando'", (espera_id,))
+        return _obtener_espera(espera_id, conexion)
+
+async def cancelar_espera(espera_id: int):
+    """Saca a un cliente de la lista de espera."""
+    return await ejecutar_en_db(_cancelar_espera, espera_id)
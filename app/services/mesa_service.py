@@ -1,29 +1,56 @@
 """Servicios de mesas."""
 
-from app.database import ejecutar_consulta, obtener_uno, obtener_todos
+from app.database_async import ejecutar_consulta, ejecutar_en_db, obtener_uno, obtener_todos
+from app.cache import cache_mesas
+from app.eventos import centro_eventos
+from app.versiones import versiones
+from app.indice_reservas import indice_reservas
+from app.lista_espera import lista_espera
 from app.models.mesa import MesaCreate
 from app.exceptions.custom_exceptions import MesaNoExisteError, MesaYaExisteError
+from app.rejilla import FRANJAS_DIA, MINUTOS_FRANJA, hora_franja
+from datetime import date, time
+from typing import Optional
 
 
-def obtener_todas_mesas():
-    """Obtiene la lista completa de mesas."""
-    consulta = "SELECT * FROM mesas"
-    return obtener_todos(consulta)
+# Columnas que se pueden pedir en la proyección de campos
+COLUMNAS_MESA = ("id", "numero", "capacidad", "ubicacion", "activa")
 
-def obtener_mesa_por_id(mesa_id: int):
-    """Obtiene una mesa por su id."""
+async def obtener_todas_mesas(limite: Optional[int] = None, despues_de_id: Optional[int] = None, campos: Optional[list[str]] = None):
+    """
+    Obtiene la lista de mesas ordenada por id.
+    Con `limite` y `despues_de_id` se pagina por cursor (WHERE id > ?), sin OFFSET.
+    """
+    columnas = ", ".join(["id"] + [c for c in (campos or COLUMNAS_MESA) if c in COLUMNAS_MESA and c != "id"])
+    consulta = f"SELECT {columnas} FROM mesas"
+    parametros = []
+    if despues_de_id is not None:
+        consulta += " WHERE id > ?"
+        parametros.append(despues_de_id)
+    consulta += " ORDER BY id"
+    if limite is not None:
+        consulta += " LIMIT ?"
+        parametros.append(limite)
+    return await obtener_todos(consulta, tuple(parametros))
+
+async def obtener_mesa_por_id(mesa_id: int):
+    """Obtiene una mesa por su id (primero en la caché de mesas)."""
         # 1. Comprobar si existe id
-    consulta = "SELECT * FROM mesas WHERE id = ?"
-    mesa = obtener_uno(consulta, (mesa_id,))
+    mesa = cache_mesas.obtener(mesa_id)
+    if mesa is None:
+        generacion = cache_mesas.generacion
+        consulta = "SELECT * FROM mesas WHERE id = ?"
+        mesa = await obtener_uno(consulta, (mesa_id,))
+        cache_mesas.guardar(mesa_id, mesa, generacion)
     if not mesa:
         raise MesaNoExisteError("No existe una mesa con este id")
     return mesa
 
-def crear_mesa(mesa: MesaCreate):
+async def crear_mesa(mesa: MesaCreate):
     """Crea una mesa si el número no existe."""
     # 1. Comprobar si ya existe numero_mesa
     consulta = "SELECT * FROM mesas WHERE numero = ?"
-    existente = obtener_uno(consulta, (mesa.numero,))
+    existente = await obtener_uno(consulta, (mesa.numero,))
 
     if existente:
         raise MesaYaExisteError("Ya existe una mesa con este numero de mesa")
@@ -33,21 +60,29 @@ def crear_mesa(mesa: MesaCreate):
     INSERT INTO mesas (numero, capacidad, ubicacion, activa)
     VALUES (?, ?, ?, ?)
     """
-    ejecutar_consulta(insert, (
+    await ejecutar_consulta(insert, (
         mesa.numero,
         mesa.capacidad,
         mesa.ubicacion,
         mesa.activa
     ))
 
-    # 3. Devolver mesa creada
-    return obtener_uno("SELECT * FROM mesas WHERE numero = ?", (mesa.numero,))
+    # 3. Devolver mesa creada (y registrarla en el índice de disponibilidad)
+    nueva = await obtener_uno("SELECT * FROM mesas WHERE numero = ?", (mesa.numero,))
+    await ejecutar_en_db(indice_reservas.registrar_mesa, nueva)
+    if nueva:
+        cache_mesas.invalidar(nueva["id"])
+    versiones.tocar("mesas")
+    centro_eventos.publicar("mesa_creada", nueva)
+    # Una mesa nueva puede dar sitio a quien está en la lista de espera
+    await ejecutar_en_db(lista_espera.ofrecer_mesa, nueva)
+    return nueva
 
-def actualizar_mesa(mesa_id: int, datos_actualizados: MesaCreate):
+async def actualizar_mesa(mesa_id: int, datos_actualizados: MesaCreate):
     """Actualiza los datos de una mesa."""
     # 1. Comprobar si existe id
     consulta = "SELECT * FROM mesas WHERE id = ?"
-    mesa = obtener_uno(consulta, (mesa_id,))
+    mesa = await obtener_uno(consulta, (mesa_id,))
     if not mesa:
         raise MesaNoExisteError("No existe una mesa con este id")
 
@@ -57,7 +92,7 @@ def actualizar_mesa(mesa_id: int, datos_actualizados: MesaCreate):
     SET numero = ?, capacidad = ?, ubicacion = ?, activa = ?
     WHERE id = ?
     """
-    ejecutar_consulta(update, (
+    await ejecutar_consulta(update, (
         datos_actualizados.numero,
         datos_actualizados.capacidad,
         datos_actualizados.ubicacion,
@@ -65,16 +100,23 @@ def actualizar_mesa(mesa_id: int, datos_actualizados: MesaCreate):
         mesa_id
     ))
 
-    # 3. Devolver mesa actualizada
-    return obtener_uno("SELECT * FROM mesas WHERE id = ?", (mesa_id,))
+    # 3. Devolver mesa actualizada (y actualizarla en el índice de disponibilidad)
+    actualizada = await obtener_uno("SELECT * FROM mesas WHERE id = ?", (mesa_id,))
+    await ejecutar_en_db(indice_reservas.registrar_mesa, actualizada)
+    cache_mesas.invalidar(mesa_id)
+    versiones.tocar("mesas")
+    centro_eventos.publicar("mesa_actualizada", actualizada)
+    # Si la mesa se ha activado, ampliado o cambiado de ubicación, se ofrece a la lista de espera
+    await ejecutar_en_db(lista_espera.ofrecer_mesa, actualizada)
+    return actualizada
 
 
-def eliminar_mesa(mesa_id: int):
+async def eliminar_mesa(mesa_id: int):
     """Elimina una mesa si no tiene reservas futuras."""
     
     #1. comprobar si existe id
     consulta = "SELECT * FROM mesas WHERE id = ?"
-    mesa = obtener_uno(consulta,(mesa_id))
+    mesa = await obtener_uno(consulta, (mesa_id,))
     if not mesa:
         raise MesaNoExisteError("No existe ninguna mesa con este id")
     
@@ -84,21 +126,44 @@ def eliminar_mesa(mesa_id: int):
     WHERE cliente_id = ? AND estado IN ('pendiente', 'confirmada')
     """
 
-    reservas_activas = ejecutar_consulta(consulta_reservas, (mesa_id,))
+    reservas_activas = await ejecutar_consulta(consulta_reservas, (mesa_id,))
     if reservas_activas:
         return "No se puede eliminar la mesa porque tiene reservas futuras"
     # 3. Eliminar mesa
     delete = "DELETE FROM mesas WHERE id = ?"
-    ejecutar_consulta(delete, (mesa_id,))
+    await ejecutar_consulta(delete, (mesa_id,))
+    await ejecutar_en_db(indice_reservas.quitar_mesa, mesa_id)
+    cache_mesas.invalidar(mesa_id)
+    versiones.tocar("mesas")
+    centro_eventos.publicar("mesa_eliminada", {"id": mesa_id})
     return "Mesa eliminada correctamente"
 
-def obtener_mesa_disponible(numero: int, fecha_hora: str):
-    """Busca una mesa disponible por número y fecha."""
-    consulta = """
-    SELECT * FROM mesas
-    WHERE numero = ? AND id NOT IN (
-        SELECT mesa_id FROM reservas
-        WHERE fecha_hora = ? AND estado IN ('pendiente', 'confirmada')
-    )
+# Busca mesas libres con el índice en memoria, sin consultar SQLite. El índice se usa desde los
+# hilos de base de datos, como en reserva_service: su bloqueo puede estar tomado durante toda una
+# transacción de escritura y no debe esperarse en el bucle de eventos
+async def obtener_mesa_disponible(fecha_inicio: str, fecha_fin: str, capacidad: int, ubicacion: Optional[str] = None):
+    """Devuelve las mesas activas con capacidad suficiente que están libres entre fecha_inicio y fecha_fin."""
+    return await ejecutar_en_db(indice_reservas.mesas_libres, fecha_inicio, fecha_fin, capacidad, ubicacion)
+
+# Disponibilidad de un día con la rejilla de franjas de 15 minutos del índice en memoria
+async def obtener_disponibilidad(fecha: date, desde: Optional[time] = None, hasta: Optional[time] = None, duracion_minutos: int = 120,
+                                 capacidad: int = 1, ubicacion: Optional[str] = None):
+    """
+    Devuelve las mesas en las que cabe una reserva de `duracion_minutos` entre `desde` y `hasta`
+    (por defecto todo el día), con las horas de inicio posibles cada 15 minutos.
+    Los límites se ajustan a las franjas: `desde` se redondea hacia arriba y `hasta` hacia abajo.
     """
-    return obtener_uno(consulta, (numero, fecha_hora))
+    franja_desde = 0 if desde is None else -(-(desde.hour * 60 + desde.minute) // MINUTOS_FRANJA)
+    franja_hasta = FRANJAS_DIA if hasta is None else (hasta.hour * 60 + hasta.minute) // MINUTOS_FRANJA
+    franjas_duracion = -(-duracion_minutos // MINUTOS_FRANJA)
+    # En un hilo de base de datos: toma el bloqueo del índice y un día sin consultar aún construye su rejilla
+    mesas = await ejecutar_en_db(indice_reservas.disponibilidad, fecha, franja_desde, franja_hasta, franjas_duracion, capacidad, ubicacion)
+    return {
+        "fecha": fecha.isoformat(),
+        "desde": hora_franja(franja_desde),
+        "hasta": hora_franja(franja_hasta),
+        "duracion_minutos": franjas_duracion * MINUTOS_FRANJA,
+        "capacidad": capacidad,
+        "ubicacion": ubicacion,
+        "mesas": mesas,
+    }
@@ -1,58 +1,176 @@
 """Servicios de reservas."""
 
-from app.database import ejecutar_consulta, obtener_uno, obtener_todos
-from app.models.reserva import ReservaCreate, ReservaUpdate
+import csv
+import io
+import json
+from bisect import bisect_left
+
+from app.archivo import ESTADOS_ARCHIVABLES, TABLA_ARCHIVO, origen_reservas
+from app.database import formatear_fecha, iterar_lotes, obtener_uno, transaccion, rango_dias
+from app.database_async import ejecutar_en_db, obtener_todos
+from app.cache import cache_clientes, cache_mesas
+from app.coherencia import coherencia
+from app.escritor import escritor
+from app.eventos import centro_eventos
+from app.indice_reservas import ESTADOS_ACTIVOS, indice_reservas
+from app.lista_espera import lista_espera
+from app.versiones import versiones
+from app.models.reserva import ReservaAutoCreate, ReservaCreate, ReservaUpdate
 from app.exceptions.custom_exceptions import (
     ReservaSolapadaError,
     CapacidadExcedidaError,
     MesaNoExisteError,
     ClienteNoEncontradoError,
+    MesaNoDisponibleError,
 )
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Union
 
-# Funciones para manejar reservas: crear, actualizar, cancelar, confirmar llegada, marcar como completada, obtener reservas por filtros o por id
-def obtener_reservas(fecha: Optional[str] = None, cliente_id: Optional[int] = None, mesa_id: Optional[int] = None, estado: Optional[str] = None):
-    """Lista reservas con filtros opcionales."""
-    consulta = """
-        SELECT id, cliente_id, mesa_id,
-            fecha_hora_inicio AS fecha_inicio,
-            fecha_hora_fin AS fecha_fin,
-            num_comensales AS numero_comensales,
-            estado, notas, fecha_creacion
-        FROM reservas
-        WHERE 1=1
-        """
-    parametros = []
+# Columnas que se pueden pedir en la proyección de campos (nombre en la API -> expresión SQL)
+COLUMNAS_RESERVA = {
+    "id": "id",
+    "cliente_id": "cliente_id",
+    "mesa_id": "mesa_id",
+    "fecha_inicio": "fecha_hora_inicio AS fecha_inicio",
+    "fecha_fin": "fecha_hora_fin AS fecha_fin",
+    "numero_comensales": "num_comensales AS numero_comensales",
+    "estado": "estado",
+    "notas": "notas",
+    "fecha_creacion": "fecha_creacion",
+}
 
+# Condiciones WHERE de los filtros de reservas (compartidas por el listado y la exportación)
+def _filtros_reservas(fecha: Optional[str] = None, cliente_id: Optional[int] = None, mesa_id: Optional[int] = None,
+                      estado: Optional[str] = None) -> tuple[str, list]:
+    """Devuelve la condición SQL y sus parámetros para los filtros indicados."""
+    condiciones = "1=1"
+    parametros = []
     if fecha:
-        consulta += " AND DATE(fecha_hora_inicio) = DATE(?)"
-        parametros.append(fecha)
+        # Rango [inicio del día, inicio del día siguiente) para que se use idx_reservas_fecha
+        condiciones += " AND fecha_hora_inicio >= ? AND fecha_hora_inicio < ?"
+        parametros.extend(rango_dias(fecha))
     if cliente_id:
-        consulta += " AND cliente_id = ?"
+        condiciones += " AND cliente_id = ?"
         parametros.append(cliente_id)
     if mesa_id:
-        consulta += " AND mesa_id = ?"
+        condiciones += " AND mesa_id = ?"
         parametros.append(mesa_id)
     if estado:
-        consulta += " AND estado = ?"
+        condiciones += " AND estado = ?"
         parametros.append(estado)
+    return condiciones, parametros
 
-    return obtener_todos(consulta, tuple(parametros))
+# Tabla de la que se leen los listados y la exportación: la vista con todo el historial si el archivo
+# tiene reservas que pueden cumplir los filtros, y si no la tabla viva (lo habitual con un filtro de fecha reciente)
+async def _origen_listado(fecha: Optional[str], estado: Optional[str] = None) -> str:
+    """Devuelve "reservas" o la vista con el historial completo según los filtros de fecha y estado."""
+    if estado and estado not in ESTADOS_ARCHIVABLES:
+        # Las reservas pendientes y confirmadas nunca se archivan
+        return "reservas"
+    return await ejecutar_en_db(origen_reservas, rango_dias(fecha)[0] if fecha else None)
 
-# Función para obtener una reserva por su id
-def obtener_reserva_por_id(reserva_id: int):
-    """Obtiene una reserva por su id."""
-    consulta = """
-        SELECT id, cliente_id, mesa_id,
-            fecha_hora_inicio AS fecha_inicio,
-            fecha_hora_fin AS fecha_fin,
-            num_comensales AS numero_comensales,
-            estado, notas, fecha_creacion
-        FROM reservas
-        WHERE id = ?
+# Consulta de reservas ordenada por (fecha_hora_inicio, id) sobre la tabla viva o, si hace falta, también sobre el archivo
+def _consulta_ordenada(columnas: str, condiciones: str, parametros: list, origen: str) -> tuple[str, list]:
+    """
+    Con el historial no se lee la vista: ordenar su UNION ALL necesitaría un B-tree temporal con
+    todas las filas. Con un SELECT compuesto y su ORDER BY, SQLite mezcla las dos tablas, cada una
+    recorrida ya en orden por su índice, y se detiene al llegar al LIMIT.
+    """
+    if origen == "reservas":
+        return f"SELECT {columnas} FROM reservas WHERE {condiciones} ORDER BY fecha_hora_inicio, id", parametros
+    consulta = f"""
+        SELECT {columnas} FROM reservas WHERE {condiciones}
+        UNION ALL
+        SELECT {columnas} FROM {TABLA_ARCHIVO} WHERE {condiciones}
+        ORDER BY fecha_inicio, id
         """
-    return obtener_uno(consulta, (reserva_id,))
+    return consulta, parametros * 2
+
+# Funciones para manejar reservas: crear, actualizar, cancelar, confirmar llegada, marcar como completada, obtener reservas por filtros o por id
+async def obtener_reservas(fecha: Optional[str] = None, cliente_id: Optional[int] = None, mesa_id: Optional[int] = None, estado: Optional[str] = None,
+                     limite: Optional[int] = None, despues_de: Optional[tuple[str, int]] = None, campos: Optional[list[str]] = None):
+    """
+    Lista reservas con filtros opcionales, ordenadas por (fecha_hora_inicio, id).
+    Con `limite` y `despues_de` = (fecha_inicio, id) de la última fila se pagina por cursor.
+    Los índices compuestos (cliente_id, fecha), (mesa_id, fecha) y (estado, fecha) sirven este orden.
+    Las reservas archivadas también se listan (ver `_origen_listado`).
+    """
+    # id y fecha_inicio siempre se seleccionan porque forman el cursor
+    nombres = ["id", "fecha_inicio"] + [c for c in (campos or COLUMNAS_RESERVA) if c in COLUMNAS_RESERVA and c not in ("id", "fecha_inicio")]
+    condiciones, parametros = _filtros_reservas(fecha, cliente_id, mesa_id, estado)
+    if despues_de is not None:
+        condiciones += " AND (fecha_hora_inicio, id) > (?, ?)"
+        parametros.extend(despues_de)
+    columnas = ", ".join(COLUMNAS_RESERVA[nombre] for nombre in nombres)
+    consulta, parametros = _consulta_ordenada(columnas, condiciones, parametros, await _origen_listado(fecha, estado))
+    if limite is not None:
+        consulta += " LIMIT ?"
+        parametros.append(limite)
+
+    return await obtener_todos(consulta, tuple(parametros))
+
+# Exportación de reservas en NDJSON o CSV. Las filas se leen por lotes con fetchmany y se
+# escriben según llegan, sin pasar por ReservaResponse, así la memoria no crece con el resultado
+FORMATOS_EXPORTACION = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+FECHAS_RESERVA = ("fecha_inicio", "fecha_fin", "fecha_creacion")
+TAMANO_LOTE_EXPORTACION = 1000
+
+def _serializar_lote(lote, formato: str) -> str:
+    """Convierte un lote de filas en líneas NDJSON o CSV (las fechas en ISO 8601, como en la API)."""
+    filas = []
+    for fila in lote:
+        fila = dict(fila)
+        for nombre in FECHAS_RESERVA:
+            if fila[nombre]:
+                fila[nombre] = fila[nombre].replace(" ", "T", 1)
+        filas.append(fila)
+    if formato == "ndjson":
+        return "".join(json.dumps(fila, ensure_ascii=False) + "\n" for fila in filas)
+    salida = io.StringIO()
+    csv.writer(salida).writerows(fila.values() for fila in filas)
+    return salida.getvalue()
+
+async def exportar_reservas(formato: str = "ndjson", fecha: Optional[str] = None, cliente_id: Optional[int] = None,
+                            mesa_id: Optional[int] = None, estado: Optional[str] = None):
+    """Generador asíncrono con el contenido de la exportación, por trozos."""
+    condiciones, parametros = _filtros_reservas(fecha, cliente_id, mesa_id, estado)
+    origen = await _origen_listado(fecha, estado)
+    consulta, parametros = _consulta_ordenada(", ".join(COLUMNAS_RESERVA.values()), condiciones, parametros, origen)
+    if formato == "csv":
+        yield ",".join(COLUMNAS_RESERVA) + "\r\n"
+    # Cada lote se pide en un hilo de base de datos; la conexión sigue prestada entre lotes
+    lotes = iterar_lotes(consulta, tuple(parametros), TAMANO_LOTE_EXPORTACION)
+    try:
+        while True:
+            lote = await ejecutar_en_db(next, lotes, None)
+            if lote is None:
+                break
+            yield _serializar_lote(lote, formato)
+    finally:
+        await ejecutar_en_db(lotes.close)
+
+# Columnas de una reserva con los nombres del modelo ReservaResponse
+COLUMNAS_RESPUESTA = """
+    id, cliente_id, mesa_id,
+    fecha_hora_inicio AS fecha_inicio,
+    fecha_hora_fin AS fecha_fin,
+    num_comensales AS numero_comensales,
+    estado, notas, fecha_creacion
+"""
+
+# Función para obtener una reserva por su id (versión síncrona, para usar dentro de una transacción)
+def _obtener_reserva(reserva_id: int, conexion=None):
+    """Obtiene una reserva por su id."""
+    consulta = f"SELECT {COLUMNAS_RESPUESTA} FROM reservas WHERE id = ?"
+    return obtener_uno(consulta, (reserva_id,), conexion)
+
+# Función para obtener una reserva por su id (si ya no está en la tabla viva, se busca en el archivo)
+async def obtener_reserva_por_id(reserva_id: int):
+    """Obtiene una reserva por su id."""
+    reserva = await ejecutar_en_db(_obtener_reserva, reserva_id)
+    if reserva is None:
+        reserva = await ejecutar_en_db(obtener_uno, f"SELECT {COLUMNAS_RESPUESTA} FROM {TABLA_ARCHIVO} WHERE id = ?", (reserva_id,))
+    return reserva
 
 # Función para crear una nueva reserva, con validaciones de cliente, mesa, capacidad y solapamiento de horarios
 def _asegurar_datetime(valor):
@@ -61,19 +179,19 @@ def _asegurar_datetime(valor):
         return datetime.fromisoformat(valor)
     return valor
 
-# Función para validar que el cliente existe
-def _validar_cliente(cliente_id: int):
+# Función para validar que el cliente existe (se consulta primero la caché de clientes)
+def _validar_cliente(cliente_id: int, conexion=None):
     """Valida que el cliente exista."""
     consulta_cliente = "SELECT * FROM clientes WHERE id = ?"
-    cliente = obtener_uno(consulta_cliente, (cliente_id,))
+    cliente = cache_clientes.obtener_o_cargar(cliente_id, lambda: obtener_uno(consulta_cliente, (cliente_id,), conexion))
     if not cliente:
         raise ClienteNoEncontradoError("No existe un cliente con ese id")
 
-# Función para validar que la mesa existe y está activa
-def _validar_mesa_activa(mesa_id: int):
+# Función para validar que la mesa existe y está activa (se consulta primero la caché de mesas)
+def _validar_mesa_activa(mesa_id: int, conexion=None):
     """Valida que la mesa exista y esté activa."""
     consulta_mesa = "SELECT * FROM mesas WHERE id = ?"
-    mesa = obtener_uno(consulta_mesa, (mesa_id,))
+    mesa = cache_mesas.obtener_o_cargar(mesa_id, lambda: obtener_uno(consulta_mesa, (mesa_id,), conexion))
     if not mesa:
         raise MesaNoExisteError("No existe una mesa con esa información")
     mesa_activa = mesa["activa"] if isinstance(mesa, dict) else mesa[4]
@@ -82,147 +200,372 @@ def _validar_mesa_activa(mesa_id: int):
     return mesa
 
 # Función para validar que no hay reservas solapadas para la misma mesa en el mismo horario
+# Se consulta el índice en memoria (búsqueda binaria por mesa) en lugar de la tabla reservas
 def _validar_reserva_solapada(mesa_id: int, fecha_inicio: datetime, fecha_fin: datetime, reserva_id: Optional[int] = None):
     """Valida que no haya solapamiento de reservas."""
-    consulta_reservas = """
-        SELECT * FROM reservas
-        WHERE mesa_id = ?
-            AND estado IN ('pendiente', 'confirmada')
-            AND fecha_hora_inicio < ?
-            AND fecha_hora_fin > ?
-        """
-    parametros = [mesa_id, fecha_fin, fecha_inicio]
-    if reserva_id is not None:
-        consulta_reservas += " AND id != ?"
-        parametros.append(reserva_id)
-    reservas_existentes = obtener_todos(consulta_reservas, tuple(parametros))
-    if reservas_existentes:
+    if indice_reservas.hay_solapamiento(mesa_id, fecha_inicio, fecha_fin, excluir_id=reserva_id):
         raise ReservaSolapadaError("Ya existe una reserva para esa mesa en ese horario")
 
 # Función para crear una nueva reserva, con validaciones de cliente, mesa, capacidad y solapamiento de horarios
-def crear_reserva(reserva: ReservaCreate):
-    """Crea una reserva con validaciones básicas."""
-    _validar_cliente(reserva.cliente_id)
-    mesa = _validar_mesa_activa(reserva.mesa_id)
-
-    capacidad_mesa = mesa["capacidad"] if isinstance(mesa, dict) else mesa[2]
-    if reserva.numero_comensales > capacidad_mesa:
-        raise CapacidadExcedidaError("El número de comensales excede la capacidad de la mesa")
-
+# Todo ocurre en una sola transacción BEGIN IMMEDIATE: dos reservas simultáneas para la misma mesa
+# no pueden pasar las dos la comprobación de solapamiento. El bloqueo de escritura del índice se
+# mantiene hasta registrar la nueva reserva, para que la siguiente validación ya la vea.
+# Con varios procesos, el índice se pone al día con los cambios de los demás dentro de la transacción
+def _crear_reserva(reserva: ReservaCreate):
+    """Crea una reserva con validaciones básicas (síncrono, se ejecuta en un hilo de base de datos)."""
     fecha_inicio = _asegurar_datetime(reserva.fecha_inicio)
     if fecha_inicio <= datetime.now(fecha_inicio.tzinfo):
         raise ValueError("La fecha de inicio debe ser futura")
 
     fecha_fin = fecha_inicio + timedelta(hours=2)
-    _validar_reserva_solapada(reserva.mesa_id, fecha_inicio, fecha_fin)
-
     fecha_creacion = datetime.now(fecha_inicio.tzinfo)
 
-    insert = """
-    INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, notas, fecha_creacion)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    ejecutar_consulta(insert, (
-        reserva.cliente_id,
-        reserva.mesa_id,
-        fecha_inicio,
-        fecha_fin,
-        reserva.numero_comensales,
-        reserva.estado,
-        reserva.notas,
-        fecha_creacion
-    ))
-
-    return obtener_uno(
-         """
-         SELECT id, cliente_id, mesa_id,
-             fecha_hora_inicio AS fecha_inicio,
-             fecha_hora_fin AS fecha_fin,
-             num_comensales AS numero_comensales,
-             estado, notas, fecha_creacion
-         FROM reservas
-         WHERE cliente_id = ? AND mesa_id = ? AND fecha_hora_inicio = ?
-         """,
-        (reserva.cliente_id, reserva.mesa_id, fecha_inicio)
-    )
-
-# Función para actualizar una reserva existente, con validaciones de cliente, mesa, capacidad y solapamiento de horarios    
-def actualizar_reserva(reserva_id: int, datos_actualizados: ReservaUpdate):
-    """Actualiza una reserva con validaciones básicas."""
-    reserva_actual = obtener_reserva_por_id(reserva_id)
-    if not reserva_actual:
-        return None
+    with indice_reservas.escritura():
+        with transaccion() as conexion:
+            coherencia.sincronizar(conexion)
+            _validar_cliente(reserva.cliente_id, conexion)
+            mesa = _validar_mesa_activa(reserva.mesa_id, conexion)
 
-    cliente_id = datos_actualizados.cliente_id if datos_actualizados.cliente_id is not None else reserva_actual["cliente_id"]
-    mesa_id = datos_actualizados.mesa_id if datos_actualizados.mesa_id is not None else reserva_actual["mesa_id"]
-    fecha_inicio = datos_actualizados.fecha_inicio if datos_actualizados.fecha_inicio is not None else reserva_actual["fecha_inicio"]
-    numero_comensales = datos_actualizados.numero_comensales if datos_actualizados.numero_comensales is not None else reserva_actual["numero_comensales"]
-    estado = datos_actualizados.estado if datos_actualizados.estado is not None else reserva_actual["estado"]
-    notas = datos_actualizados.notas if datos_actualizados.notas is not None else reserva_actual["notas"]
+            capacidad_mesa = mesa["capacidad"] if isinstance(mesa, dict) else mesa[2]
+            if reserva.numero_comensales > capacidad_mesa:
+                raise CapacidadExcedidaError("El número de comensales excede la capacidad de la mesa")
 
-    _validar_cliente(cliente_id)
-    mesa = _validar_mesa_activa(mesa_id)
+            _validar_reserva_solapada(reserva.mesa_id, fecha_inicio, fecha_fin)
 
-    fecha_inicio = _asegurar_datetime(fecha_inicio)
-    if fecha_inicio <= datetime.now(fecha_inicio.tzinfo):
-        raise ValueError("La fecha de inicio debe ser futura")
+            insert = f"""
+            INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, notas, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING {COLUMNAS_RESPUESTA}
+            """
+            nueva = obtener_uno(insert, (
+                reserva.cliente_id,
+                reserva.mesa_id,
+                fecha_inicio,
+                fecha_fin,
+                reserva.numero_comensales,
+                reserva.estado,
+                reserva.notas,
+                fecha_creacion
+            ), conexion)
+        indice_reservas.registrar_reserva(nueva)
+        versiones.tocar("reservas")
+        centro_eventos.publicar_reserva(nueva, "reserva_creada")
+    return nueva
 
-    capacidad_mesa = mesa["capacidad"] if isinstance(mesa, dict) else mesa[2]
-    if numero_comensales > capacidad_mesa:
-        raise CapacidadExcedidaError("El número de comensales excede la capacidad de la mesa")
+async def crear_reserva(reserva: ReservaCreate):
+    """Crea una reserva con validaciones básicas."""
+    return await ejecutar_en_db(_crear_reserva, reserva)
 
+# Función para crear una reserva eligiendo la mesa: la activa más pequeña en la que caben los comensales
+# y que está libre. La elección y la inserción ocurren con el bloqueo de escritura del índice tomado,
+# así ninguna otra reserva del proceso puede ocupar la mesa elegida entre medias. Otro proceso sí puede:
+# _crear_reserva lo detecta al validar (con el índice ya al día) y se elige otra mesa
+def _crear_reserva_auto(reserva: ReservaAutoCreate):
+    """Crea una reserva en la mejor mesa libre (síncrono, se ejecuta en un hilo de base de datos)."""
+    fecha_inicio = _asegurar_datetime(reserva.fecha_inicio)
     fecha_fin = fecha_inicio + timedelta(hours=2)
-    _validar_reserva_solapada(mesa_id, fecha_inicio, fecha_fin, reserva_id=reserva_id)
+    with indice_reservas.escritura():
+        coherencia.sincronizar()
+        while True:
+            mesa = indice_reservas.mejor_mesa_libre(fecha_inicio, fecha_fin, reserva.numero_comensales, reserva.ubicacion)
+            if mesa is None:
+                raise MesaNoDisponibleError("No hay ninguna mesa libre para ese número de comensales en ese horario")
+            try:
+                return _crear_reserva(ReservaCreate(
+                    cliente_id=reserva.cliente_id,
+                    mesa_id=mesa["id"],
+                    fecha_inicio=fecha_inicio,
+                    numero_comensales=reserva.numero_comensales,
+                    estado=reserva.estado,
+                    notas=reserva.notas,
+                ))
+            except ReservaSolapadaError:
+                continue
 
-    update = """
-    UPDATE reservas
-    SET cliente_id = ?, mesa_id = ?, fecha_hora_inicio = ?, fecha_hora_fin = ?, num_comensales = ?, estado = ?, notas = ?
-    WHERE id = ?
-    """
-    ejecutar_consulta(update, (
-        cliente_id,
-        mesa_id,
-        fecha_inicio,
-        fecha_fin,
-        numero_comensales,
-        estado,
-        notas,
-        reserva_id
-    ))
-
-    return obtener_reserva_por_id(reserva_id)
+async def crear_reserva_auto(reserva: ReservaAutoCreate):
+    """Crea una reserva en la mesa libre más pequeña en la que caben los comensales."""
+    return await ejecutar_en_db(_crear_reserva_auto, reserva)
+
+# Función para actualizar una reserva existente, con validaciones de cliente, mesa, capacidad y solapamiento de horarios
+def _actualizar_reserva(reserva_id: int, datos_actualizados: ReservaUpdate):
+    """Actualiza una reserva con validaciones básicas (síncrono, se ejecuta en un hilo de base de datos)."""
+    with indice_reservas.escritura():
+        with transaccion() as conexion:
+            coherencia.sincronizar(conexion)
+            reserva_actual = _obtener_reserva(reserva_id, conexion)
+            if not reserva_actual:
+                return None
+
+            cliente_id = datos_actualizados.cliente_id if datos_actualizados.cliente_id is not None else reserva_actual["cliente_id"]
+            mesa_id = datos_actualizados.mesa_id if datos_actualizados.mesa_id is not None else reserva_actual["mesa_id"]
+            fecha_inicio = datos_actualizados.fecha_inicio if datos_actualizados.fecha_inicio is not None else reserva_actual["fecha_inicio"]
+            numero_comensales = datos_actualizados.numero_comensales if datos_actualizados.numero_comensales is not None else reserva_actual["numero_comensales"]
+            estado = datos_actualizados.estado if datos_actualizados.estado is not None else reserva_actual["estado"]
+            notas = datos_actualizados.notas if datos_actualizados.notas is not None else reserva_actual["notas"]
+
+            _validar_cliente(cliente_id, conexion)
+            mesa = _validar_mesa_activa(mesa_id, conexion)
+
+            fecha_inicio = _asegurar_datetime(fecha_inicio)
+            if fecha_inicio <= datetime.now(fecha_inicio.tzinfo):
+                raise ValueError("La fecha de inicio debe ser futura")
+
+            capacidad_mesa = mesa["capacidad"] if isinstance(mesa, dict) else mesa[2]
+            if numero_comensales > capacidad_mesa:
+                raise CapacidadExcedidaError("El número de comensales excede la capacidad de la mesa")
+
+            fecha_fin = fecha_inicio + timedelta(hours=2)
+            _validar_reserva_solapada(mesa_id, fecha_inicio, fecha_fin, reserva_id=reserva_id)
+
+            update = f"""
+            UPDATE reservas
+            SET cliente_id = ?, mesa_id = ?, fecha_hora_inicio = ?, fecha_hora_fin = ?, num_comensales = ?, estado = ?, notas = ?
+            WHERE id = ?
+            RETURNING {COLUMNAS_RESPUESTA}
+            """
+            actualizada = obtener_uno(update, (
+                cliente_id,
+                mesa_id,
+                fecha_inicio,
+                fecha_fin,
+                numero_comensales,
+                estado,
+                notas,
+                reserva_id
+            ), conexion)
+        indice_reservas.registrar_reserva(actualizada)
+        if actualizada:
+            versiones.tocar("reservas")
+            centro_eventos.publicar_reserva(actualizada, "reserva_actualizada")
+    # Si la reserva deja su mesa y horario anteriores (se mueve o se cancela), el hueco se ofrece a la lista de espera
+    if actualizada and reserva_actual["estado"] in ESTADOS_ACTIVOS and (
+        actualizada["estado"] not in ESTADOS_ACTIVOS
+        or (actualizada["mesa_id"], actualizada["fecha_inicio"]) != (reserva_actual["mesa_id"], reserva_actual["fecha_inicio"])
+    ):
+        lista_espera.liberar_hueco(reserva_actual["mesa_id"], reserva_actual["fecha_inicio"], reserva_actual["fecha_fin"])
+    return actualizada
+
+async def actualizar_reserva(reserva_id: int, datos_actualizados: ReservaUpdate):
+    """Actualiza una reserva con validaciones básicas."""
+    return await ejecutar_en_db(_actualizar_reserva, reserva_id, datos_actualizados)
+
+# Cambia el estado de una reserva y devuelve la fila actualizada (None si no existe)
+def _actualizar_estado(reserva_id: int, estado: str, conexion=None):
+    """Ejecuta el UPDATE del estado (en la transacción de `conexion` si se pasa)."""
+    update = f"UPDATE reservas SET estado = ? WHERE id = ? RETURNING {COLUMNAS_RESPUESTA}"
+    return obtener_uno(update, (estado, reserva_id), conexion)
+
+def _registrar_estado(reserva: Optional[dict]):
+    """Lleva al índice en memoria, a las versiones y a los eventos un cambio de estado ya guardado."""
+    indice_reservas.registrar_reserva(reserva)
+    if reserva:
+        versiones.tocar("reservas")
+        centro_eventos.publicar_reserva(reserva)
+
+def _cambiar_estado(reserva_id: int, estado: str):
+    """Actualiza el estado de una reserva y el índice en memoria."""
+    with indice_reservas.escritura():
+        reserva = _actualizar_estado(reserva_id, estado)
+        _registrar_estado(reserva)
+    return reserva
+
+# Los cambios de estado van al escritor agrupado (app/escritor.py): cuando llegan muchos a la vez
+# (cambio de turno) se confirman juntos en una sola transacción en lugar de uno por uno.
+# Si la reserva deja libre la mesa (cancelada o completada), después se ofrece el hueco a la lista
+# de espera, fuera del lote para no alargarlo
+async def _cambiar_estado_agrupado(reserva_id: int, estado: str):
+    """Cambia el estado con el escritor agrupado, o directamente si está desactivado."""
+    if not escritor.activo:
+        reserva = await ejecutar_en_db(_cambiar_estado, reserva_id, estado)
+    else:
+        reserva = await escritor.ejecutar(lambda conexion: _actualizar_estado(reserva_id, estado, conexion), _registrar_estado)
+    if estado not in ESTADOS_ACTIVOS:
+        await ejecutar_en_db(lista_espera.ofrecer_hueco, reserva)
+    return reserva
 
 # Función para cancelar una reserva (cambia el estado a 'cancelada')
-def cancelar_reserva(reserva_id: int):
+async def cancelar_reserva(reserva_id: int):
     """Cancela una reserva cambiando su estado."""
-    update = """
-    UPDATE reservas
-    SET estado = 'cancelada'
-    WHERE id = ?
-    """
-    ejecutar_consulta(update, (reserva_id,))
-    return obtener_reserva_por_id(reserva_id)
+    return await _cambiar_estado_agrupado(reserva_id, "cancelada")
 
 # Función para confirmar la llegada del cliente (cambia el estado a 'confirmada')
-def confirmar_llegada_cliente_patch(reserva_id: int):
+async def confirmar_llegada_cliente_patch(reserva_id: int):
     """Confirma la llegada del cliente."""
-    update = """
-    UPDATE reservas
-    SET estado = 'confirmada'
-    WHERE id = ?
-    """
-    ejecutar_consulta(update, (reserva_id,))
-    return obtener_reserva_por_id(reserva_id)
+    return await _cambiar_estado_agrupado(reserva_id, "confirmada")
 
 # Función para marcar una reserva como completada (cambia el estado a 'completada')
-def marcar_reserva_como_completada_patch(reserva_id: int):
+async def marcar_reserva_como_completada_patch(reserva_id: int):
     """Marca la reserva como completada."""
-    update = """
-    UPDATE reservas
-    SET estado = 'completada'
-    WHERE id = ?
+    return await _cambiar_estado_agrupado(reserva_id, "completada")
+
+# Cierre automático de reservas vencidas (lo ejecuta periódicamente el planificador, app/planificador.py).
+# Las confirmadas que ya han terminado pasan a completadas y las pendientes cuyo inicio pasó hace más
+# de la tolerancia se cancelan como no presentadas. Cada lote es un UPDATE ... WHERE id IN (SELECT ...
+# LIMIT) que recorre idx_reservas_estado_fecha, en su propia transacción corta
+NOTA_NO_PRESENTADO = "No presentado"
+
+def _cerrar_lote(update: str, parametros: tuple) -> int:
+    """Ejecuta un lote del cierre y quita las reservas cerradas del índice; devuelve cuántas son."""
+    with indice_reservas.escritura():
+        with transaccion() as conexion:
+            cerradas = [dict(fila) for fila in conexion.execute(update, parametros).fetchall()]
+        for reserva in cerradas:
+            indice_reservas.registrar_reserva(reserva)
+            centro_eventos.publicar_reserva(reserva)
+        if cerradas:
+            versiones.tocar("reservas")
+    return len(cerradas)
+
+def cerrar_reservas_vencidas(ahora: Optional[datetime] = None, minutos_no_presentado: int = 30,
+                             tamano_lote: int = 500, lotes_maximos: int = 20) -> dict:
+    """
+    Completa las reservas confirmadas ya terminadas y cancela las pendientes no presentadas
+    (síncrono, se ejecuta en un hilo de base de datos).
+    Procesa como mucho `lotes_maximos` lotes de `tamano_lote` de cada tipo; lo que quede se
+    cierra en la siguiente ejecución. Devuelve cuántas reservas ha cerrado de cada tipo.
+    """
+    ahora = ahora or datetime.now()
+    limite_no_presentado = formatear_fecha(ahora - timedelta(minutes=minutos_no_presentado))
+    ahora = formatear_fecha(ahora)
+    completar = f"""
+        UPDATE reservas SET estado = 'completada'
+        WHERE id IN (
+            SELECT id FROM reservas
+            WHERE estado = 'confirmada' AND fecha_hora_inicio < ? AND fecha_hora_fin <= ?
+            ORDER BY fecha_hora_inicio LIMIT ?
+        )
+        RETURNING {COLUMNAS_RESPUESTA}
+        """
+    no_presentadas = f"""
+        UPDATE reservas
+        SET estado = 'cancelada',
+            notas = CASE WHEN notas IS NULL OR notas = '' THEN ? ELSE notas || ' | ' || ? END
+        WHERE id IN (
+            SELECT id FROM reservas
+            WHERE estado = 'pendiente' AND fecha_hora_inicio <= ?
+            ORDER BY fecha_hora_inicio LIMIT ?
+        )
+        RETURNING {COLUMNAS_RESPUESTA}
+        """
+    resultado = {"completadas": 0, "no_presentadas": 0, "lotes": 0}
+    for clave, update, parametros in (
+        ("completadas", completar, (ahora, ahora, tamano_lote)),
+        ("no_presentadas", no_presentadas, (NOTA_NO_PRESENTADO, NOTA_NO_PRESENTADO, limite_no_presentado, tamano_lote)),
+    ):
+        for _ in range(lotes_maximos):
+            cerradas = _cerrar_lote(update, parametros)
+            resultado[clave] += cerradas
+            resultado["lotes"] += 1
+            if cerradas < tamano_lote:
+                break
+    return resultado
+
+# Importación por lotes: todas las reservas del lote se validan con una consulta por tabla
+# (clientes y mesas con json_each), los solapamientos se comprueban contra el índice en memoria
+# y dentro del propio lote, y las aceptadas se insertan con executemany en una sola transacción
+MODOS_LOTE = ("todo", "parcial")
+
+def _ids_existentes(conexion, consulta: str, ids: set) -> dict:
+    """Ejecuta `consulta` con la lista de ids como un array JSON y devuelve las filas por id."""
+    filas = conexion.execute(consulta, (json.dumps(sorted(ids)),)).fetchall()
+    return {fila["id"]: dict(fila) for fila in filas}
+
+def _importar_reservas(items: list[Union[ReservaCreate, str]], modo: str = "todo"):
     """
-    ejecutar_consulta(update, (reserva_id,))
-    return obtener_reserva_por_id(reserva_id)
+    Valida e inserta un lote de reservas (síncrono, se ejecuta en un hilo de base de datos).
+    Cada elemento de `items` es una ReservaCreate o el motivo por el que no se pudo leer.
+    En modo "todo" solo se inserta si todas son válidas; en modo "parcial" se insertan las válidas.
+    Devuelve un resultado por elemento, en el mismo orden.
+    """
+    resultados = [{"indice": i, "aceptada": False, "motivo": None, "reserva": None} for i in range(len(items))]
+    for resultado, item in zip(resultados, items):
+        if isinstance(item, str):
+            resultado["motivo"] = item
+    validas = [(i, item) for i, item in enumerate(items) if not isinstance(item, str)]
+    fecha_creacion = datetime.now()
+
+    with indice_reservas.escritura():
+        with transaccion() as conexion:
+            coherencia.sincronizar(conexion)
+            clientes = _ids_existentes(
+                conexion, "SELECT id FROM clientes WHERE id IN (SELECT value FROM json_each(?))",
+                {reserva.cliente_id for _, reserva in validas},
+            )
+            mesas = _ids_existentes(
+                conexion, "SELECT id, capacidad, activa FROM mesas WHERE id IN (SELECT value FROM json_each(?))",
+                {reserva.mesa_id for _, reserva in validas},
+            )
+
+            # Intervalos ya aceptados en este lote por mesa, ordenados por inicio.
+            # No se solapan entre sí, así que basta con mirar el anterior y el siguiente
+            ocupadas = {}
+            filas = []
+            for i, reserva in validas:
+                fecha_inicio = formatear_fecha(reserva.fecha_inicio)
+                fecha_fin = formatear_fecha(_asegurar_datetime(reserva.fecha_inicio) + timedelta(hours=2))
+                mesa = mesas.get(reserva.mesa_id)
+                if reserva.cliente_id not in clientes:
+                    resultados[i]["motivo"] = "No existe un cliente con ese id"
+                elif not mesa:
+                    resultados[i]["motivo"] = "No existe una mesa con esa información"
+                elif not mesa["activa"]:
+                    resultados[i]["motivo"] = "La mesa no está activa"
+                elif reserva.numero_comensales > mesa["capacidad"]:
+                    resultados[i]["motivo"] = "El número de comensales excede la capacidad de la mesa"
+                elif indice_reservas.hay_solapamiento(reserva.mesa_id, fecha_inicio, fecha_fin):
+                    resultados[i]["motivo"] = "Ya existe una reserva para esa mesa en ese horario"
+                else:
+                    intervalos = ocupadas.setdefault(reserva.mesa_id, [])
+                    posicion = bisect_left(intervalos, (fecha_inicio, fecha_fin))
+                    if (posicion > 0 and intervalos[posicion - 1][1] > fecha_inicio) or \
+                            (posicion < len(intervalos) and intervalos[posicion][0] < fecha_fin):
+                        resultados[i]["motivo"] = "Se solapa con otra reserva del mismo lote"
+                        continue
+                    # Las reservas canceladas o completadas no ocupan la mesa
+                    if reserva.estado in ("pendiente", "confirmada"):
+                        intervalos.insert(posicion, (fecha_inicio, fecha_fin))
+                    filas.append((i, (
+                        reserva.cliente_id, reserva.mesa_id, fecha_inicio, fecha_fin,
+                        reserva.numero_comensales, reserva.estado, reserva.notas, fecha_creacion,
+                    )))
+
+            rechazadas = len(items) - len(filas)
+            if modo == "todo" and rechazadas:
+                for i, _ in filas:
+                    resultados[i]["motivo"] = "Lote no insertado: hay reservas rechazadas"
+                filas = []
+
+            if filas:
+                # Con BEGIN IMMEDIATE nadie más inserta a la vez, así que los ids nuevos
+                # son consecutivos a partir del último valor de sqlite_sequence
+                ultimo = conexion.execute("SELECT seq FROM sqlite_sequence WHERE name = 'reservas'").fetchone()
+                ultimo_id = ultimo[0] if ultimo else 0
+                conexion.executemany(
+                    """
+                    INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, notas, fecha_creacion)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [fila for _, fila in filas],
+                )
+                nuevas = conexion.execute(
+                    f"SELECT {COLUMNAS_RESPUESTA} FROM reservas WHERE id > ? ORDER BY id", (ultimo_id,)
+                ).fetchall()
+                for (i, _), nueva in zip(filas, nuevas):
+                    resultados[i].update(aceptada=True, reserva=dict(nueva))
+        for i, _ in filas:
+            indice_reservas.registrar_reserva(resultados[i]["reserva"])
+            centro_eventos.publicar_reserva(resultados[i]["reserva"], "reserva_creada")
+        if filas:
+            versiones.tocar("reservas")
+
+    return {
+        "modo": modo,
+        "total": len(items),
+        "insertadas": len(filas),
+        "rechazadas": len(items) - len(filas),
+        "resultados": resultados,
+    }
 
- 
\ No newline at end of file
+async def importar_reservas(items: list[Union[ReservaCreate, str]], modo: str = "todo"):
+    """Valida e inserta un lote de reservas."""
+    return await ejecutar_en_db(_importar_reservas, items, modo)
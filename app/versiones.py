@@ -0,0 +1,55 @@
+"""Versión de cambios por tabla, para las respuestas condicionales (ETag / Last-Modified)."""
+
+import secrets
+import threading
+import time
+
+# Tablas cuyas versiones se siguen
+TABLAS = ("mesas", "clientes", "reservas")
+
+
+class VersionesTablas:
+    """
+    Contador de cambios por tabla. Los servicios de app/services lo suben después de cada
+    escritura confirmada; las rutas de lectura construyen su ETag con las versiones de las
+    tablas de las que dependen, sin consultar SQLite.
+    Los contadores viven en memoria y empiezan en 0 en cada proceso, por eso el ETag lleva
+    además una marca aleatoria del proceso: una ETag de otro proceso (otro worker o antes de
+    reiniciar) nunca coincide por casualidad. Los cambios hechos fuera de este proceso (otro
+    worker o app.cli) solo suben las versiones con RESERVAS_MULTIPROCESO=1 (app/coherencia.py).
+    """
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.marca = secrets.token_hex(4)
+        inicio = time.time()
+        self._versiones = {tabla: 0 for tabla in TABLAS}
+        self._modificadas = {tabla: inicio for tabla in TABLAS}
+
+    def tocar(self, *tablas: str):
+        """Registra un cambio en las tablas indicadas."""
+        ahora = time.time()
+        with self._bloqueo:
+            for tabla in tablas:
+                self._versiones[tabla] += 1
+                self._modificadas[tabla] = ahora
+
+    def actual(self, tablas: tuple) -> tuple:
+        """Versiones actuales de las tablas indicadas (en el mismo orden)."""
+        return tuple(self._versiones[tabla] for tabla in tablas)
+
+    def ultima_modificacion(self, tablas: tuple) -> float:
+        """Momento (epoch) del último cambio en cualquiera de las tablas."""
+        return max(self._modificadas[tabla] for tabla in tablas)
+
+    def etag(self, version: tuple) -> str:
+        """ETag fuerte para unas versiones: la respuesta es la misma mientras no cambien."""
+        return f'"{self.marca}-{"-".join(str(numero) for numero in version)}"'
+
+    def metricas(self) -> dict:
+        with self._bloqueo:
+            return dict(self._versiones)
+
+
+# Versiones compartidas por todo el proceso
+versiones = VersionesTablas()
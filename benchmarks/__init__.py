@@ -0,0 +1 @@
+"""Benchmarks de la API de reservas."""
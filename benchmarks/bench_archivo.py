@@ -0,0 +1,86 @@
+"""
+Mide las consultas habituales de reservas antes y después de archivar el historial
+(app/archivo.py): listados de un cliente, por estado y del día, y un recorrido completo
+de la tabla viva. Comprueba además que las estadísticas no cambian al archivar.
+
+Uso: python -m benchmarks.bench_archivo [--escala pequena] [--dias 30] [--repeticiones 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from app import database, database_async
+from app.archivo import archivar_reservas
+from app.resumenes import verificar_resumenes
+from app.services import estadisticas_service, reserva_service
+from benchmarks.comun import resumir
+from benchmarks.generador import ESCALAS, generar_escala
+
+
+async def medir(consulta, repeticiones: int) -> float:
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        await consulta()
+        latencias.append(time.perf_counter() - inicio)
+    return resumir(latencias)["p50_ms"]
+
+
+async def medir_consultas(clientes: list[int], hoy: str, repeticiones: int) -> dict:
+    aleatorio = random.Random(3)
+    return {
+        "listado_cliente": await medir(
+            lambda: reserva_service.obtener_reservas(cliente_id=aleatorio.choice(clientes), limite=50), repeticiones
+        ),
+        "listado_pendientes": await medir(lambda: reserva_service.obtener_reservas(estado="pendiente", limite=50), repeticiones),
+        "listado_hoy": await medir(lambda: reserva_service.obtener_reservas(fecha=hoy), repeticiones),
+        "recorrido_tabla_viva": await medir(
+            lambda: database_async.obtener_uno("SELECT COUNT(*), SUM(num_comensales) FROM reservas"), max(1, repeticiones // 20)
+        ),
+    }
+
+
+def tamano() -> dict:
+    return database.obtener_uno(
+        "SELECT (SELECT COUNT(*) FROM reservas) AS reservas, (SELECT COUNT(*) FROM reservas_archivo) AS archivadas"
+    )
+
+
+async def principal(dias: int, repeticiones: int) -> dict:
+    clientes = [fila["id"] for fila in database.obtener_todos("SELECT id FROM clientes")]
+    hoy = date.today().isoformat()
+    resumen = await estadisticas_service.obtener_resumen_general()
+    antes = {"tablas": tamano(), "p50_ms": await medir_consultas(clientes, hoy, repeticiones)}
+
+    inicio = time.perf_counter()
+    archivado = await database_async.ejecutar_en_db(archivar_reservas, dias=dias, lotes_maximos=1_000_000)
+    segundos = time.perf_counter() - inicio
+    archivado["filas_s"] = round(archivado["archivadas"] / segundos) if segundos else None
+
+    despues = {"tablas": tamano(), "p50_ms": await medir_consultas(clientes, hoy, repeticiones)}
+    return {
+        "antes": antes,
+        "archivo": archivado,
+        "despues": despues,
+        "estadisticas_iguales": await estadisticas_service.obtener_resumen_general() == resumen,
+        "resumenes": verificar_resumenes()["consistente"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--dias", type=int, default=30, help="antigüedad a partir de la que se archiva")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_escala(os.path.join(directorio, "bench.db"), argumentos.escala)
+        print(json.dumps(asyncio.run(principal(argumentos.dias, argumentos.repeticiones)), indent=2))
+        database_async.cerrar_ejecutor()
+        database.cerrar_pool()
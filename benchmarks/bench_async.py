@@ -0,0 +1,119 @@
+"""
+Compara la latencia (p50/p99) y las peticiones por segundo del camino síncrono
+(rutas `def` sobre el pool de hilos de anyio) con el asíncrono (rutas `async def`
+sobre el ejecutor de base de datos).
+
+Uso: python -m benchmarks.bench_async [--peticiones 2000] [--concurrencia 64]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+
+from app import database, database_async
+from app.migraciones import aplicar_migraciones
+
+CONSULTA = """
+    SELECT id, cliente_id, mesa_id, fecha_hora_inicio, num_comensales, estado
+    FROM reservas
+    WHERE fecha_hora_inicio >= ? AND fecha_hora_inicio < ?
+    ORDER BY fecha_hora_inicio, id
+    LIMIT 50
+"""
+
+
+def preparar_base_datos(ruta: str, reservas: int = 20000):
+    """Crea una base de datos de prueba con mesas, clientes y reservas."""
+    database.configurar_pool(ruta=ruta)
+    aplicar_migraciones()
+    aleatorio = random.Random(42)
+    inicio = datetime(2025, 1, 1, 12)
+    with database.transaccion() as conexion:
+        conexion.executemany(
+            "INSERT INTO mesas (numero, capacidad, ubicacion) VALUES (?, ?, ?)",
+            [(n, aleatorio.choice((2, 4, 6, 8)), aleatorio.choice(("interior", "terraza", "privado"))) for n in range(1, 31)],
+        )
+        conexion.executemany(
+            "INSERT INTO clientes (nombre, email, telefono) VALUES (?, ?, ?)",
+            [(f"Cliente {n}", f"cliente{n}@example.com", f"6{n:08d}") for n in range(1, 501)],
+        )
+        filas = []
+        for _ in range(reservas):
+            fecha = inicio + timedelta(days=aleatorio.randrange(730), hours=aleatorio.randrange(10))
+            filas.append((aleatorio.randrange(1, 501), aleatorio.randrange(1, 31), fecha, fecha + timedelta(hours=2), 2, "completada"))
+        conexion.executemany(
+            """
+            INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            filas,
+        )
+
+
+def crear_app() -> FastAPI:
+    """App mínima con la misma consulta servida por los dos caminos."""
+    app = FastAPI()
+
+    @app.get("/sync")
+    def ruta_sync(dia: int = 0):
+        return database.obtener_todos(CONSULTA, database.rango_dias(datetime(2025, 1, 1) + timedelta(days=dia)))
+
+    @app.get("/async")
+    async def ruta_async(dia: int = 0):
+        return await database_async.obtener_todos(CONSULTA, database.rango_dias(datetime(2025, 1, 1) + timedelta(days=dia)))
+
+    return app
+
+
+async def medir(cliente: httpx.AsyncClient, ruta: str, peticiones: int, concurrencia: int) -> dict:
+    """Lanza `peticiones` peticiones con `concurrencia` clientes simultáneos."""
+    latencias = []
+    pendientes = iter(range(peticiones))
+
+    async def trabajador():
+        for numero in pendientes:
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(ruta, params={"dia": numero % 730})
+            respuesta.raise_for_status()
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "ruta": ruta,
+        "peticiones": peticiones,
+        "concurrencia": concurrencia,
+        "rps": round(peticiones / total, 1),
+        "p50_ms": round(statistics.median(latencias) * 1000, 3),
+        "p99_ms": round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 3),
+    }
+
+
+async def principal(peticiones: int, concurrencia: int):
+    transporte = httpx.ASGITransport(app=crear_app())
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        for ruta in ("/sync", "/async"):
+            await medir(cliente, ruta, min(200, peticiones), concurrencia)  # calentamiento
+            print(await medir(cliente, ruta, peticiones, concurrencia))
+    database_async.cerrar_ejecutor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        preparar_base_datos(os.path.join(directorio, "bench.db"))
+        asyncio.run(principal(argumentos.peticiones, argumentos.concurrencia))
+        database.cerrar_pool()
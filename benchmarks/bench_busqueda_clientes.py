@@ -0,0 +1,100 @@
+"""
+Mide la búsqueda de clientes con el índice FTS5 de trigramas frente a LIKE '%x%'
+sobre una tabla de clientes sintética (por defecto 1.000.000 de filas), y comprueba el objetivo
+de latencia de la búsqueda con FTS (p99 por debajo de OBJETIVO_MS). Mide cada forma de búsqueda
+por separado (apellido, comienzo de email, teléfono y trozo de email), porque un apellido
+común y un teléfono cuestan muy distinto.
+
+Uso: python -m benchmarks.bench_busqueda_clientes [--clientes 1000000] [--busquedas 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import database, database_async
+from app.migraciones import aplicar_migraciones
+from app.services import cliente_service
+
+# Objetivo de latencia (p99, ms) de una búsqueda con FTS sobre 1M de clientes
+OBJETIVO_MS = 10
+
+NOMBRES = ["Ana", "Luis", "Marta", "Jorge", "Lucía", "Pablo", "Elena", "Carlos", "Sara", "Diego", "Nuria", "Iván"]
+APELLIDOS = ["García", "López", "Martín", "Sánchez", "Pérez", "Gómez", "Ruiz", "Díaz", "Moreno", "Álvarez", "Romero", "Navarro"]
+
+
+def preparar_base_datos(ruta: str, clientes: int):
+    """Crea la base de datos con `clientes` clientes sintéticos (el índice FTS se llena con los triggers)."""
+    database.configurar_pool(ruta=ruta)
+    aplicar_migraciones()
+    aleatorio = random.Random(7)
+    lote = 50000
+    for desde in range(0, clientes, lote):
+        filas = []
+        for n in range(desde, min(desde + lote, clientes)):
+            nombre = f"{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}"
+            filas.append((nombre, f"usuario{n}@correo{n % 97}.es", f"6{n:08d}"))
+        with database.transaccion() as conexion:
+            conexion.executemany("INSERT INTO clientes (nombre, email, telefono) VALUES (?, ?, ?)", filas)
+
+
+async def medir(busquedas: list[str], funcion) -> dict:
+    latencias = []
+    for termino in busquedas:
+        inicio = time.perf_counter()
+        await funcion(termino)
+        latencias.append(time.perf_counter() - inicio)
+    latencias.sort()
+    return {
+        "p50_ms": round(statistics.median(latencias) * 1000, 3),
+        "p99_ms": round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 3),
+        "max_ms": round(latencias[-1] * 1000, 3),
+    }
+
+
+async def principal(clientes: int, numero_busquedas: int):
+    aleatorio = random.Random(11)
+    formas = {
+        "apellido": lambda n: aleatorio.choice(APELLIDOS),
+        "nombre_y_apellido": lambda n: f"{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)}",
+        "comienzo_email": lambda n: f"usuario{n}@",
+        "telefono": lambda n: f"6{n:08d}",
+        "trozo_email": lambda n: f"{n}@correo",
+    }
+    busquedas = {forma: [generar(aleatorio.randrange(clientes)) for _ in range(numero_busquedas)] for forma, generar in formas.items()}
+
+    async def con_like(termino):
+        parametro = f"%{termino}%"
+        return await database_async.obtener_todos(
+            "SELECT * FROM clientes WHERE nombre LIKE ? OR email LIKE ? OR telefono LIKE ? LIMIT 20",
+            (parametro, parametro, parametro),
+        )
+
+    # Unas búsquedas sin medir para que las páginas del índice ya estén en la caché, como en una API en marcha
+    for terminos in busquedas.values():
+        for termino in terminos[:10]:
+            await cliente_service.buscar_clientes(termino + "x")
+    for forma, terminos in busquedas.items():
+        resultado = await medir(terminos, cliente_service.buscar_clientes)
+        print({"clientes": clientes, "metodo": "fts5_trigram", "forma": forma, **resultado,
+               "objetivo_ms": OBJETIVO_MS, "cumple": resultado["p99_ms"] < OBJETIVO_MS})
+    mezcla = [termino for terminos in busquedas.values() for termino in terminos]
+    print({"clientes": clientes, "metodo": "like", **await medir(mezcla[:: max(1, len(mezcla) // 20)], con_like)})
+    database_async.cerrar_ejecutor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=1_000_000)
+    parser.add_argument("--busquedas", type=int, default=200)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        inicio = time.perf_counter()
+        preparar_base_datos(os.path.join(directorio, "bench.db"), argumentos.clientes)
+        print({"carga_s": round(time.perf_counter() - inicio, 1)})
+        asyncio.run(principal(argumentos.clientes, argumentos.busquedas))
+        database.cerrar_pool()
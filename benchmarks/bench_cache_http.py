@@ -0,0 +1,65 @@
+"""
+Mide las rutas de lectura con ETag en tres casos: respuesta completa (200), petición condicional
+con If-None-Match que responde 304, y respuesta servida por la caché de respuestas (RESERVAS_CACHE_HTTP).
+
+Uso: python -m benchmarks.bench_cache_http [--escala pequena] [--peticiones 500]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from app import database, database_async
+from app.cache_http import cache_respuestas
+from app.indice_reservas import indice_reservas
+from app.main import app
+from benchmarks.comun import resumir
+from benchmarks.generador import ESCALAS, generar_escala
+
+RUTAS = ("/mesas/", "/mesas/1", "/clientes/1", "/estadisticas/resumen", "/estadisticas/clientes-frecuentes")
+
+
+async def medir(cliente: httpx.AsyncClient, ruta: str, peticiones: int, cabeceras: dict, estado: int) -> dict:
+    latencias = []
+    inicio_total = time.perf_counter()
+    for _ in range(peticiones):
+        inicio = time.perf_counter()
+        respuesta = await cliente.get(ruta, headers=cabeceras)
+        latencias.append(time.perf_counter() - inicio)
+        assert respuesta.status_code == estado, (ruta, respuesta.status_code)
+    return resumir(latencias, time.perf_counter() - inicio_total)
+
+
+async def principal(peticiones: int) -> dict:
+    transporte = httpx.ASGITransport(app=app)
+    resultado = {}
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        for ruta in RUTAS:
+            etag = (await cliente.get(ruta)).headers["etag"]
+            cache_respuestas.tamano_maximo = 0
+            completa = await medir(cliente, ruta, peticiones, {}, 200)
+            no_modificada = await medir(cliente, ruta, peticiones, {"If-None-Match": etag}, 304)
+            cache_respuestas.tamano_maximo = 1024
+            await cliente.get(ruta)
+            en_cache = await medir(cliente, ruta, peticiones, {}, 200)
+            resultado[ruta] = {"200": completa, "304": no_modificada, "200_cache_respuestas": en_cache}
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--peticiones", type=int, default=500)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_escala(os.path.join(directorio, "bench.db"), argumentos.escala)
+        indice_reservas.cargar()
+        resultado = asyncio.run(principal(argumentos.peticiones))
+        print(json.dumps({ruta: {caso: medida["p50_ms"] for caso, medida in casos.items()} for ruta, casos in resultado.items()}, indent=2))
+        database_async.cerrar_ejecutor()
+        database.cerrar_pool()
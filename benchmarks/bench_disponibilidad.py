@@ -0,0 +1,106 @@
+"""
+Compara la consulta de disponibilidad con la rejilla de franjas en memoria (GET /disponibilidad)
+frente a hacerlo con SQL: recorrer las mesas y comprobar cada hora de inicio con la consulta
+de solapamiento. Comprueba además que los dos métodos dan el mismo resultado.
+
+Uso: python -m benchmarks.bench_disponibilidad [--escala pequena] [--consultas 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as hora_del_dia
+
+from app import database
+from app.indice_reservas import ESTADOS_ACTIVOS, indice_reservas
+from app.rejilla import MINUTOS_FRANJA, franja, hora_franja
+from benchmarks.comun import resumir
+from benchmarks.generador import DIAS_FUTUROS, ESCALAS, generar_escala
+
+
+def consultas_aleatorias(datos: dict, numero: int, semilla: int = 5) -> list[tuple]:
+    """Consultas (día, hora desde, hora hasta, capacidad) repartidas por los días con reservas futuras."""
+    aleatorio = random.Random(semilla)
+    referencia = date.fromisoformat(datos["referencia"])
+    consultas = []
+    for _ in range(numero):
+        desde = aleatorio.choice((12, 13, 18, 19))
+        consultas.append((
+            referencia + timedelta(days=aleatorio.randrange(DIAS_FUTUROS)),
+            hora_del_dia(desde),
+            hora_del_dia(desde + aleatorio.choice((2, 3, 4))),
+            aleatorio.choice((1, 2, 4, 6)),
+        ))
+    return consultas
+
+
+def con_rejilla(dia, desde, hasta, capacidad, duracion: int) -> dict:
+    """Horas de inicio posibles por mesa con la rejilla."""
+    mesas = indice_reservas.disponibilidad(dia, franja(desde), franja(hasta), duracion // MINUTOS_FRANJA, capacidad)
+    return {mesa["id"]: mesa["inicios"] for mesa in mesas}
+
+
+def con_sql(dia, desde, hasta, capacidad, duracion: int) -> dict:
+    """Lo mismo recorriendo las mesas y comprobando cada hora de inicio con la consulta de solapamiento."""
+    mesas = database.obtener_todos("SELECT id FROM mesas WHERE activa = 1 AND capacidad >= ?", (capacidad,))
+    resultado = {}
+    for mesa in mesas:
+        inicios = []
+        for numero in range(franja(desde), franja(hasta) - duracion // MINUTOS_FRANJA + 1):
+            inicio = datetime.combine(dia, hora_del_dia()) + timedelta(minutes=numero * MINUTOS_FRANJA)
+            solapada = database.obtener_uno(
+                f"""
+                SELECT 1 FROM reservas
+                WHERE mesa_id = ? AND estado IN ({", ".join("?" for _ in ESTADOS_ACTIVOS)})
+                AND fecha_hora_inicio < ? AND fecha_hora_fin > ? LIMIT 1
+                """,
+                (mesa["id"], *ESTADOS_ACTIVOS,
+                 database.formatear_fecha(inicio + timedelta(minutes=duracion)), database.formatear_fecha(inicio)),
+            )
+            if not solapada:
+                inicios.append(hora_franja(numero))
+        if inicios:
+            resultado[mesa["id"]] = inicios
+    return resultado
+
+
+def medir(consultas: list[tuple], funcion, duracion: int) -> tuple[dict, list]:
+    latencias = []
+    respuestas = []
+    inicio_total = time.perf_counter()
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        respuestas.append(funcion(*consulta, duracion))
+        latencias.append(time.perf_counter() - inicio)
+    return resumir(latencias, time.perf_counter() - inicio_total), respuestas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--duracion", type=int, default=120, help="Minutos de la reserva buscada")
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        datos = generar_escala(os.path.join(directorio, "bench.db"), argumentos.escala)
+        inicio = time.perf_counter()
+        indice_reservas.cargar()
+        carga_indice = time.perf_counter() - inicio
+        consultas = consultas_aleatorias(datos, argumentos.consultas)
+        # La primera consulta de cada día construye su rejilla; las siguientes la reutilizan
+        fria, respuestas_rejilla = medir(consultas, con_rejilla, argumentos.duracion)
+        caliente, _ = medir(consultas, con_rejilla, argumentos.duracion)
+        sql, respuestas_sql = medir(consultas, con_sql, argumentos.duracion)
+        print(json.dumps({
+            "datos": datos,
+            "carga_indice_ms": round(carga_indice * 1000, 1),
+            "rejilla_primera_vez": fria,
+            "rejilla": caliente,
+            "sql": sql,
+            "mismo_resultado": respuestas_rejilla == respuestas_sql,
+        }, indent=2, ensure_ascii=False))
+        database.cerrar_pool()
@@ -0,0 +1,68 @@
+"""
+Cambios de estado simultáneos (confirmar y completar reservas, como en un cambio de turno)
+con una transacción por cambio frente al escritor agrupado de app/escritor.py.
+Comprueba además que el índice en memoria sigue coincidiendo con la base de datos.
+
+Uso: python -m benchmarks.bench_escritor [--escala pequena] [--operaciones 4000] [--concurrencia 64]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app import database, database_async
+from app.escritor import escritor
+from app.indice_reservas import indice_reservas
+from app.services import reserva_service
+from benchmarks.comun import resumir
+from benchmarks.generador import ESCALAS, generar_escala
+
+CAMBIOS = (reserva_service.confirmar_llegada_cliente_patch, reserva_service.marcar_reserva_como_completada_patch)
+
+
+async def medir(ids: list[int], operaciones: int, concurrencia: int) -> dict:
+    """Lanza `operaciones` cambios de estado con `concurrencia` tareas simultáneas."""
+    pendientes = iter(range(operaciones))
+    latencias = []
+
+    async def trabajador():
+        for numero in pendientes:
+            # Cada reserva se confirma y luego se completa, y vuelta a empezar
+            cambio = CAMBIOS[(numero // len(ids)) % 2]
+            inicio = time.perf_counter()
+            await cambio(ids[numero % len(ids)])
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return resumir(latencias, time.perf_counter() - inicio)
+
+
+async def principal(operaciones: int, concurrencia: int) -> dict:
+    ids = [fila["id"] for fila in database.obtener_todos("SELECT id FROM reservas WHERE estado = 'pendiente' LIMIT 1000")]
+    resultado = {}
+    for modo, activo in (("transaccion_por_cambio", False), ("escritor_agrupado", True)):
+        escritor.activo = activo
+        await medir(ids, min(200, operaciones), concurrencia)  # calentamiento
+        resultado[modo] = await medir(ids, operaciones, concurrencia)
+    resultado["escritor"] = escritor.metricas()
+    resultado["indice_consistente"] = indice_reservas.verificar_consistencia()["consistente"]
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--operaciones", type=int, default=4000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_escala(os.path.join(directorio, "bench.db"), argumentos.escala)
+        indice_reservas.cargar()
+        print(json.dumps(asyncio.run(principal(argumentos.operaciones, argumentos.concurrencia)), indent=2))
+        escritor.detener()
+        database_async.cerrar_ejecutor()
+        database.cerrar_pool()
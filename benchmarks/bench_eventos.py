@@ -0,0 +1,129 @@
+"""
+Pantallas de sala que consultan `GET /reservas?fecha=...` y `GET /mesas` cada pocos segundos frente
+a las mismas pantallas conectadas a `GET /eventos` (server-sent events), con un flujo constante de
+cambios de estado. Arranca uvicorn con los datos generados y mide el tiempo de CPU del servidor,
+las peticiones servidas y, con eventos, cuánto tarda un cambio en llegar a todas las pantallas.
+
+Uso: python -m benchmarks.bench_eventos [--escala pequena] [--pantallas 50] [--intervalo 2] [--segundos 20] [--cambios-s 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import date
+
+import httpx
+
+from app import database
+from benchmarks.bench_workers import arrancar_servidor, puerto_libre
+from benchmarks.comun import resumir
+from benchmarks.generador import ESCALAS, generar_escala
+
+
+def cpu_proceso(pid: int) -> float:
+    """Segundos de CPU (usuario + sistema) que lleva consumidos un proceso (Linux)."""
+    with open(f"/proc/{pid}/stat") as fichero:
+        campos = fichero.read().rsplit(")", 1)[1].split()
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def cambiar_estados(cliente: httpx.AsyncClient, ids: list[int], segundos: float, por_segundo: float, enviados: dict):
+    """Confirma reservas pendientes a ritmo constante y apunta cuándo se hizo cada cambio."""
+    fin = time.monotonic() + segundos
+    for reserva_id in ids:
+        if time.monotonic() >= fin:
+            break
+        enviados[reserva_id] = time.monotonic()
+        await cliente.patch(f"/reservas/{reserva_id}/confirmar")
+        await asyncio.sleep(1 / por_segundo)
+
+
+async def pantalla_sondeo(cliente: httpx.AsyncClient, fecha: str, intervalo: float, segundos: float, contador: list):
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        await cliente.get("/reservas/", params={"fecha": fecha})
+        await cliente.get("/mesas/")
+        contador[0] += 2
+        await asyncio.sleep(intervalo)
+
+
+async def pantalla_eventos(url: str, segundos: float, recibidos: list):
+    """
+    Escucha /eventos y apunta (reserva_id, instante) de cada confirmación recibida. Sin filtro de
+    fecha: los cambios de la prueba caen en varios días y así cada pantalla los recibe todos.
+    """
+    async with httpx.AsyncClient(base_url=url, timeout=None) as cliente:
+        async with cliente.stream("GET", "/eventos") as respuesta:
+            async def leer():
+                tipo = None
+                async for linea in respuesta.aiter_lines():
+                    if linea.startswith("event: "):
+                        tipo = linea[7:]
+                    elif linea.startswith("data: ") and tipo == "reserva_confirmada":
+                        recibidos.append((json.loads(linea[6:])["id"], time.monotonic()))
+            try:
+                await asyncio.wait_for(leer(), segundos)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def escenario(url: str, pid: int, modo: str, ids: list[int], fecha: str, argumentos) -> dict:
+    enviados, recibidos, peticiones = {}, [], [0]
+    limites = httpx.Limits(max_connections=argumentos.pantallas + 10)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limites) as cliente:
+        cpu = cpu_proceso(pid)
+        if modo == "sondeo":
+            pantallas = [pantalla_sondeo(cliente, fecha, argumentos.intervalo, argumentos.segundos, peticiones) for _ in range(argumentos.pantallas)]
+        else:
+            pantallas = [pantalla_eventos(url, argumentos.segundos + 1, recibidos) for _ in range(argumentos.pantallas)]
+        # Las pantallas de eventos se conectan antes de que empiecen los cambios
+        tareas = [asyncio.ensure_future(pantalla) for pantalla in pantallas]
+        await asyncio.sleep(1)
+        await cambiar_estados(cliente, ids, argumentos.segundos - 1, argumentos.cambios_s, enviados)
+        await asyncio.gather(*tareas)
+        cpu = cpu_proceso(pid) - cpu
+    resultado = {"cpu_servidor_s": round(cpu, 2), "cambios": len(enviados)}
+    if modo == "sondeo":
+        resultado["peticiones"] = peticiones[0]
+        resultado["desfase_medio_s"] = argumentos.intervalo / 2
+    else:
+        resultado["eventos_recibidos"] = len(recibidos)
+        resultado["entrega"] = resumir([instante - enviados[reserva_id] for reserva_id, instante in recibidos if reserva_id in enviados])
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--pantallas", type=int, default=50)
+    parser.add_argument("--intervalo", type=float, default=2, help="segundos entre consultas de cada pantalla")
+    parser.add_argument("--segundos", type=float, default=20)
+    parser.add_argument("--cambios-s", type=float, default=5, help="cambios de estado por segundo")
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        fecha = generar_escala(ruta, argumentos.escala)["referencia"]
+        # Reservas pendientes del día de referencia y de después, para confirmarlas durante la prueba
+        ids = [
+            fila["id"] for fila in database.obtener_todos(
+                "SELECT id FROM reservas WHERE estado = 'pendiente' AND fecha_hora_inicio >= ? ORDER BY fecha_hora_inicio",
+                (database.formatear_fecha(date.fromisoformat(fecha)),),
+            )
+        ]
+        database.cerrar_pool()
+        resultado = {"pantallas": argumentos.pantallas, "fecha": fecha}
+        for modo in ("sondeo", "eventos"):
+            puerto = puerto_libre()
+            servidor = arrancar_servidor(ruta, 1, puerto, coherencia=False)
+            try:
+                # Cada modo confirma reservas distintas
+                mitad = len(ids) // 2
+                propias = ids[:mitad] if modo == "sondeo" else ids[mitad:]
+                resultado[modo] = asyncio.run(escenario(f"http://127.0.0.1:{puerto}", servidor.pid, modo, propias, fecha, argumentos))
+            finally:
+                servidor.terminate()
+                servidor.wait()
+        print(json.dumps(resultado, indent=2))
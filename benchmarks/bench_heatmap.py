@@ -0,0 +1,98 @@
+"""
+Mapa de ocupación (`GET /estadisticas/heatmap`, app/mapa_ocupacion.py) según el tamaño del rango.
+Compara calcularlo con una consulta por día (como encadenar llamadas a la ocupación diaria) y
+sumando cada reserva franja a franja, con la pasada única sobre el array de diferencias (con
+listas de Python y, si está instalado, con NumPy) y con el resultado ya memoizado.
+Comprueba además que todos los caminos dan el mismo mapa.
+
+Uso: python -m benchmarks.bench_heatmap [--escala pequena] [--dias 30 365 730] [--repeticiones 5]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from app import database, mapa_ocupacion
+from benchmarks.comun import resumir
+from benchmarks.generador import ESCALAS, generar_escala
+
+
+def mapa_por_dias(desde: date, hasta: date, minutos: int) -> dict:
+    """Una consulta por día y, por cada reserva, una suma en cada franja que ocupa."""
+    franjas_dia = 24 * 60 // minutos
+    capacidades = mapa_ocupacion._capacidades(None)
+    sumas = {nombre: [[0] * franjas_dia for _ in range(7)] for nombre in capacidades}
+    veces = [0] * 7
+    consulta = f"""
+    SELECT r.fecha_hora_inicio, r.fecha_hora_fin, r.num_comensales, m.ubicacion
+    FROM reservas_historico r JOIN mesas m ON m.id = r.mesa_id
+    WHERE r.fecha_hora_inicio >= ? AND r.fecha_hora_inicio < ? AND r.estado != 'cancelada'
+    """
+    dia = desde
+    while dia <= hasta:
+        veces[dia.weekday()] += 1
+        medianoche = datetime.combine(dia, datetime.min.time())
+        limites = [
+            (database.formatear_fecha(medianoche + timedelta(minutes=franja * minutos)),
+             database.formatear_fecha(medianoche + timedelta(minutes=(franja + 1) * minutos)))
+            for franja in range(franjas_dia)
+        ]
+        # Las reservas que empiezan el día anterior pueden acabar pasada la medianoche
+        for fila in database.obtener_todos(consulta, database.rango_dias(dia - timedelta(days=1), 2)):
+            for franja, (inicio, fin) in enumerate(limites):
+                if fila["fecha_hora_inicio"] < fin and fila["fecha_hora_fin"] > inicio:
+                    sumas[fila["ubicacion"]][dia.weekday()][franja] += fila["num_comensales"]
+        dia += timedelta(days=1)
+    return {
+        nombre: [[round(suma / veces[semanal], 2) if veces[semanal] else 0 for suma in fila] for semanal, fila in enumerate(filas)]
+        for nombre, filas in sumas.items()
+    }
+
+
+def medir(funcion, repeticiones: int) -> tuple:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resumir(tiempos), resultado
+
+
+def comensales(mapa: dict) -> dict:
+    return {nombre: list(datos["comensales"].values()) for nombre, datos in mapa["ubicaciones"].items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--dias", type=int, nargs="+", default=[30, 365, 730])
+    parser.add_argument("--minutos", type=int, choices=mapa_ocupacion.MINUTOS_FRANJA, default=15)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        referencia = date.fromisoformat(generar_escala(ruta, argumentos.escala)["referencia"])
+        resultado = {"escala": argumentos.escala, "numpy": mapa_ocupacion.numpy is not None, "rangos": {}}
+        hasta = referencia - timedelta(days=2)
+        for dias in argumentos.dias:
+            desde = hasta - timedelta(days=dias - 1)
+            medidas = {}
+            # La consulta por día es muy lenta en rangos largos: se mide una sola vez
+            medidas["por_dias"], por_dias = medir(lambda: mapa_por_dias(desde, hasta, argumentos.minutos), 1)
+            medidas["una_pasada_python"], python = medir(
+                lambda: mapa_ocupacion.calcular_mapa(desde, hasta, argumentos.minutos, vectorizado=False), argumentos.repeticiones)
+            caminos = [por_dias, comensales(python)]
+            if mapa_ocupacion.numpy is not None:
+                medidas["una_pasada_numpy"], vectorizado = medir(
+                    lambda: mapa_ocupacion.calcular_mapa(desde, hasta, argumentos.minutos, vectorizado=True), argumentos.repeticiones)
+                caminos.append(comensales(vectorizado))
+            mapa_ocupacion.mapa_ocupacion(desde, hasta, argumentos.minutos)
+            medidas["memoizado"], _ = medir(lambda: mapa_ocupacion.mapa_ocupacion(desde, hasta, argumentos.minutos), argumentos.repeticiones)
+            medidas["reservas"] = python["reservas"]
+            medidas["coinciden"] = all(camino == caminos[0] for camino in caminos)
+            resultado["rangos"][dias] = medidas
+        database.cerrar_pool()
+        print(json.dumps(resultado, indent=2))
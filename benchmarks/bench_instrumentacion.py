@@ -0,0 +1,101 @@
+"""
+Mide el coste de la instrumentación (middleware de latencias y registro de consultas SQL):
+el coste por llamada de cada pieza y las peticiones por segundo de la API real,
+alternando rondas con la instrumentación activada y desactivada.
+
+Uso: python -m benchmarks.bench_instrumentacion [--peticiones 2000] [--concurrencia 32] [--rondas 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import timeit
+
+import httpx
+
+from app import database, database_async, instrumentacion
+from app.main import app
+from benchmarks.bench_async import preparar_base_datos
+
+
+async def medir(cliente: httpx.AsyncClient, peticiones: int, concurrencia: int) -> float:
+    """Lanza una mezcla de peticiones de lectura y devuelve las peticiones por segundo."""
+    pendientes = iter(range(peticiones))
+
+    async def trabajador():
+        for numero in pendientes:
+            if numero % 3 == 0:
+                respuesta = await cliente.get("/reservas/", params={"fecha": f"2025-{1 + numero % 12:02d}-{1 + numero % 28:02d}", "limite": 50})
+            elif numero % 3 == 1:
+                respuesta = await cliente.get(f"/reservas/{1 + numero % 20000}")
+            else:
+                respuesta = await cliente.get(f"/mesas/{1 + numero % 30}")
+            respuesta.raise_for_status()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return peticiones / (time.perf_counter() - inicio)
+
+
+def coste_unitario() -> dict:
+    """Microsegundos que añade la instrumentación por consulta SQL y por petición."""
+    repeticiones = 100000
+    consulta = "SELECT * FROM mesas WHERE id = ?"
+    por_consulta = timeit.timeit(lambda: instrumentacion.registrar_consulta(consulta, 0.0001), number=repeticiones)
+
+    class Ruta:
+        path = "/mesas/{mesa_id}"
+
+    async def app_vacia(scope, receive, send):
+        scope["route"] = Ruta
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def enviar(mensaje):
+        pass
+
+    async def repetir(aplicacion):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            await aplicacion({"type": "http", "method": "GET"}, None, enviar)
+        return time.perf_counter() - inicio
+
+    sin = asyncio.run(repetir(app_vacia))
+    con = asyncio.run(repetir(instrumentacion.MiddlewareInstrumentacion(app_vacia)))
+    instrumentacion.metricas.reiniciar()
+    return {
+        "us_por_consulta": round(por_consulta / repeticiones * 1e6, 2),
+        "us_por_peticion": round((con - sin) / repeticiones * 1e6, 2),
+    }
+
+
+async def principal(peticiones: int, concurrencia: int, rondas: int):
+    transporte = httpx.ASGITransport(app=app)
+    resultados = {True: [], False: []}
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await medir(cliente, min(500, peticiones), concurrencia)  # calentamiento
+        for _ in range(rondas):
+            for activa in (False, True):
+                instrumentacion.ACTIVA = activa
+                resultados[activa].append(await medir(cliente, peticiones, concurrencia))
+    database_async.cerrar_ejecutor()
+    sin = statistics.median(resultados[False])
+    con = statistics.median(resultados[True])
+    print({"rps_sin_instrumentacion": round(sin, 1), "rps_con_instrumentacion": round(con, 1),
+           "coste_pct": round((sin - con) / sin * 100, 2), "us_por_peticion": round((1 / con - 1 / sin) * 1e6, 1)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--rondas", type=int, default=5)
+    argumentos = parser.parse_args()
+    print(coste_unitario())
+    with tempfile.TemporaryDirectory() as directorio:
+        preparar_base_datos(os.path.join(directorio, "bench.db"))
+        asyncio.run(principal(argumentos.peticiones, argumentos.concurrencia, argumentos.rondas))
+        database.cerrar_pool()
@@ -0,0 +1,131 @@
+"""
+Coste del emparejamiento de la lista de espera (app/lista_espera.py) según su tamaño.
+Para cada tamaño mide cuánto cuesta ofrecer un hueco en el que no espera nadie (lo habitual),
+comparado con recorrer toda la lista de espera, y la latencia de una cancelación cuyo hueco
+se asigna a una entrada en espera. Comprueba además que el índice en memoria sigue coincidiendo
+con la base de datos.
+
+Uso: python -m benchmarks.bench_lista_espera [--escala pequena] [--tamanos 100 1000 10000 100000] [--repeticiones 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from app import database, database_async
+from app.escritor import escritor
+from app.indice_reservas import indice_reservas
+from app.lista_espera import COLUMNAS_ESPERA, DURACION_RESERVA, TABLA_ESPERA, lista_espera
+from app.services import reserva_service
+from benchmarks.comun import resumir
+from benchmarks.generador import DIAS_FUTUROS, ESCALAS, TURNOS, describir_base_datos, generar_escala
+
+
+def llenar_lista(cantidad: int, referencia: date, clientes: int, aleatorio: random.Random):
+    """Añade `cantidad` entradas en espera repartidas entre los turnos de los días futuros."""
+    filas = []
+    for _ in range(cantidad):
+        dia = referencia + timedelta(days=aleatorio.randint(1, DIAS_FUTUROS - 1))
+        inicio = datetime.combine(dia, datetime.min.time()) + timedelta(hours=aleatorio.choice(TURNOS))
+        filas.append((
+            aleatorio.randint(1, clientes), inicio, inicio + DURACION_RESERVA, aleatorio.randint(1, 6),
+            database.formatear_fecha(datetime.now()),
+        ))
+    with database.transaccion() as conexion:
+        conexion.executemany(
+            f"""
+            INSERT INTO {TABLA_ESPERA} (cliente_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            filas,
+        )
+
+
+def candidatos_recorriendo(mesa: dict, desde: datetime, hasta: datetime) -> list[dict]:
+    """Lo que haría un emparejamiento sin índice: leer toda la lista de espera y filtrarla."""
+    filas = database.obtener_todos(f"SELECT {COLUMNAS_ESPERA} FROM {TABLA_ESPERA} WHERE estado = 'esperando' ORDER BY id")
+    return [
+        fila for fila in filas
+        if fila["fecha_inicio"] < database.formatear_fecha(hasta) and fila["fecha_fin"] > database.formatear_fecha(desde)
+        and fila["numero_comensales"] <= mesa["capacidad"]
+    ][:lista_espera.candidatos_maximos]
+
+
+def medir_huecos_vacios(mesas: list[dict], referencia: date, repeticiones: int, aleatorio: random.Random) -> dict:
+    """Huecos de 17:00 a 19:00, entre turnos: ninguna entrada en espera se solapa con ellos."""
+    indice, recorrido = [], []
+    for numero in range(repeticiones):
+        mesa = aleatorio.choice(mesas)
+        desde = datetime.combine(referencia + timedelta(days=aleatorio.randint(1, DIAS_FUTUROS - 1)), datetime.min.time()) + timedelta(hours=17)
+        inicio = time.perf_counter()
+        lista_espera.emparejar(mesa["id"], desde, desde + DURACION_RESERVA)
+        indice.append(time.perf_counter() - inicio)
+        # El recorrido completo es lento con listas grandes: basta con unas pocas repeticiones
+        if numero >= 20:
+            continue
+        inicio = time.perf_counter()
+        candidatos_recorriendo(mesa, desde, desde + DURACION_RESERVA)
+        recorrido.append(time.perf_counter() - inicio)
+    return {"indice_p50_ms": resumir(indice)["p50_ms"], "recorrido_p50_ms": resumir(recorrido)["p50_ms"]}
+
+
+async def medir_cancelaciones(ids: list[int]) -> dict:
+    """Cancela reservas futuras: cada hueco liberado se ofrece a la lista de espera."""
+    latencias = []
+    antes = lista_espera.metricas()["asignadas"]
+    for reserva_id in ids:
+        inicio = time.perf_counter()
+        await reserva_service.cancelar_reserva(reserva_id)
+        latencias.append(time.perf_counter() - inicio)
+    resultado = resumir(latencias)
+    resultado["asignadas"] = lista_espera.metricas()["asignadas"] - antes
+    return resultado
+
+
+def principal(tamanos: list[int], repeticiones: int) -> dict:
+    datos = describir_base_datos()
+    referencia = date.fromisoformat(datos["referencia"])
+    mesas = database.obtener_todos("SELECT id, capacidad FROM mesas WHERE activa = 1")
+    futuras = [
+        fila["id"] for fila in database.obtener_todos(
+            "SELECT id FROM reservas WHERE estado IN ('pendiente', 'confirmada') AND fecha_hora_inicio > ? ORDER BY id",
+            (database.formatear_fecha(datetime.now() + timedelta(days=1)),),
+        )
+    ]
+    aleatorio = random.Random(7)
+    aleatorio.shuffle(futuras)
+    cancelaciones = max(1, min(50, len(futuras) // len(tamanos)))
+
+    resultado = {}
+    en_lista = 0
+    for tamano in tamanos:
+        llenar_lista(tamano - en_lista, referencia, datos["clientes"], aleatorio)
+        en_lista = tamano
+        ids, futuras = futuras[:cancelaciones], futuras[cancelaciones:]
+        resultado[f"lista_{tamano}"] = {
+            "hueco_sin_candidatos": medir_huecos_vacios(mesas, referencia, repeticiones, aleatorio),
+            "cancelacion": asyncio.run(medir_cancelaciones(ids)),
+        }
+    resultado["emparejamiento"] = lista_espera.metricas()
+    resultado["indice_consistente"] = indice_reservas.verificar_consistencia()["consistente"]
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="entradas en espera (crecientes)")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_escala(os.path.join(directorio, "bench.db"), argumentos.escala)
+        indice_reservas.cargar()
+        print(json.dumps(principal(sorted(argumentos.tamanos), argumentos.repeticiones), indent=2))
+        escritor.detener()
+        database_async.cerrar_ejecutor()
+        database.cerrar_pool()
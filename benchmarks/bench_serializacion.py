@@ -0,0 +1,86 @@
+"""
+Coste por fila de serializar los listados: validando cada fila con el modelo de respuesta y
+serializando con Pydantic (lo que hace FastAPI con response_model) frente a la respuesta rápida
+de app/respuestas.py (filas de la base de datos sin validar, con orjson o con json).
+Comprueba además que las tres formas producen el mismo JSON.
+
+Uso: python -m benchmarks.bench_serializacion [--escala pequena] [--filas 1000] [--repeticiones 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from pydantic import TypeAdapter
+
+from app import database, database_async, respuestas
+from app.models.cliente import ClienteResponse
+from app.models.mesa import MesaResponse
+from app.models.reserva import ReservaResponse
+from app.respuestas import RespuestaJSONRapida, filas_confiables
+from app.services import cliente_service, mesa_service, reserva_service
+from benchmarks.generador import ESCALAS, generar_escala
+
+
+def con_pydantic(filas: list[dict], modelo) -> bytes:
+    adaptador = TypeAdapter(list[modelo])
+    return adaptador.dump_json(adaptador.validate_python(filas))
+
+
+def rapida(filas: list[dict], modelo) -> bytes:
+    return RespuestaJSONRapida(filas_confiables(filas, modelo)).body
+
+
+def rapida_sin_orjson(filas: list[dict], modelo) -> bytes:
+    original = respuestas.orjson
+    respuestas.orjson = None
+    try:
+        return rapida(filas, modelo)
+    finally:
+        respuestas.orjson = original
+
+
+def coste_por_fila(funcion, filas: list[dict], modelo, repeticiones: int) -> float:
+    """Mediana, en microsegundos por fila, de serializar `filas` con `funcion`."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(filas, modelo)
+        tiempos.append(time.perf_counter() - inicio)
+    return round(statistics.median(tiempos) / len(filas) * 1_000_000, 3)
+
+
+async def cargar_filas(numero: int) -> dict:
+    return {
+        "reservas": (await reserva_service.obtener_reservas(limite=numero), ReservaResponse),
+        "clientes": (await cliente_service.obtener_todos_clientes(limite=numero), ClienteResponse),
+        "mesas": (await mesa_service.obtener_todas_mesas(), MesaResponse),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--filas", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_escala(os.path.join(directorio, "bench.db"), argumentos.escala)
+        listados = asyncio.run(cargar_filas(argumentos.filas))
+        resultado = {"orjson": respuestas.orjson is not None}
+        for nombre, (filas, modelo) in listados.items():
+            salidas = [json.loads(funcion(filas, modelo)) for funcion in (con_pydantic, rapida, rapida_sin_orjson)]
+            resultado[nombre] = {
+                "filas": len(filas),
+                "us_por_fila_pydantic": coste_por_fila(con_pydantic, filas, modelo, argumentos.repeticiones),
+                "us_por_fila_rapida": coste_por_fila(rapida, filas, modelo, argumentos.repeticiones),
+                "us_por_fila_rapida_sin_orjson": coste_por_fila(rapida_sin_orjson, filas, modelo, argumentos.repeticiones),
+                "mismo_json": salidas[0] == salidas[1] == salidas[2],
+            }
+        print(json.dumps(resultado, indent=2))
+        database_async.cerrar_ejecutor()
+        database.cerrar_pool()
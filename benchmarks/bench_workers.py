@@ -0,0 +1,141 @@
+"""
+Escalado con varios workers: arranca `uvicorn app.main:app --workers N` (con RESERVAS_MULTIPROCESO=1)
+para cada N y mide las peticiones por segundo de la mezcla de lecturas de benchmarks.carga,
+lanzada desde varios procesos cliente. Con cada N comprueba además la coherencia entre workers:
+reservas simultáneas para los mismos huecos (solo una por hueco) y que un cambio en una mesa
+se ve desde todos los workers pasado el intervalo de sincronización.
+
+Con --sin-coherencia se arranca con RESERVAS_MULTIPROCESO=0, para ver lo que falla sin ella: las
+lecturas obsoletas de mesas (las reservas simultáneas siguen sin solaparse, porque las escrituras
+que las validan aplican siempre los cambios de los demás workers).
+
+Uso: python -m benchmarks.bench_workers [--escala pequena] [--workers 1 2 4] [--segundos 10] [--clientes 4] [--sin-coherencia]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app import database
+from app.coherencia import INTERVALO_MS
+from benchmarks.carga import carga_contencion, peticiones_lectura
+from benchmarks.generador import ESCALAS, describir_base_datos, generar_escala
+
+
+def puerto_libre() -> int:
+    with socket.socket() as conexion:
+        conexion.bind(("127.0.0.1", 0))
+        return conexion.getsockname()[1]
+
+
+def arrancar_servidor(ruta: str, workers: int, puerto: int, coherencia: bool = True) -> subprocess.Popen:
+    """Arranca uvicorn con `workers` procesos y espera a que responda."""
+    entorno = {**os.environ, "RESERVAS_DB_RUTA": ruta, "RESERVAS_MULTIPROCESO": "1" if coherencia else "0", "RESERVAS_PLANIFICADOR": "0"}
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers), "--port", str(puerto), "--log-level", "warning"],
+        env=entorno,
+    )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            if httpx.get(f"http://127.0.0.1:{puerto}/salud").status_code == 200:
+                return servidor
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    servidor.terminate()
+    raise RuntimeError("El servidor no arrancó")
+
+
+def cliente_lecturas(url: str, datos: dict, segundos: float, concurrencia: int, semilla: int, cola):
+    """Proceso cliente: lanza lecturas durante `segundos` y devuelve (peticiones, errores)."""
+    async def principal():
+        generador = peticiones_lectura(datos, semilla)
+        fin = time.monotonic() + segundos
+        contadores = [0, 0]
+
+        async def trabajador(cliente):
+            while time.monotonic() < fin:
+                _, ruta, parametros = next(generador)
+                respuesta = await cliente.get(ruta, params=parametros)
+                contadores[0] += 1
+                contadores[1] += respuesta.status_code >= 500
+
+        async with httpx.AsyncClient(base_url=url, timeout=60) as cliente:
+            await asyncio.gather(*(trabajador(cliente) for _ in range(concurrencia)))
+        return contadores
+
+    cola.put(asyncio.run(principal()))
+
+
+def medir_lecturas(url: str, datos: dict, segundos: float, clientes: int, concurrencia: int) -> dict:
+    cola = multiprocessing.Queue()
+    procesos = [
+        multiprocessing.Process(target=cliente_lecturas, args=(url, datos, segundos, concurrencia, 100 + n, cola))
+        for n in range(clientes)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    resultados = [cola.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+    peticiones = sum(resultado[0] for resultado in resultados)
+    return {"peticiones": peticiones, "errores": sum(resultado[1] for resultado in resultados), "peticiones_s": round(peticiones / segundos, 1)}
+
+
+def comprobar_cambio_mesa(url: str, lecturas: int = 50) -> dict:
+    """Cambia la ubicación de la mesa 1 y la lee con conexiones nuevas (repartidas entre workers)."""
+    mesa = httpx.get(f"{url}/mesas/1").json()
+    # Se calienta la caché de mesas de todos los workers con el valor anterior
+    for _ in range(lecturas):
+        httpx.get(f"{url}/mesas/1")
+    mesa["ubicacion"] = "privado" if mesa["ubicacion"] != "privado" else "terraza"
+    httpx.put(f"{url}/mesas/1", json={clave: mesa[clave] for clave in ("numero", "capacidad", "ubicacion", "activa")})
+    time.sleep(2 * INTERVALO_MS / 1000)
+    obsoletas = sum(httpx.get(f"{url}/mesas/1").json()["ubicacion"] != mesa["ubicacion"] for _ in range(lecturas))
+    return {"lecturas": lecturas, "obsoletas": obsoletas}
+
+
+async def contencion(url: str, datos: dict) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=httpx.Limits(max_connections=200)) as cliente:
+        resultado = await carga_contencion(cliente, datos, huecos=10, intentos=20)
+    return {clave: resultado[clave] for clave in ("aceptadas", "huecos_con_mas_de_una", "correcto")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=4, help="procesos que generan la carga")
+    parser.add_argument("--concurrencia", type=int, default=16, help="peticiones simultáneas por proceso cliente")
+    parser.add_argument("--sin-coherencia", action="store_true")
+    argumentos = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        generar_escala(ruta, argumentos.escala)
+        datos = describir_base_datos()
+        database.cerrar_pool()
+        resultado = {"cpus": os.cpu_count()}
+        for workers in argumentos.workers:
+            puerto = puerto_libre()
+            url = f"http://127.0.0.1:{puerto}"
+            servidor = arrancar_servidor(ruta, workers, puerto, not argumentos.sin_coherencia)
+            try:
+                resultado[f"workers_{workers}"] = {
+                    "lecturas": medir_lecturas(url, datos, argumentos.segundos, argumentos.clientes, argumentos.concurrencia),
+                    "contencion": asyncio.run(contencion(url, datos)),
+                    "cambio_mesa": comprobar_cambio_mesa(url),
+                }
+            finally:
+                servidor.terminate()
+                servidor.wait()
+        print(json.dumps(resultado, indent=2))
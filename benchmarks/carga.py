@@ -0,0 +1,127 @@
+"""
+Prueba de carga HTTP en el mismo proceso (httpx sobre ASGI, sin red) contra la API real:
+una mezcla de lecturas de los endpoints principales y la contención de muchas reservas
+simultáneas para los mismos huecos (solo una por hueco puede ganar).
+
+Uso: python -m benchmarks.carga --ruta bench.db [--peticiones 3000] [--concurrencia 32]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+
+from app import database, database_async
+from app.main import app
+from benchmarks.comun import resumir
+from benchmarks.generador import DIAS_FUTUROS, describir_base_datos
+
+
+def peticiones_lectura(datos: dict, semilla: int = 7):
+    """Generador infinito de (endpoint, método, url, parámetros) con la mezcla de lecturas."""
+    aleatorio = random.Random(semilla)
+    referencia = date.fromisoformat(datos["referencia"])
+    while True:
+        dia = (referencia - timedelta(days=aleatorio.randrange(1, 300))).isoformat()
+        futuro = datetime(referencia.year, referencia.month, referencia.day, 20) + timedelta(days=aleatorio.randrange(DIAS_FUTUROS))
+        yield aleatorio.choice((
+            ("GET /reservas?fecha", "/reservas/", {"fecha": dia}),
+            ("GET /reservas?cliente_id", "/reservas/", {"cliente_id": aleatorio.randint(1, datos["clientes"]), "limite": 50}),
+            ("GET /reservas/{id}", f"/reservas/{aleatorio.randint(1, datos['reservas'])}", {}),
+            ("GET /clientes/{id}", f"/clientes/{aleatorio.randint(1, datos['clientes'])}", {}),
+            ("GET /clientes?limite", "/clientes/", {"limite": 50, "despues_de_id": aleatorio.randint(0, datos["clientes"])}),
+            ("GET /mesas/{id}", f"/mesas/{aleatorio.randint(1, datos['mesas'])}", {}),
+            ("GET /mesas/disponibles", "/mesas/disponibles/", {
+                "fecha_inicio": futuro.isoformat(), "fecha_fin": (futuro + timedelta(hours=2)).isoformat(), "capacidad": 2}),
+            ("GET /estadisticas/ocupacion/diaria", "/estadisticas/ocupacion/diaria", {"fecha": dia}),
+            ("GET /estadisticas/resumen", "/estadisticas/resumen", {}),
+        ))
+
+
+async def carga_lecturas(cliente: httpx.AsyncClient, datos: dict, peticiones: int, concurrencia: int) -> dict:
+    """Lanza `peticiones` lecturas con `concurrencia` clientes simultáneos; devuelve latencias por endpoint."""
+    generador = peticiones_lectura(datos)
+    restantes = iter(range(peticiones))
+    latencias = {}
+    errores = {}
+
+    async def trabajador():
+        for _ in restantes:
+            nombre, url, parametros = next(generador)
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(url, params=parametros)
+            latencias.setdefault(nombre, []).append(time.perf_counter() - inicio)
+            if respuesta.status_code >= 500:
+                errores[nombre] = errores.get(nombre, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    total = time.perf_counter() - inicio
+    resultado = {nombre: {**resumir(valores), "errores": errores.get(nombre, 0)} for nombre, valores in sorted(latencias.items())}
+    resultado["total"] = resumir([l for valores in latencias.values() for l in valores], total)
+    return resultado
+
+
+async def carga_contencion(cliente: httpx.AsyncClient, datos: dict, huecos: int, intentos: int) -> dict:
+    """
+    Para cada uno de `huecos` huecos (mesa y hora) lanza `intentos` reservas a la vez.
+    Comprueba que solo una por hueco se acepta y mide la latencia de aceptadas y rechazadas.
+    """
+    referencia = date.fromisoformat(datos["referencia"])
+    # Huecos lejanos en el futuro, que el generador no ha ocupado
+    base = datetime(referencia.year, referencia.month, referencia.day, 12) + timedelta(days=500 + int(time.time()) % 1000)
+    latencias = []
+    ganadoras = {}
+
+    async def reservar(hueco):
+        cuerpo = {
+            "cliente_id": 1 + hueco % datos["clientes"],
+            "mesa_id": 1 + hueco % datos["mesas"],
+            "fecha_inicio": (base + timedelta(days=hueco // datos["mesas"])).isoformat(),
+            "numero_comensales": 1,
+        }
+        inicio = time.perf_counter()
+        respuesta = await cliente.post("/reservas/", json=cuerpo)
+        latencias.append(time.perf_counter() - inicio)
+        if respuesta.status_code == 200:
+            ganadoras[hueco] = ganadoras.get(hueco, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(reservar(hueco) for hueco in range(huecos) for _ in range(intentos)))
+    total = time.perf_counter() - inicio
+    return {
+        **resumir(latencias, total),
+        "huecos": huecos,
+        "intentos_por_hueco": intentos,
+        "aceptadas": sum(ganadoras.values()),
+        "huecos_con_mas_de_una": sum(1 for n in ganadoras.values() if n > 1),
+        "correcto": len(ganadoras) == huecos and all(n == 1 for n in ganadoras.values()),
+    }
+
+
+async def ejecutar_carga(datos: dict, peticiones: int = 3000, concurrencia: int = 32, huecos: int = 20, intentos: int = 25) -> dict:
+    """Ejecuta la carga de lecturas y la de contención contra la API."""
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+        await carga_lecturas(cliente, datos, min(300, peticiones), concurrencia)  # calentamiento
+        return {
+            "lecturas": await carga_lecturas(cliente, datos, peticiones, concurrencia),
+            "contencion": await carga_contencion(cliente, datos, huecos, intentos),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ruta", required=True, help="Base de datos creada con benchmarks.generador")
+    parser.add_argument("--peticiones", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    argumentos = parser.parse_args()
+    database.configurar_pool(ruta=argumentos.ruta)
+    datos = describir_base_datos()
+    print(json.dumps(asyncio.run(ejecutar_carga(datos, argumentos.peticiones, argumentos.concurrencia)), indent=2, ensure_ascii=False))
+    database_async.cerrar_ejecutor()
+    database.cerrar_pool()
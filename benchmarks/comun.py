@@ -0,0 +1,25 @@
+"""Utilidades compartidas por los benchmarks."""
+
+import statistics
+
+
+def resumir(latencias: list[float], segundos_totales: float = None) -> dict:
+    """Resume una lista de latencias (en segundos) en milisegundos: p50, p95, p99, media y máximo."""
+    if not latencias:
+        return {"n": 0}
+    ordenadas = sorted(latencias)
+
+    def percentil(p):
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+    resumen = {
+        "n": len(ordenadas),
+        "p50_ms": round(statistics.median(ordenadas) * 1000, 3),
+        "p95_ms": round(percentil(0.95) * 1000, 3),
+        "p99_ms": round(percentil(0.99) * 1000, 3),
+        "media_ms": round(statistics.fmean(ordenadas) * 1000, 3),
+        "max_ms": round(ordenadas[-1] * 1000, 3),
+    }
+    if segundos_totales:
+        resumen["ops_s"] = round(len(ordenadas) / segundos_totales, 1)
+    return resumen
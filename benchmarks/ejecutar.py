@@ -0,0 +1,139 @@
+"""
+Ejecuta la batería completa de benchmarks (datos generados, micro-benchmarks de servicios y carga HTTP)
+y guarda el resultado en JSON. Con --base compara con un resultado anterior y sale con código 1 si
+alguna medida empeora más de la tolerancia (para usarlo como control de regresiones).
+
+Uso:
+    python -m benchmarks.ejecutar [--escala pequena] [--salida resultado.json] [--base anterior.json] [--tolerancia 0.2]
+    python -m benchmarks.ejecutar --comparar anterior.json nuevo.json [--tolerancia 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+from datetime import date, datetime
+
+from app import database, database_async
+from benchmarks.carga import ejecutar_carga
+from benchmarks.generador import ESCALAS, generar_escala
+from benchmarks.micro import ejecutar_micro
+
+# Medidas que se comparan entre ejecuciones
+MEDIDAS_COMPARADAS = ("p50_ms", "p99_ms")
+# Diferencias menores que esto (en ms) se consideran ruido aunque superen la tolerancia relativa
+MINIMO_MS = 0.2
+
+
+def ejecutar(escala: str, semilla: int, referencia: date, iteraciones: int, peticiones: int, concurrencia: int) -> dict:
+    """Genera los datos en un directorio temporal y ejecuta los micro-benchmarks y la carga."""
+    with tempfile.TemporaryDirectory() as directorio:
+        datos = generar_escala(os.path.join(directorio, "bench.db"), escala, semilla, referencia)
+        print(f"Datos generados: {datos}", file=sys.stderr)
+        micro = asyncio.run(ejecutar_micro(datos, iteraciones))
+        carga = asyncio.run(ejecutar_carga(datos, peticiones, concurrencia))
+        database_async.cerrar_ejecutor()
+        database.cerrar_pool()
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "escala": escala,
+            "iteraciones": iteraciones,
+            "peticiones": peticiones,
+            "concurrencia": concurrencia,
+            "datos": datos,
+        },
+        "micro": micro,
+        "carga": carga,
+    }
+
+
+def _aplanar(resultado: dict) -> dict:
+    """Convierte el resultado en {"micro/caso/p50_ms": valor, ...} con las medidas comparables."""
+    planas = {}
+    for seccion in ("micro", "carga"):
+        pendientes = [(seccion, resultado.get(seccion, {}))]
+        while pendientes:
+            prefijo, valor = pendientes.pop()
+            if not isinstance(valor, dict):
+                continue
+            for clave, contenido in valor.items():
+                if clave in MEDIDAS_COMPARADAS:
+                    planas[f"{prefijo}/{clave}"] = contenido
+                else:
+                    pendientes.append((f"{prefijo}/{clave}", contenido))
+    return planas
+
+
+def comparar(base: dict, nuevo: dict, tolerancia: float) -> dict:
+    """Compara dos resultados y devuelve las medidas que han empeorado más de la tolerancia."""
+    anteriores = _aplanar(base)
+    actuales = _aplanar(nuevo)
+    regresiones = {}
+    mejoras = {}
+    for nombre in sorted(set(anteriores) & set(actuales)):
+        antes, ahora = anteriores[nombre], actuales[nombre]
+        if not antes:
+            continue
+        cambio = (ahora - antes) / antes
+        if abs(ahora - antes) < MINIMO_MS:
+            continue
+        if cambio > tolerancia:
+            regresiones[nombre] = {"antes": antes, "ahora": ahora, "cambio_pct": round(cambio * 100, 1)}
+        elif cambio < -tolerancia:
+            mejoras[nombre] = {"antes": antes, "ahora": ahora, "cambio_pct": round(cambio * 100, 1)}
+    # La contención tiene que seguir siendo correcta: una sola reserva por hueco
+    contencion_correcta = nuevo.get("carga", {}).get("contencion", {}).get("correcto", True)
+    return {
+        "tolerancia_pct": round(tolerancia * 100, 1),
+        "regresiones": regresiones,
+        "mejoras": mejoras,
+        "contencion_correcta": contencion_correcta,
+        "aprobado": not regresiones and contencion_correcta,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--referencia", type=date.fromisoformat, default=None, help="Fecha de referencia YYYY-MM-DD (por defecto hoy)")
+    parser.add_argument("--iteraciones", type=int, default=200)
+    parser.add_argument("--peticiones", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--salida", help="Fichero JSON donde guardar el resultado (por defecto se imprime)")
+    parser.add_argument("--base", help="Resultado anterior con el que comparar")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTERIOR", "NUEVO"), help="Solo compara dos resultados ya guardados")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento relativo permitido (0.2 = 20%%)")
+    argumentos = parser.parse_args()
+
+    if argumentos.comparar:
+        with open(argumentos.comparar[0]) as f:
+            base = json.load(f)
+        with open(argumentos.comparar[1]) as f:
+            resultado = json.load(f)
+    else:
+        resultado = ejecutar(argumentos.escala, argumentos.semilla, argumentos.referencia,
+                             argumentos.iteraciones, argumentos.peticiones, argumentos.concurrencia)
+        texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if argumentos.salida:
+            with open(argumentos.salida, "w") as f:
+                f.write(texto + "\n")
+        else:
+            print(texto)
+        base = None
+        if argumentos.base:
+            with open(argumentos.base) as f:
+                base = json.load(f)
+
+    if base is not None:
+        comparacion = comparar(base, resultado, argumentos.tolerancia)
+        print(json.dumps(comparacion, indent=2, ensure_ascii=False))
+        sys.exit(0 if comparacion["aprobado"] else 1)
@@ -0,0 +1,129 @@
+"""
+Generador de datos sintéticos reproducible (con semilla): clientes, mesas y años de reservas.
+
+Uso: python -m benchmarks.generador --ruta bench.db [--escala pequena|media|grande] [--semilla 42]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from app import database
+from app.migraciones import aplicar_migraciones
+
+NOMBRES = ["Ana", "Luis", "Marta", "Jorge", "Lucía", "Pablo", "Elena", "Carlos", "Sara", "Diego", "Nuria", "Iván"]
+APELLIDOS = ["García", "López", "Martín", "Sánchez", "Pérez", "Gómez", "Ruiz", "Díaz", "Moreno", "Álvarez", "Romero", "Navarro"]
+
+# Turnos de 2 horas en los que se reserva (hora de inicio)
+TURNOS = (13, 15, 20, 22)
+
+# Escalas predefinidas: clientes, mesas, días de historial y reservas por día
+ESCALAS = {
+    "pequena": {"clientes": 2000, "mesas": 20, "dias": 365, "reservas_dia": 40},
+    "media": {"clientes": 20000, "mesas": 40, "dias": 730, "reservas_dia": 120},
+    "grande": {"clientes": 200000, "mesas": 60, "dias": 1095, "reservas_dia": 220},
+}
+# Días de reservas futuras (pendientes y confirmadas) a partir de la fecha de referencia
+DIAS_FUTUROS = 60
+
+
+def generar_datos(ruta: str, clientes: int, mesas: int, dias: int, reservas_dia: int, semilla: int = 42,
+                  referencia: Optional[date] = None) -> dict:
+    """
+    Crea la base de datos en `ruta` y la llena con datos sintéticos.
+    Las reservas van de `dias` días antes de `referencia` (por defecto hoy) a DIAS_FUTUROS días después;
+    cada mesa tiene como mucho una reserva por turno, así que no hay solapamientos.
+    Con la misma semilla y la misma referencia se generan exactamente los mismos datos.
+    """
+    if reservas_dia > mesas * len(TURNOS):
+        raise ValueError("No caben tantas reservas por día con esas mesas y turnos")
+    referencia = referencia or date.today()
+    aleatorio = random.Random(semilla)
+    database.configurar_pool(ruta=ruta)
+    aplicar_migraciones()
+
+    inicio = time.perf_counter()
+    with database.transaccion() as conexion:
+        capacidades = [aleatorio.choice((2, 2, 4, 4, 4, 6, 8)) for _ in range(mesas)]
+        conexion.executemany(
+            "INSERT INTO mesas (numero, capacidad, ubicacion, activa) VALUES (?, ?, ?, 1)",
+            [(n + 1, capacidades[n], aleatorio.choice(("interior", "interior", "terraza", "privado"))) for n in range(mesas)],
+        )
+        conexion.executemany(
+            "INSERT INTO clientes (nombre, email, telefono, fecha_registro) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    f"{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}",
+                    f"cliente{n}@correo{n % 97}.es",
+                    f"6{n:08d}",
+                    f"{referencia - timedelta(days=dias + aleatorio.randrange(365))} 12:00:00",
+                )
+                for n in range(1, clientes + 1)
+            ],
+        )
+
+        # Unos pocos clientes habituales concentran muchas reservas
+        habituales = list(range(1, max(2, clientes // 50) + 1))
+        huecos = [(mesa, turno) for mesa in range(1, mesas + 1) for turno in TURNOS]
+        total = 0
+        for desplazamiento in range(-dias, DIAS_FUTUROS):
+            dia = referencia + timedelta(days=desplazamiento)
+            filas = []
+            for mesa, turno in aleatorio.sample(huecos, reservas_dia):
+                comienzo = datetime(dia.year, dia.month, dia.day, turno)
+                if desplazamiento < 0:
+                    estado = "cancelada" if aleatorio.random() < 0.08 else "completada"
+                else:
+                    estado = "confirmada" if aleatorio.random() < 0.3 else "pendiente"
+                cliente = aleatorio.choice(habituales) if aleatorio.random() < 0.2 else aleatorio.randrange(1, clientes + 1)
+                filas.append((
+                    cliente, mesa, comienzo, comienzo + timedelta(hours=2),
+                    aleatorio.randint(1, capacidades[mesa - 1]), estado,
+                    comienzo - timedelta(days=aleatorio.randrange(1, 30)),
+                ))
+            conexion.executemany(
+                """
+                INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, fecha_creacion)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                filas,
+            )
+            total += len(filas)
+
+    return {
+        "clientes": clientes,
+        "mesas": mesas,
+        "reservas": total,
+        "referencia": referencia.isoformat(),
+        "semilla": semilla,
+        "segundos": round(time.perf_counter() - inicio, 1),
+    }
+
+
+def describir_base_datos() -> dict:
+    """Tamaño y fecha de referencia de una base de datos ya generada (la del pool actual)."""
+    fila = database.obtener_uno(
+        "SELECT (SELECT COUNT(*) FROM clientes) AS clientes, (SELECT COUNT(*) FROM mesas) AS mesas, "
+        "(SELECT COUNT(*) FROM reservas) AS reservas, (SELECT MAX(substr(fecha_hora_inicio, 1, 10)) FROM reservas) AS ultima"
+    )
+    fila["referencia"] = (date.fromisoformat(fila.pop("ultima")) - timedelta(days=DIAS_FUTUROS - 1)).isoformat()
+    return fila
+
+
+def generar_escala(ruta: str, escala: str = "pequena", semilla: int = 42, referencia: Optional[date] = None) -> dict:
+    """Genera los datos de una de las escalas predefinidas."""
+    return generar_datos(ruta, semilla=semilla, referencia=referencia, **ESCALAS[escala])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ruta", required=True)
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--referencia", type=date.fromisoformat, default=None, help="Fecha de referencia YYYY-MM-DD (por defecto hoy)")
+    argumentos = parser.parse_args()
+    print(json.dumps(generar_escala(argumentos.ruta, argumentos.escala, argumentos.semilla, argumentos.referencia)))
+    database.cerrar_pool()
@@ -0,0 +1,125 @@
+"""
+Micro-benchmarks de las funciones de los servicios (app/services), llamadas directamente
+sobre una base de datos generada con benchmarks.generador.
+
+Uso: python -m benchmarks.micro --ruta bench.db [--iteraciones 200]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as hora_del_dia
+
+from app import database, database_async
+from app.models.cliente import ClienteCreate
+from app.models.reserva import ReservaAutoCreate, ReservaCreate
+from app.services import cliente_service, estadisticas_service, mesa_service, reserva_service
+from benchmarks.comun import resumir
+from benchmarks.generador import describir_base_datos
+
+
+def casos(datos: dict) -> dict:
+    """
+    Devuelve los casos a medir: nombre -> función que recibe el número de iteración y devuelve la corrutina.
+    `datos` es el resultado de generar_datos (número de clientes, mesas, reservas y fecha de referencia).
+    """
+    referencia = date.fromisoformat(datos["referencia"])
+    clientes, mesas, reservas = datos["clientes"], datos["mesas"], datos["reservas"]
+    # Las reservas nuevas van a partir de un año después de la referencia, cada una en un hueco distinto
+    lejos = datetime(referencia.year, referencia.month, referencia.day) + timedelta(days=400)
+    sufijo = int(time.time())
+
+    def dia(i):
+        return (referencia - timedelta(days=1 + i % 300)).isoformat()
+
+    def nueva_reserva(i, desplazamiento=0):
+        return ReservaCreate(
+            cliente_id=1 + i % clientes,
+            mesa_id=1 + i % mesas,
+            fecha_inicio=lejos + timedelta(days=desplazamiento + i // mesas),
+            numero_comensales=1,
+        )
+
+    creadas = []
+
+    async def crear_reserva(i):
+        creadas.append((await reserva_service.crear_reserva(nueva_reserva(i)))["id"])
+
+    async def cambiar_estado(i):
+        await reserva_service.confirmar_llegada_cliente_patch(creadas[i % len(creadas)])
+
+    async def exportar(i):
+        async for _ in reserva_service.exportar_reservas("ndjson", fecha=dia(i)):
+            pass
+
+    async def importar(i):
+        lote = [nueva_reserva(i * 50 + n, desplazamiento=1000) for n in range(50)]
+        await reserva_service.importar_reservas(lote, "parcial")
+
+    cliente_fijo = ClienteCreate(nombre="Cliente Benchmark", email=f"fijo{sufijo}@bench.es", telefono="600000000")
+
+    return {
+        "clientes.obtener_todos_clientes(limite=50)": lambda i: cliente_service.obtener_todos_clientes(50, (i * 50) % clientes),
+        "clientes.obtener_cliente_por_id": lambda i: cliente_service.obtener_cliente_por_id(1 + (i * 7919) % clientes),
+        "clientes.buscar_clientes(apellido)": lambda i: cliente_service.buscar_clientes(("García", "Navarro", "Ruiz")[i % 3]),
+        "clientes.buscar_clientes(email)": lambda i: cliente_service.buscar_clientes(f"cliente{1 + (i * 7919) % clientes}@"),
+        "clientes.crear_cliente": lambda i: cliente_service.crear_cliente(
+            ClienteCreate(nombre="Cliente Benchmark", email=f"b{sufijo}_{i}@bench.es", telefono="600000000")),
+        "clientes.actualizar_cliente": lambda i: cliente_service.actualizar_cliente(1 + i % clientes, cliente_fijo.model_copy(
+            update={"email": f"u{sufijo}_{i}@bench.es"})),
+        "mesas.obtener_todas_mesas": lambda i: mesa_service.obtener_todas_mesas(),
+        "mesas.obtener_mesa_por_id": lambda i: mesa_service.obtener_mesa_por_id(1 + i % mesas),
+        "mesas.obtener_mesa_disponible": lambda i: mesa_service.obtener_mesa_disponible(
+            datetime(referencia.year, referencia.month, referencia.day, 20) + timedelta(days=i % 60),
+            datetime(referencia.year, referencia.month, referencia.day, 22) + timedelta(days=i % 60), 4),
+        "mesas.obtener_disponibilidad": lambda i: mesa_service.obtener_disponibilidad(
+            referencia + timedelta(days=i % 60), hora_del_dia(18), hora_del_dia(23), 120, 4),
+        "reservas.obtener_reservas(fecha)": lambda i: reserva_service.obtener_reservas(fecha=dia(i)),
+        "reservas.obtener_reservas(cliente_id, limite=50)": lambda i: reserva_service.obtener_reservas(cliente_id=1 + i % clientes, limite=50),
+        "reservas.obtener_reserva_por_id": lambda i: reserva_service.obtener_reserva_por_id(1 + (i * 7919) % reservas),
+        "reservas.crear_reserva": crear_reserva,
+        "reservas.crear_reserva_auto": lambda i: reserva_service.crear_reserva_auto(ReservaAutoCreate(
+            cliente_id=1 + i % clientes, fecha_inicio=lejos + timedelta(days=3000 + i), numero_comensales=3)),
+        "reservas.confirmar_llegada_cliente_patch": cambiar_estado,
+        "reservas.exportar_reservas(dia)": exportar,
+        "reservas.importar_reservas(50)": importar,
+        "estadisticas.obtener_ocupacion_diaria": lambda i: estadisticas_service.obtener_ocupacion_diaria(date.fromisoformat(dia(i))),
+        "estadisticas.obtener_ocupacion_semanal": lambda i: estadisticas_service.obtener_ocupacion_semanal(date.fromisoformat(dia(i))),
+        "estadisticas.obtener_clientes_frecuentes": lambda i: estadisticas_service.obtener_clientes_frecuentes(),
+        "estadisticas.obtener_mesas_populares": lambda i: estadisticas_service.obtener_mesas_populares(),
+        "estadisticas.obtener_resumen_general": lambda i: estadisticas_service.obtener_resumen_general(),
+    }
+
+
+async def ejecutar_micro(datos: dict, iteraciones: int = 200, filtro: str = None) -> dict:
+    """Ejecuta cada caso `iteraciones` veces (después de un calentamiento) y devuelve sus latencias."""
+    resultados = {}
+    for nombre, caso in casos(datos).items():
+        if filtro and filtro not in nombre:
+            continue
+        calentamiento = min(10, iteraciones)
+        for i in range(calentamiento):
+            await caso(iteraciones + i)
+        latencias = []
+        inicio_total = time.perf_counter()
+        for i in range(iteraciones):
+            inicio = time.perf_counter()
+            await caso(i)
+            latencias.append(time.perf_counter() - inicio)
+        resultados[nombre] = resumir(latencias, time.perf_counter() - inicio_total)
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ruta", required=True, help="Base de datos creada con benchmarks.generador")
+    parser.add_argument("--iteraciones", type=int, default=200)
+    parser.add_argument("--filtro", default=None, help="Solo los casos cuyo nombre contiene este texto")
+    argumentos = parser.parse_args()
+    database.configurar_pool(ruta=argumentos.ruta)
+    datos = describir_base_datos()
+    print(json.dumps(asyncio.run(ejecutar_micro(datos, argumentos.iteraciones, argumentos.filtro)), indent=2, ensure_ascii=False))
+    database_async.cerrar_ejecutor()
+    database.cerrar_pool()
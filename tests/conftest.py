@@ -0,0 +1,43 @@
+"""Fixtures comunes: cada prueba trabaja sobre su propia base de datos temporal ya migrada."""
+
+import pytest
+
+from app import database
+from app.cache import cache_clientes, cache_mesas
+from app.database_async import cerrar_ejecutor
+from app.escritor import escritor
+from app.indice_reservas import indice_reservas
+from app.migraciones import aplicar_migraciones
+
+
+@pytest.fixture
+def base_datos(tmp_path):
+    """Base de datos temporal con el esquema aplicado y el índice de reservas cargado."""
+    database.configurar_pool(str(tmp_path / "pruebas.db"))
+    aplicar_migraciones()
+    cache_mesas.invalidar()
+    cache_clientes.invalidar()
+    indice_reservas.cargar()
+    yield
+    escritor.detener()
+    cerrar_ejecutor()
+    database.cerrar_pool()
+
+
+def crear_cliente(numero: int = 1) -> int:
+    """Inserta un cliente de prueba y devuelve su id."""
+    fila = database.obtener_uno(
+        "INSERT INTO clientes (nombre, email, telefono) VALUES (?, ?, ?) RETURNING id",
+        (f"Cliente {numero}", f"cliente{numero}@ejemplo.com", f"{600000000 + numero}"),
+    )
+    return fila["id"]
+
+
+def crear_mesa(numero: int = 1, capacidad: int = 4, ubicacion: str = "interior") -> int:
+    """Inserta una mesa activa y la registra en el índice; devuelve su id."""
+    fila = database.obtener_uno(
+        "INSERT INTO mesas (numero, capacidad, ubicacion, activa) VALUES (?, ?, ?, 1) RETURNING id, numero, capacidad, ubicacion, activa",
+        (numero, capacidad, ubicacion),
+    )
+    indice_reservas.registrar_mesa(fila)
+    return fila["id"]
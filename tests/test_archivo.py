@@ -0,0 +1,66 @@
+"""El listado y la exportación de reservas sin filtro de fecha también incluyen las archivadas."""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from app import database
+from app.archivo import TABLA_ARCHIVO, archivar_reservas
+from app.services import reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+
+def _insertar(cliente_id: int, mesa_id: int, dias: list[int], estado: str) -> list[int]:
+    """Reservas que empiezan hace `dias` días (negativo: en el futuro), insertadas directamente."""
+    ahora = datetime.now().replace(minute=0, second=0, microsecond=0)
+    ids = []
+    with database.transaccion() as conexion:
+        for dia in dias:
+            inicio = ahora - timedelta(days=dia)
+            fila = conexion.execute(
+                """
+                INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, fecha_creacion)
+                VALUES (?, ?, ?, ?, 2, ?, ?) RETURNING id
+                """,
+                (cliente_id, mesa_id, database.formatear_fecha(inicio), database.formatear_fecha(inicio + timedelta(hours=2)),
+                 estado, database.formatear_fecha(inicio)),
+            ).fetchone()
+            ids.append(fila["id"])
+    return ids
+
+
+def _exportar(**filtros) -> list[dict]:
+    async def leer():
+        return "".join([trozo async for trozo in reserva_service.exportar_reservas("ndjson", **filtros)])
+    return [json.loads(linea) for linea in asyncio.run(leer()).splitlines()]
+
+
+def test_listado_y_exportacion_incluyen_el_archivo(base_datos):
+    cliente, otro = crear_cliente(1), crear_cliente(2)
+    mesa = crear_mesa(1)
+    archivadas = _insertar(cliente, mesa, [500, 450, 400], "completada")
+    _insertar(otro, mesa, [420], "cancelada")
+    recientes = _insertar(cliente, mesa, [10, -5], "confirmada")
+    assert archivar_reservas(dias=30)["archivadas"] == 4
+    assert database.obtener_uno(f"SELECT COUNT(*) AS total FROM {TABLA_ARCHIVO}")["total"] == 4
+
+    # Por cliente, en orden y paginando por cursor a través de las dos tablas
+    filas = asyncio.run(reserva_service.obtener_reservas(cliente_id=cliente))
+    assert [fila["id"] for fila in filas] == archivadas + recientes
+    pagina = asyncio.run(reserva_service.obtener_reservas(cliente_id=cliente, limite=2))
+    assert [fila["id"] for fila in pagina] == archivadas[:2]
+    cursor = (pagina[-1]["fecha_inicio"], pagina[-1]["id"])
+    pagina = asyncio.run(reserva_service.obtener_reservas(cliente_id=cliente, limite=2, despues_de=cursor))
+    assert [fila["id"] for fila in pagina] == [archivadas[2], recientes[0]]
+
+    # Por estado: las completadas están en el archivo; las confirmadas nunca se archivan
+    filas = asyncio.run(reserva_service.obtener_reservas(estado="completada"))
+    assert [fila["id"] for fila in filas] == archivadas
+    filas = asyncio.run(reserva_service.obtener_reservas(estado="confirmada"))
+    assert [fila["id"] for fila in filas] == recientes
+
+    # La exportación sin filtros lleva todo el historial en orden
+    exportadas = _exportar()
+    assert len(exportadas) == 6
+    assert [fila["fecha_inicio"] for fila in exportadas] == sorted(fila["fecha_inicio"] for fila in exportadas)
+    assert [fila["id"] for fila in _exportar(cliente_id=cliente)] == archivadas + recientes
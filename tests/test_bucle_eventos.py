@@ -0,0 +1,60 @@
+"""Las consultas al índice de reservas no bloquean el bucle de eventos mientras otro hilo tiene su bloqueo."""
+
+import asyncio
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from app.indice_reservas import indice_reservas
+from app.models.mesa import MesaCreate
+from app.services import mesa_service
+from tests.conftest import crear_mesa
+
+# Segundos que otro hilo mantiene el bloqueo del índice (como una transacción larga)
+BLOQUEO_SEGUNDOS = 0.5
+
+
+def _pausa_maxima(llamada) -> float:
+    """Ejecuta `llamada` con el bloqueo del índice tomado en otro hilo y devuelve la mayor pausa del bucle."""
+    tomado, soltar = threading.Event(), threading.Event()
+
+    def retener():
+        with indice_reservas.escritura():
+            tomado.set()
+            soltar.wait(5)
+
+    hilo = threading.Thread(target=retener)
+    hilo.start()
+    assert tomado.wait(5)
+    threading.Timer(BLOQUEO_SEGUNDOS, soltar.set).start()
+
+    async def medir():
+        pausas = []
+        tarea = asyncio.ensure_future(llamada())
+        while not tarea.done():
+            antes = time.perf_counter()
+            await asyncio.sleep(0.01)
+            pausas.append(time.perf_counter() - antes)
+        await tarea
+        return max(pausas)
+
+    try:
+        return asyncio.run(medir())
+    finally:
+        soltar.set()
+        hilo.join()
+
+
+def test_mesas_no_bloquean_el_bucle(base_datos):
+    mesa = crear_mesa(1)
+    inicio = datetime.now() + timedelta(days=1)
+    limite = BLOQUEO_SEGUNDOS / 2
+    assert _pausa_maxima(lambda: mesa_service.obtener_mesa_disponible(inicio, inicio + timedelta(hours=2), 2)) < limite
+    assert _pausa_maxima(lambda: mesa_service.crear_mesa(MesaCreate(numero=2, capacidad=4, ubicacion="terraza"))) < limite
+    assert _pausa_maxima(lambda: mesa_service.actualizar_mesa(mesa, MesaCreate(numero=1, capacidad=6, ubicacion="interior"))) < limite
+
+
+def test_disponibilidad_no_bloquea_el_bucle(base_datos):
+    crear_mesa(1)
+    manana = date.today() + timedelta(days=1)
+    assert _pausa_maxima(lambda: mesa_service.obtener_disponibilidad(manana, capacidad=2)) < BLOQUEO_SEGUNDOS / 2
@@ -0,0 +1,54 @@
+"""Búsqueda de clientes: orden por relevancia, camino rápido de email y teléfono y tope de candidatos FTS."""
+
+import asyncio
+
+from app import database
+from app.services import cliente_service
+
+
+def _cliente(nombre: str, email: str, telefono: str) -> int:
+    fila = database.obtener_uno(
+        "INSERT INTO clientes (nombre, email, telefono) VALUES (?, ?, ?) RETURNING id", (nombre, email, telefono),
+    )
+    return fila["id"]
+
+
+def _buscar(busqueda: str, limite: int = 20) -> list[int]:
+    return [cliente["id"] for cliente in asyncio.run(cliente_service.buscar_clientes(busqueda, limite))]
+
+
+def test_orden_por_relevancia(base_datos):
+    contiene = _cliente("Mariana Ruiz", "mruiz@correo.es", "611111111")
+    palabra = _cliente("Juana Ana Pérez", "jperez@correo.es", "622222222")
+    empieza = _cliente("Ana García", "agarcia@correo.es", "633333333")
+    igual = _cliente("Ana", "ana2@correo.es", "644444444")
+    _cliente("Luis Gómez", "lgomez@correo.es", "655555555")
+    assert _buscar("ana") == [igual, empieza, palabra, contiene]
+    # Mayúsculas y acentos como en el índice de trigramas
+    assert _buscar("GARCÍA") == [empieza]
+    # Las palabras van al índice por separado, pero se exige la frase entera
+    assert _buscar("Ana Pérez") == [palabra]
+    assert _buscar("Pérez Ana") == []
+
+
+def test_email_o_telefono(base_datos):
+    exacto = _cliente("Ana García", "ana@correo.es", "612345678")
+    _cliente("Luis Gómez", "luis@correo.es", "+34612345678")
+    otro = _cliente("Juana Ruiz", "juana@correo.es", "699999999")
+    # Si hay clientes con ese teléfono o email (o que empiezan por él) no se buscan subcadenas
+    assert _buscar("612345678") == [exacto]
+    assert _buscar("ana@correo") == [exacto]
+    # Sin coincidencias por el comienzo se busca en todo el índice
+    assert set(_buscar("na@correo")) == {exacto, otro}
+    assert len(_buscar("2345678")) == 2
+
+
+def test_tope_de_candidatos(base_datos, monkeypatch):
+    antiguo = _cliente("García Ruiz", "gruiz@correo.es", "611111111")
+    recientes = [_cliente(f"Cliente García {numero}", f"c{numero}@correo.es", f"6000000{numero:02d}") for numero in range(10)]
+    assert _buscar("García", limite=3) == [antiguo, recientes[-1], recientes[-2]]
+    # Con más coincidencias que candidatos solo se ordenan las de los clientes más recientes
+    monkeypatch.setattr(cliente_service, "CANDIDATOS_FTS", 3)
+    assert _buscar("García", limite=3) == recientes[:-4:-1]
+    # El límite pedido manda si es mayor que el tope
+    assert len(_buscar("García", limite=5)) == 5
@@ -0,0 +1,43 @@
+"""Con un solo worker configurado, las reservas hechas por otro proceso siguen impidiendo solapes."""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, main
+from app.exceptions.custom_exceptions import ReservaSolapadaError
+from app.models.reserva import ReservaCreate
+from app.planificador import planificador
+from app.services import reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+
+def test_reserva_de_otro_proceso_sin_multiproceso(base_datos, monkeypatch):
+    monkeypatch.setattr(main, "MULTIPROCESO", False)
+    monkeypatch.setattr(main, "PLANIFICADOR_ACTIVO", False)
+    monkeypatch.setattr(planificador, "_tareas", {})
+    cliente, mesa = crear_cliente(), crear_mesa(capacidad=4)
+    inicio = (datetime.now() + timedelta(days=2)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+    with TestClient(main.app):
+        # Otro worker (o app.cli) guarda una reserva con su propia conexión: este proceso no la ve en su índice
+        otro = sqlite3.connect(database._configuracion.ruta)
+        with otro:
+            otro.execute(
+                """
+                INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, fecha_creacion)
+                VALUES (?, ?, ?, ?, 2, 'pendiente', ?)
+                """,
+                (cliente, mesa, database.formatear_fecha(inicio), database.formatear_fecha(inicio + timedelta(hours=2)),
+                 database.formatear_fecha(datetime.now())),
+            )
+        otro.close()
+
+        solapada = ReservaCreate(cliente_id=cliente, mesa_id=mesa, fecha_inicio=inicio + timedelta(hours=1), numero_comensales=2)
+        with pytest.raises(ReservaSolapadaError):
+            asyncio.run(reserva_service.crear_reserva(solapada))
+        libre = ReservaCreate(cliente_id=cliente, mesa_id=mesa, fecha_inicio=inicio + timedelta(hours=2), numero_comensales=2)
+        assert asyncio.run(reserva_service.crear_reserva(libre))["mesa_id"] == mesa
@@ -0,0 +1,86 @@
+"""Escritor agrupado: cada operación del lote se resuelve por separado aunque otras fallen o se cancelen."""
+
+import threading
+
+import pytest
+
+from app import database
+from app.escritor import EscritorAgrupado
+
+
+def _insertar_cliente(numero: int):
+    def operacion(conexion):
+        return conexion.execute(
+            "INSERT INTO clientes (nombre, email, telefono) VALUES (?, ?, ?) RETURNING id",
+            (f"Cliente {numero}", f"cliente{numero}@ejemplo.com", f"{600000000 + numero}"),
+        ).fetchone()["id"]
+    return operacion
+
+
+def _fallar_tras_insertar(conexion):
+    _insertar_cliente(99)(conexion)
+    raise ValueError("fallo en mitad del lote")
+
+
+def _emails() -> set:
+    return {fila["email"] for fila in database.obtener_todos("SELECT email FROM clientes")}
+
+
+@pytest.fixture
+def escritor(base_datos):
+    """Escritor propio que no sale de la cola hasta que se abre `puerta`, para juntar un lote a mano."""
+    puerta, esperando = threading.Event(), threading.Event()
+
+    def bloquear(conexion):
+        esperando.set()
+        puerta.wait(5)
+
+    escritor = EscritorAgrupado(tamano_lote=16)
+    escritor.encolar(bloquear)
+    assert esperando.wait(5)
+    escritor.puerta = puerta
+    yield escritor
+    puerta.set()
+    escritor.detener()
+
+
+def test_una_operacion_que_falla_no_deshace_el_resto_del_lote(escritor):
+    futuros = [escritor.encolar(_insertar_cliente(1)), escritor.encolar(_fallar_tras_insertar), escritor.encolar(_insertar_cliente(2))]
+    escritor.puerta.set()
+    assert futuros[0].result(5) > 0
+    with pytest.raises(ValueError):
+        futuros[1].result(5)
+    assert futuros[2].result(5) > 0
+    # El INSERT de la operación que falló se deshizo con su SAVEPOINT
+    assert _emails() == {"cliente1@ejemplo.com", "cliente2@ejemplo.com"}
+    assert escritor.metricas()["errores"] == 1
+
+
+def test_llamante_cancelado_antes_del_lote(escritor):
+    cancelado, hermano = escritor.encolar(_insertar_cliente(1)), escritor.encolar(_insertar_cliente(2))
+    assert cancelado.cancel()
+    escritor.puerta.set()
+    assert hermano.result(5) > 0
+    # La operación cancelada no llega a ejecutarse
+    assert _emails() == {"cliente2@ejemplo.com"}
+
+
+def test_llamante_cancelado_durante_el_lote(escritor):
+    en_marcha, seguir = threading.Event(), threading.Event()
+
+    def lenta(conexion):
+        en_marcha.set()
+        seguir.wait(5)
+        return _insertar_cliente(1)(conexion)
+
+    primera, hermano = escritor.encolar(lenta), escritor.encolar(_insertar_cliente(2))
+    escritor.puerta.set()
+    assert en_marcha.wait(5)
+    # Ya está en marcha: no se puede cancelar y su resultado se entrega igualmente
+    assert not primera.cancel()
+    seguir.set()
+    assert primera.result(5) > 0
+    assert hermano.result(5) > 0
+    assert _emails() == {"cliente1@ejemplo.com", "cliente2@ejemplo.com"}
+    # El hilo sigue atendiendo la cola
+    assert escritor.encolar(_insertar_cliente(3)).result(5) > 0
@@ -0,0 +1,16 @@
+"""Rutas de /estadisticas: una fecha mal escrita es un error de validación, no un 500."""
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_fechas_de_ocupacion(base_datos):
+    cliente_http = TestClient(app)
+    assert cliente_http.get("/estadisticas/ocupacion/diaria", params={"fecha": "xyz"}).status_code == 422
+    assert cliente_http.get("/estadisticas/ocupacion/semanal", params={"fecha_inicio": "2031-02-30"}).status_code == 422
+    respuesta = cliente_http.get("/estadisticas/ocupacion/diaria", params={"fecha": "2031-05-05"})
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {"fecha": "2031-05-05", "total_reservas": 0, "total_comensales": 0}
+    semana = cliente_http.get("/estadisticas/ocupacion/semanal", params={"fecha_inicio": "2031-05-05"}).json()
+    assert (semana["fecha_inicio"], semana["fecha_fin"]) == ("2031-05-05", "2031-05-11")
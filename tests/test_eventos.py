@@ -0,0 +1,134 @@
+"""Centro de eventos de GET /eventos: reanudar con Last-Event-ID, reinicio, desbordamiento y orden con publicadores en otros hilos."""
+
+import asyncio
+import re
+import threading
+import time
+
+from app import eventos
+from app.eventos import CentroEventos, flujo_eventos
+
+
+def _numeros(textos: list[str]) -> list[int]:
+    return [int(re.match(r"id: [^-]+-(\d+)\n", texto).group(1)) for texto in textos]
+
+
+def _tipos(textos: list[str]) -> list[str]:
+    return [re.search(r"\nevent: (\w+)\n", texto).group(1) for texto in textos]
+
+
+def _reserva(dia: str) -> dict:
+    return {"id": 1, "fecha_inicio": f"{dia} 20:00:00", "estado": "pendiente"}
+
+
+async def _pendientes(suscripcion) -> list:
+    """Deja correr el bucle para que lleguen las entregas y vacía la cola."""
+    await asyncio.sleep(0.05)
+    recibidos = []
+    while not suscripcion.cola.empty():
+        recibidos.append(suscripcion.cola.get_nowait())
+    return recibidos
+
+
+def test_reanudar_con_last_event_id():
+    async def prueba():
+        centro = CentroEventos(historial=10)
+        for dia in ("2031-05-05", "2031-05-06", "2031-05-05"):
+            centro.publicar("reserva_creada", _reserva(dia))
+        _, iniciales = centro.suscribir(f"{centro.epoca}-1")
+        assert _numeros(iniciales) == [2, 3]
+        # Con filtro de día solo se reenvían los de ese día (y los de mesas, que no tienen día)
+        suscripcion, iniciales = centro.suscribir(f"{centro.epoca}-1", "2031-05-05")
+        assert _numeros(iniciales) == [3]
+        centro.publicar("mesa_actualizada", {"id": 1, "ubicacion": "terraza"})
+        centro.publicar("reserva_creada", _reserva("2031-05-06"))
+        recibidos = await _pendientes(suscripcion)
+        assert [evento.numero for evento in recibidos] == [4]
+        assert recibidos[0].tipo == "mesa_actualizada"
+
+    asyncio.run(prueba())
+
+
+def test_reinicio_si_faltan_eventos():
+    async def prueba():
+        centro = CentroEventos(historial=3)
+        for _ in range(5):
+            centro.publicar("reserva_creada", _reserva("2031-05-05"))
+        # Los eventos 1 y 2 ya han salido del historial
+        _, iniciales = centro.suscribir(f"{centro.epoca}-1")
+        assert _tipos(iniciales) == ["reinicio"] and _numeros(iniciales) == [5]
+        _, iniciales = centro.suscribir(f"{centro.epoca}-2")
+        assert _numeros(iniciales) == [3, 4, 5]
+        # Un id de otro arranque (otra época) tampoco se puede reanudar
+        _, iniciales = centro.suscribir("otraepoca-4")
+        assert _tipos(iniciales) == ["reinicio"]
+        # Tras reiniciar (la coherencia recargó todo) los clientes conectados se cierran
+        suscripcion, _ = centro.suscribir()
+        centro.reiniciar()
+        assert await _pendientes(suscripcion) == [None]
+        _, iniciales = centro.suscribir(f"{centro.epoca}-5")
+        assert _tipos(iniciales) == ["reinicio"]
+
+    asyncio.run(prueba())
+
+
+def test_cliente_atrasado_se_desconecta(monkeypatch):
+    monkeypatch.setattr(eventos, "TAMANO_COLA", 2)
+
+    async def prueba():
+        centro = CentroEventos()
+        lento, _ = centro.suscribir()
+        al_dia, _ = centro.suscribir()
+        centro.publicar("reserva_creada", _reserva("2031-05-05"))
+        centro.publicar("reserva_creada", _reserva("2031-05-05"))
+        assert [evento.numero for evento in await _pendientes(al_dia)] == [1, 2]
+        centro.publicar("reserva_creada", _reserva("2031-05-05"))
+        await asyncio.sleep(0.05)
+        # La cola del lento estaba llena: se vacía y solo queda el cierre
+        assert lento.cerrada and lento.desbordada
+        textos = [texto async for texto in flujo_eventos(lento, [])]
+        assert textos == ["retry: 3000\n\n"]
+        # flujo_eventos lo quita del centro compartido; aquí se quita del centro de la prueba
+        centro.cancelar(lento)
+        assert centro.metricas()["desbordadas"] == 1 and centro.metricas()["clientes"] == 1
+        assert [evento.numero for evento in await _pendientes(al_dia)] == [3]
+        assert not al_dia.cerrada
+
+    asyncio.run(prueba())
+
+
+def test_suscribirse_mientras_otro_hilo_publica(monkeypatch):
+    monkeypatch.setattr(eventos, "TAMANO_COLA", 2000)
+    total = 500
+
+    async def prueba():
+        centro = CentroEventos(historial=total)
+        empezar = threading.Event()
+
+        def publicar():
+            empezar.wait(5)
+            for numero in range(total):
+                centro.publicar("reserva_creada", _reserva("2031-05-05"))
+                if numero % 25 == 0:
+                    time.sleep(0.0005)
+
+        hilo = threading.Thread(target=publicar)
+        hilo.start()
+        empezar.set()
+        suscripciones = []
+        while len(suscripciones) < 20:
+            ultimo = centro.metricas()["ultimo_id"]
+            # Unos reanudan desde un id anterior y otros empiezan desde ahora
+            numero = int(ultimo.rsplit("-", 1)[1])
+            ultimo_id = f"{centro.epoca}-{numero // 2}" if len(suscripciones) % 2 else None
+            suscripcion, iniciales = centro.suscribir(ultimo_id)
+            suscripciones.append((numero // 2 if ultimo_id else None, suscripcion, iniciales))
+            await asyncio.sleep(0.0005)
+        hilo.join()
+        for desde, suscripcion, iniciales in suscripciones:
+            recibidos = _numeros(iniciales) + [evento.numero for evento in await _pendientes(suscripcion)]
+            # Sin huecos ni repetidos, y hasta el último publicado
+            primero = (desde + 1) if desde is not None else (recibidos[0] if recibidos else total + 1)
+            assert recibidos == list(range(primero, total + 1))
+
+    asyncio.run(prueba())
@@ -0,0 +1,68 @@
+"""El índice de reservas en memoria sigue a la base de datos por todos los caminos que escriben reservas."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from app.indice_reservas import indice_reservas
+from app.models.reserva import EsperaCreate, ReservaCreate, ReservaUpdate
+from app.services import lista_espera_service, reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+
+def _manana(hora: int, minuto: int = 0) -> datetime:
+    return (datetime.now() + timedelta(days=1)).replace(hour=hora, minute=minuto, second=0, microsecond=0)
+
+
+def _comprobar_indice(activas: int):
+    resultado = indice_reservas.verificar_consistencia()
+    assert resultado["consistente"], resultado
+    assert resultado["reservas_en_indice"] == activas
+
+
+def _crear(cliente_id: int, mesa_id: int, inicio: datetime) -> dict:
+    return asyncio.run(reserva_service.crear_reserva(ReservaCreate(
+        cliente_id=cliente_id, mesa_id=mesa_id, fecha_inicio=inicio, numero_comensales=2,
+    )))
+
+
+def test_indice_coherente_con_todas_las_escrituras(base_datos):
+    cliente = crear_cliente()
+    interior, terraza = crear_mesa(1), crear_mesa(2, ubicacion="terraza")
+
+    # Alta
+    cena = _crear(cliente, interior, _manana(20))
+    comida_interior = _crear(cliente, interior, _manana(13))
+    comida_terraza = _crear(cliente, terraza, _manana(13))
+    _comprobar_indice(3)
+
+    # Cambio de mesa y hora
+    cena = asyncio.run(reserva_service.actualizar_reserva(cena["id"], ReservaUpdate(mesa_id=terraza, fecha_inicio=_manana(21))))
+    assert cena["mesa_id"] == terraza
+    _comprobar_indice(3)
+
+    # Las dos mesas están ocupadas a las 13:30: la entrada espera hasta que se cancela una comida
+    espera = asyncio.run(lista_espera_service.crear_espera(EsperaCreate(cliente_id=cliente, fecha_inicio=_manana(13, 30), numero_comensales=2)))
+    assert espera["estado"] == "esperando"
+    asyncio.run(reserva_service.cancelar_reserva(comida_interior["id"]))
+    espera = lista_espera_service._obtener_espera(espera["id"])
+    assert espera["estado"] == "asignada"
+    _comprobar_indice(3)
+
+    # Confirmación y cierre a mano
+    asyncio.run(reserva_service.confirmar_llegada_cliente_patch(cena["id"]))
+    asyncio.run(reserva_service.marcar_reserva_como_completada_patch(comida_terraza["id"]))
+    _comprobar_indice(2)
+
+    # Importación por lotes: la segunda se solapa con la cena y se rechaza
+    resultados = asyncio.run(reserva_service.importar_reservas([
+        ReservaCreate(cliente_id=cliente, mesa_id=interior, fecha_inicio=_manana(18), numero_comensales=2),
+        ReservaCreate(cliente_id=cliente, mesa_id=terraza, fecha_inicio=_manana(22), numero_comensales=2),
+        ReservaCreate(cliente_id=cliente, mesa_id=interior, fecha_inicio=_manana(22), numero_comensales=2),
+    ], modo="parcial"))
+    assert [resultado["aceptada"] for resultado in resultados["resultados"]] == [True, False, True]
+    _comprobar_indice(4)
+
+    # Cierre del planificador pasado el día: la confirmada se completa y las pendientes no presentadas se cancelan
+    cerradas = reserva_service.cerrar_reservas_vencidas(ahora=_manana(0) + timedelta(days=1))
+    assert (cerradas["completadas"], cerradas["no_presentadas"]) == (1, 3)
+    _comprobar_indice(0)
@@ -0,0 +1,90 @@
+"""Lista de espera: reserva atómica al liberarse una mesa, orden de llegada, solapes dentro de un mismo emparejamiento y caducidad."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+
+from app import database
+from app.indice_reservas import indice_reservas
+from app.lista_espera import caducar_esperas
+from app.models.mesa import MesaCreate
+from app.models.reserva import EsperaCreate, ReservaCreate
+from app.services import lista_espera_service, mesa_service, reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+
+def _manana(hora: int) -> datetime:
+    return (datetime.now() + timedelta(days=1)).replace(hour=hora, minute=0, second=0, microsecond=0)
+
+
+def _apuntar(cliente_id: int, inicio: datetime, comensales: int = 2) -> dict:
+    return asyncio.run(lista_espera_service.crear_espera(EsperaCreate(cliente_id=cliente_id, fecha_inicio=inicio, numero_comensales=comensales)))
+
+
+def _entrada(espera_id: int) -> dict:
+    return lista_espera_service._obtener_espera(espera_id)
+
+
+def _comprobar_indice():
+    resultado = indice_reservas.verificar_consistencia()
+    assert resultado["consistente"], resultado
+
+
+def test_mesa_libre_se_reserva_al_momento(base_datos):
+    cliente, mesa = crear_cliente(), crear_mesa()
+    entrada = _apuntar(cliente, _manana(20))
+    assert entrada["estado"] == "asignada"
+    reserva = asyncio.run(reserva_service.obtener_reserva_por_id(entrada["reserva_id"]))
+    assert reserva["mesa_id"] == mesa
+    _comprobar_indice()
+
+
+def test_cancelacion_asigna_la_mesa_por_orden_de_llegada(base_datos):
+    clientes = [crear_cliente(numero) for numero in range(1, 4)]
+    mesa = crear_mesa()
+    ocupada = asyncio.run(reserva_service.crear_reserva(ReservaCreate(
+        cliente_id=clientes[0], mesa_id=mesa, fecha_inicio=_manana(20), numero_comensales=2,
+    )))
+    primera, segunda = _apuntar(clientes[1], _manana(20)), _apuntar(clientes[2], _manana(21))
+    assert (primera["estado"], segunda["estado"]) == ("esperando", "esperando")
+
+    asyncio.run(reserva_service.cancelar_reserva(ocupada["id"]))
+    primera, segunda = _entrada(primera["id"]), _entrada(segunda["id"])
+    # La mesa va a la primera en llegar; la segunda se solapa con ella y sigue esperando
+    assert primera["estado"] == "asignada"
+    assert segunda["estado"] == "esperando"
+    reserva = database.obtener_uno("SELECT cliente_id, mesa_id, estado FROM reservas WHERE id = ?", (primera["reserva_id"],))
+    assert dict(reserva) == {"cliente_id": clientes[1], "mesa_id": mesa, "estado": "pendiente"}
+    _comprobar_indice()
+
+
+def test_mesa_nueva_no_se_asigna_dos_veces_en_el_mismo_emparejamiento(base_datos):
+    cliente = crear_cliente()
+    # Sin mesas todas esperan; 20:00 y 21:00 se solapan, 22:00 empieza cuando acaba la de 20:00
+    a, b, c = _apuntar(cliente, _manana(20)), _apuntar(cliente, _manana(21)), _apuntar(cliente, _manana(22))
+    # Otra entrada que no cabe en la mesa
+    grande = _apuntar(cliente, _manana(13), comensales=6)
+
+    asyncio.run(mesa_service.crear_mesa(MesaCreate(numero=1, capacidad=4, ubicacion="interior")))
+    estados = [_entrada(entrada["id"])["estado"] for entrada in (a, b, c, grande)]
+    assert estados == ["asignada", "esperando", "asignada", "esperando"]
+    _comprobar_indice()
+
+
+def test_caducidad(base_datos):
+    cliente = crear_cliente()
+    pronto, tarde = _apuntar(cliente, _manana(13)), _apuntar(cliente, _manana(21))
+    assert caducar_esperas(_manana(14)) == {"caducadas": 1}
+    assert (_entrada(pronto["id"])["estado"], _entrada(tarde["id"])["estado"]) == ("caducada", "esperando")
+    # Una entrada caducada ya no recibe mesa
+    mesa = crear_mesa()
+    asyncio.run(mesa_service.actualizar_mesa(mesa, MesaCreate(numero=1, capacidad=4, ubicacion="interior")))
+    assert _entrada(pronto["id"])["estado"] == "caducada"
+    assert _entrada(tarde["id"])["estado"] == "asignada"
+
+
+def test_mas_comensales_que_la_mesa_mas_grande(base_datos):
+    with pytest.raises(ValidationError):
+        EsperaCreate(cliente_id=1, fecha_inicio=_manana(20), numero_comensales=12)
@@ -0,0 +1,70 @@
+"""Mapa de ocupación: el memoizado de un rango cerrado se recalcula si cambian sus reservas, y NumPy y Python dan lo mismo."""
+
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import database
+from app.mapa_ocupacion import calcular_mapa, memo_mapas, mapa_ocupacion
+from app.services import reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+
+def test_cancelar_una_reserva_antigua_recalcula_el_mapa(base_datos):
+    memo_mapas.invalidar()
+    cliente, mesa = crear_cliente(), crear_mesa()
+    inicio = datetime.combine(date.today() - timedelta(days=10), datetime.min.time()).replace(hour=20)
+    fila = database.obtener_uno(
+        """
+        INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, fecha_creacion)
+        VALUES (?, ?, ?, ?, 3, 'confirmada', ?) RETURNING id
+        """,
+        (cliente, mesa, database.formatear_fecha(inicio), database.formatear_fecha(inicio + timedelta(hours=2)),
+         database.formatear_fecha(inicio)),
+    )
+    desde, hasta = inicio.date(), inicio.date() + timedelta(days=6)
+    assert mapa_ocupacion(desde, hasta)["reservas"] == 1
+    # La segunda llamada sale de la memoria
+    assert mapa_ocupacion(desde, hasta)["reservas"] == 1
+
+    asyncio.run(reserva_service.cancelar_reserva(fila["id"]))
+    assert mapa_ocupacion(desde, hasta)["reservas"] == 0
+
+
+def _reservas_variadas(desde: date, dias: int):
+    """Reservas en dos ubicaciones: algunas cruzan la medianoche o los bordes del rango y otras no ocupan."""
+    cliente = crear_cliente()
+    mesas = [crear_mesa(1, 4, "interior"), crear_mesa(2, 6, "interior"), crear_mesa(3, 2, "terraza")]
+    aleatorio = random.Random(3)
+    filas = []
+    for _ in range(300):
+        inicio = datetime.combine(desde, datetime.min.time()) + timedelta(
+            days=aleatorio.randrange(-1, dias + 1), minutes=aleatorio.randrange(0, 24 * 60, 5),
+        )
+        fin = inicio + timedelta(minutes=aleatorio.choice((50, 90, 120, 180)))
+        estado = aleatorio.choice(("pendiente", "confirmada", "completada", "cancelada"))
+        filas.append((cliente, aleatorio.choice(mesas), database.formatear_fecha(inicio), database.formatear_fecha(fin),
+                      aleatorio.randint(1, 4), estado, database.formatear_fecha(inicio)))
+    with database.transaccion() as conexion:
+        conexion.executemany(
+            """
+            INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            filas,
+        )
+
+
+def test_numpy_y_python_dan_el_mismo_mapa(base_datos):
+    pytest.importorskip("numpy")
+    desde = date.today() - timedelta(days=30)
+    _reservas_variadas(desde, 10)
+    for hasta, minutos, ubicacion in ((desde + timedelta(days=9), 15, None), (desde + timedelta(days=2), 60, None),
+                                      (desde, 30, "terraza"), (desde + timedelta(days=9), 15, "sin_mesas")):
+        con_numpy = calcular_mapa(desde, hasta, minutos, ubicacion, vectorizado=True)
+        sin_numpy = calcular_mapa(desde, hasta, minutos, ubicacion, vectorizado=False)
+        assert con_numpy == sin_numpy
+    assert con_numpy["ubicaciones"] == {}
+    assert calcular_mapa(desde, desde + timedelta(days=9), vectorizado=True)["reservas"] > 0
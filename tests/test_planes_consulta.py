@@ -0,0 +1,117 @@
+"""
+Regresión de planes de consulta: las consultas calientes sobre reservas deben buscar por índice
+(SEARCH) y nunca recorrer la tabla entera (SCAN). Se capturan las sentencias que ejecutan los
+servicios de verdad (con sus valores) y se pasan por EXPLAIN QUERY PLAN.
+"""
+
+import asyncio
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import database
+from app.indice_reservas import indice_reservas
+from app.lista_espera import lista_espera
+from app.models.reserva import ReservaCreate
+from app.services import estadisticas_service, reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+TABLAS_CALIENTES = ("reservas", "reservas_archivo", "resumen_dias")
+RECORRIDO = re.compile(rf"^SCAN (TABLE )?({'|'.join(TABLAS_CALIENTES)})\b")
+
+
+@pytest.fixture
+def sentencias(base_datos, monkeypatch):
+    """Lista en la que se apuntan todas las sentencias SQL que ejecutan las conexiones del pool."""
+    capturadas = []
+    conectar = sqlite3.connect
+
+    def conectar_con_traza(*args, **kwargs):
+        conexion = conectar(*args, **kwargs)
+        conexion.set_trace_callback(capturadas.append)
+        return conexion
+
+    monkeypatch.setattr(sqlite3, "connect", conectar_con_traza)
+    # Pools nuevos sobre la misma base de datos, ya con la traza
+    database.configurar_pool(database._configuracion.ruta)
+    return capturadas
+
+
+def _plan(sentencia: str) -> list[str]:
+    with database.obtener_pool().conexion() as conexion:
+        return [fila[3] for fila in conexion.execute(f"EXPLAIN QUERY PLAN {sentencia}").fetchall()]
+
+
+def _planes(capturadas: list[str], fragmento: str) -> list[tuple[str, list[str]]]:
+    """Planes de las sentencias capturadas que contienen `fragmento`."""
+    encontradas = [sentencia for sentencia in capturadas if fragmento in sentencia and not sentencia.lstrip().upper().startswith(("BEGIN", "COMMIT", "PRAGMA"))]
+    assert encontradas, f"no se ha ejecutado ninguna sentencia con {fragmento!r}"
+    return [(sentencia, _plan(sentencia)) for sentencia in encontradas]
+
+
+def _comprobar_busqueda(capturadas: list[str], fragmento: str):
+    for sentencia, plan in _planes(capturadas, fragmento):
+        assert not any(RECORRIDO.match(paso) for paso in plan), f"recorre la tabla:\n{sentencia}\n{plan}"
+        assert any(paso.startswith("SEARCH") for paso in plan), f"no usa ningún índice:\n{sentencia}\n{plan}"
+
+
+def _reservas_de_prueba(dia: date) -> int:
+    cliente_id = crear_cliente()
+    mesa_id = crear_mesa()
+    for hora in (13, 20):
+        asyncio.run(reserva_service.crear_reserva(ReservaCreate(
+            cliente_id=cliente_id, mesa_id=mesa_id, fecha_inicio=datetime.combine(dia, datetime.min.time()) + timedelta(hours=hora),
+            numero_comensales=2,
+        )))
+    return cliente_id
+
+
+def test_listado_por_fecha(sentencias):
+    dia = date.today() + timedelta(days=2)
+    cliente_id = _reservas_de_prueba(dia)
+    sentencias.clear()
+    assert len(asyncio.run(reserva_service.obtener_reservas(fecha=dia.isoformat()))) == 2
+    _comprobar_busqueda(sentencias, "FROM reservas")
+    sentencias.clear()
+    asyncio.run(reserva_service.obtener_reservas(fecha=dia.isoformat(), cliente_id=cliente_id, estado="pendiente"))
+    _comprobar_busqueda(sentencias, "FROM reservas")
+
+
+def test_ocupacion_diaria_y_semanal(sentencias):
+    dia = date.today() + timedelta(days=2)
+    _reservas_de_prueba(dia)
+    sentencias.clear()
+    assert asyncio.run(estadisticas_service.obtener_ocupacion_diaria(dia))["total_reservas"] == 2
+    assert asyncio.run(estadisticas_service.obtener_ocupacion_semanal(dia))["ocupacion"]
+    _comprobar_busqueda(sentencias, "FROM resumen_dias")
+    assert not any("FROM reservas" in sentencia for sentencia in sentencias)
+
+
+def test_solapamientos(sentencias):
+    dia = date.today() + timedelta(days=2)
+    _reservas_de_prueba(dia)
+    # Los solapamientos se comprueban en el índice en memoria, que se carga con esta consulta
+    sentencias.clear()
+    indice_reservas.cargar()
+    _comprobar_busqueda(sentencias, "FROM reservas")
+    # Crear una reserva solapada no consulta la tabla de reservas
+    sentencias.clear()
+    with pytest.raises(Exception):
+        asyncio.run(reserva_service.crear_reserva(ReservaCreate(
+            cliente_id=1, mesa_id=1, fecha_inicio=datetime.combine(dia, datetime.min.time()) + timedelta(hours=13, minutes=30),
+            numero_comensales=2,
+        )))
+    assert not any(RECORRIDO.match(paso) for sentencia in sentencias if "reservas" in sentencia for paso in _plan(sentencia))
+    # Huecos que se ofrecen a la lista de espera: solape por rango de horas
+    sentencias.clear()
+    inicio = datetime.combine(dia, datetime.min.time()) + timedelta(hours=17)
+    lista_espera.emparejar(1, inicio, inicio + timedelta(hours=2))
+    _comprobar_busqueda(sentencias, "FROM lista_espera")
+
+
+def test_cierre_de_reservas_vencidas(sentencias):
+    sentencias.clear()
+    reserva_service.cerrar_reservas_vencidas()
+    _comprobar_busqueda(sentencias, "UPDATE reservas")
@@ -0,0 +1,32 @@
+"""El registro de cambios se poda aunque la API tenga un solo proceso y el planificador desactivado."""
+
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app import database, main
+from app.coherencia import RETENCION_SEGUNDOS, TABLA_CAMBIOS
+from app.planificador import planificador
+from tests.conftest import crear_cliente
+
+
+def test_poda_sin_planificador_ni_varios_procesos(base_datos, monkeypatch):
+    monkeypatch.setattr(main, "MULTIPROCESO", False)
+    monkeypatch.setattr(main, "PLANIFICADOR_ACTIVO", False)
+    monkeypatch.setattr(planificador, "_tareas", {})
+    # Los triggers apuntan los cambios también con un solo proceso
+    for numero in range(1, 6):
+        crear_cliente(numero)
+    antigua = database.formatear_fecha(datetime.now() - timedelta(seconds=RETENCION_SEGUNDOS + 60))
+    with database.transaccion() as conexion:
+        conexion.execute(f"UPDATE {TABLA_CAMBIOS} SET fecha = ?", (antigua,))
+    assert database.obtener_uno(f"SELECT COUNT(*) AS total FROM {TABLA_CAMBIOS}")["total"] == 5
+
+    with TestClient(main.app):
+        limite = time.monotonic() + 5
+        while planificador.metricas()["poda_cambios"]["ejecuciones"] == 0 and time.monotonic() < limite:
+            time.sleep(0.01)
+        tareas = planificador.metricas()
+    assert set(tareas) == {"poda_cambios"}
+    assert tareas["poda_cambios"]["ultimo_resultado"] == {"borrados": 4}
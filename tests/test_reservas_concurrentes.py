@@ -0,0 +1,66 @@
+"""Muchas reservas simultáneas para la misma mesa y hora: solo una puede ganar."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import database
+from app.exceptions.custom_exceptions import ReservaSolapadaError
+from app.models.reserva import ReservaCreate
+from app.services import reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+PETICIONES = 300
+
+
+def _peticiones(mesa_id: int) -> list[ReservaCreate]:
+    # Todas a la misma hora o solapándose con ella, cada una de un cliente distinto
+    inicio = (datetime.now() + timedelta(days=3)).replace(hour=20, minute=0, second=0, microsecond=0)
+    clientes = [crear_cliente(numero) for numero in range(1, 21)]
+    return [
+        ReservaCreate(
+            cliente_id=clientes[numero % len(clientes)],
+            mesa_id=mesa_id,
+            fecha_inicio=inicio + timedelta(minutes=15 * (numero % 4)),
+            numero_comensales=2,
+        )
+        for numero in range(PETICIONES)
+    ]
+
+
+def _resultados(resultados: list) -> tuple[list, list]:
+    creadas = [resultado for resultado in resultados if isinstance(resultado, dict)]
+    otras = [resultado for resultado in resultados if not isinstance(resultado, dict)]
+    return creadas, otras
+
+
+def test_reservas_simultaneas_asincronas(base_datos):
+    mesa_id = crear_mesa()
+    peticiones = _peticiones(mesa_id)
+
+    async def lanzar():
+        return await asyncio.gather(*(reserva_service.crear_reserva(peticion) for peticion in peticiones), return_exceptions=True)
+
+    creadas, otras = _resultados(asyncio.run(lanzar()))
+    assert len(creadas) == 1
+    assert len(otras) == PETICIONES - 1
+    assert all(isinstance(error, ReservaSolapadaError) for error in otras)
+    assert database.obtener_uno("SELECT COUNT(*) AS total FROM reservas WHERE mesa_id = ?", (mesa_id,))["total"] == 1
+
+
+def test_reservas_simultaneas_en_hilos(base_datos):
+    mesa_id = crear_mesa()
+    peticiones = _peticiones(mesa_id)
+
+    def crear(peticion):
+        try:
+            return reserva_service._crear_reserva(peticion)
+        except Exception as error:
+            return error
+
+    with ThreadPoolExecutor(max_workers=32) as hilos:
+        creadas, otras = _resultados(list(hilos.map(crear, peticiones)))
+    assert len(creadas) == 1
+    assert all(isinstance(error, ReservaSolapadaError) for error in otras)
+    filas = database.obtener_todos("SELECT id FROM reservas WHERE mesa_id = ?", (mesa_id,))
+    assert [fila["id"] for fila in filas] == [creadas[0]["id"]]
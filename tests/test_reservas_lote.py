@@ -0,0 +1,76 @@
+"""POST /reservas/lote: modos todo y parcial, solapes dentro del lote, NDJSON y errores del cuerpo."""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+from app.routers import reservas
+from tests.conftest import crear_cliente, crear_mesa
+
+
+@pytest.fixture
+def cliente_http(base_datos):
+    # Sin `with`: no se ejecuta el lifespan, la base de datos ya la prepara base_datos
+    return TestClient(app)
+
+
+def _reserva(cliente_id: int, mesa_id: int, hora: int, comensales: int = 2) -> dict:
+    inicio = (datetime.now() + timedelta(days=5)).replace(hour=hora, minute=0, second=0, microsecond=0)
+    return {"cliente_id": cliente_id, "mesa_id": mesa_id, "fecha_inicio": inicio.isoformat(), "numero_comensales": comensales}
+
+
+def _contar_reservas() -> int:
+    return database.obtener_uno("SELECT COUNT(*) AS total FROM reservas")["total"]
+
+
+def test_modo_todo_no_inserta_nada_si_hay_rechazos(cliente_http):
+    cliente, mesa = crear_cliente(), crear_mesa(capacidad=4)
+    lote = [_reserva(cliente, mesa, 13), _reserva(cliente, mesa, 14), _reserva(cliente, mesa, 20, comensales=6)]
+    respuesta = cliente_http.post("/reservas/lote", json=lote)
+    assert respuesta.status_code == 422
+    cuerpo = respuesta.json()
+    assert (cuerpo["insertadas"], cuerpo["rechazadas"]) == (0, 3)
+    motivos = [resultado["motivo"] for resultado in cuerpo["resultados"]]
+    assert motivos[1] == "Se solapa con otra reserva del mismo lote"
+    assert motivos[2] == "El número de comensales excede la capacidad de la mesa"
+    assert _contar_reservas() == 0
+
+
+def test_modo_parcial_inserta_las_validas_con_fechas_iso(cliente_http):
+    cliente, mesa = crear_cliente(), crear_mesa(capacidad=4)
+    lote = [_reserva(cliente, mesa, 13), _reserva(cliente, mesa, 14), _reserva(cliente, mesa, 20), {"cliente_id": cliente}]
+    respuesta = cliente_http.post("/reservas/lote", params={"modo": "parcial"}, json=lote)
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert [resultado["aceptada"] for resultado in cuerpo["resultados"]] == [True, False, True, False]
+    assert cuerpo["resultados"][3]["motivo"].startswith("mesa_id:")
+    assert _contar_reservas() == 2
+    # Las reservas aceptadas salen igual que en POST /reservas
+    reserva = cuerpo["resultados"][0]["reserva"]
+    individual = cliente_http.get(f"/reservas/{reserva['id']}").json()
+    assert reserva == individual
+    assert reserva["fecha_inicio"] == lote[0]["fecha_inicio"]
+
+
+def test_ndjson(cliente_http):
+    cliente, mesa = crear_cliente(), crear_mesa()
+    lineas = [json.dumps(_reserva(cliente, mesa, 13)), "", "{no es json", json.dumps(_reserva(cliente, mesa, 20))]
+    respuesta = cliente_http.post(
+        "/reservas/lote", params={"modo": "parcial"}, content="\n".join(lineas), headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert respuesta.status_code == 200
+    resultados = respuesta.json()["resultados"]
+    assert [resultado["aceptada"] for resultado in resultados] == [True, False, True]
+    assert resultados[1]["motivo"].startswith("JSON no válido")
+
+
+def test_errores_del_cuerpo(cliente_http, monkeypatch):
+    assert cliente_http.post("/reservas/lote", content="[{", headers={"Content-Type": "application/json"}).status_code == 400
+    assert cliente_http.post("/reservas/lote", json={"cliente_id": 1}).status_code == 400
+    monkeypatch.setattr(reservas, "LOTE_MAXIMO", 2)
+    assert cliente_http.post("/reservas/lote", json=[{}, {}, {}]).status_code == 413
+    assert _contar_reservas() == 0
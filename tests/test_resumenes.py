@@ -0,0 +1,81 @@
+"""Las tablas resumen de estadísticas deben coincidir con la agregación directa de las reservas."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from app import database
+from app.archivo import archivar_reservas
+from app.models.reserva import ReservaCreate, ReservaUpdate
+from app.resumenes import verificar_resumenes
+from app.services import reserva_service
+from tests.conftest import crear_cliente, crear_mesa
+
+
+def _comprobar():
+    resultado = verificar_resumenes()
+    assert resultado["consistente"], resultado["diferencias"]
+
+
+def _insertar_pasadas(clientes: list[int], mesas: list[int], cantidad: int):
+    """Reservas ya pasadas (la API solo acepta fechas futuras), insertadas directamente."""
+    base = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=400)
+    filas = []
+    for numero in range(cantidad):
+        inicio = base + timedelta(days=numero % 380, hours=numero % 3 * 3)
+        filas.append((
+            clientes[numero % len(clientes)], mesas[numero % len(mesas)], database.formatear_fecha(inicio),
+            database.formatear_fecha(inicio + timedelta(hours=2)), 1 + numero % 4,
+            ("pendiente", "confirmada", "completada", "cancelada")[numero % 4], database.formatear_fecha(base),
+        ))
+    with database.transaccion() as conexion:
+        conexion.executemany(
+            """
+            INSERT INTO reservas (cliente_id, mesa_id, fecha_hora_inicio, fecha_hora_fin, num_comensales, estado, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            filas,
+        )
+
+
+def test_resumenes_consistentes_con_todo_el_trafico(base_datos):
+    clientes = [crear_cliente(numero) for numero in range(1, 6)]
+    mesas = [crear_mesa(numero, capacidad=4 if numero % 2 else 6, ubicacion=("interior", "terraza")[numero % 2]) for numero in range(1, 5)]
+    _insertar_pasadas(clientes, mesas, 200)
+    _comprobar()
+
+    # Altas por la API
+    manana = (datetime.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    creadas = []
+    for numero in range(24):
+        creadas.append(asyncio.run(reserva_service.crear_reserva(ReservaCreate(
+            cliente_id=clientes[numero % len(clientes)], mesa_id=mesas[numero % len(mesas)],
+            fecha_inicio=manana + timedelta(days=numero // len(mesas)), numero_comensales=1 + numero % 4,
+        ))))
+    _comprobar()
+
+    # Cambios de cliente, mesa, fecha y comensales
+    for numero, reserva in enumerate(creadas[:8]):
+        asyncio.run(reserva_service.actualizar_reserva(reserva["id"], ReservaUpdate(
+            cliente_id=clientes[(numero + 1) % len(clientes)],
+            fecha_inicio=manana + timedelta(days=30 + numero),
+            numero_comensales=2,
+        )))
+    _comprobar()
+
+    # Cambios de estado (por el escritor agrupado) y cierre de las reservas pasadas
+    asyncio.run(reserva_service.confirmar_llegada_cliente_patch(creadas[8]["id"]))
+    asyncio.run(reserva_service.marcar_reserva_como_completada_patch(creadas[9]["id"]))
+    asyncio.run(reserva_service.cancelar_reserva(creadas[10]["id"]))
+    asyncio.run(reserva_service.cancelar_reserva(creadas[11]["id"]))
+    reserva_service.cerrar_reservas_vencidas()
+    _comprobar()
+
+    # Borrados directos en la tabla
+    for reserva in creadas[12:16]:
+        database.ejecutar_consulta("DELETE FROM reservas WHERE id = ?", (reserva["id"],))
+    database.ejecutar_consulta("DELETE FROM reservas WHERE id IN (SELECT id FROM reservas WHERE estado = 'cancelada' LIMIT 5)")
+    _comprobar()
+
+    # Archivar no descuenta nada de los resúmenes
+    assert archivar_reservas(dias=30)["archivadas"] > 0
+    _comprobar()